@@ -0,0 +1,285 @@
+"""
+In-memory adjacency index over CONNECTS relationships.
+
+Object ids are interned to integers and the undirected connection graph is
+stored in compressed sparse row (CSR) form: neighbors of node i are
+neighbors[offsets[i]:offsets[i + 1]], with the connection type of each entry
+in edge_types at the same position. Write handlers keep the index current
+through the topology change log; the CSR arrays are rebuilt lazily on the
+next query after a change, so writes only pay for a dictionary update.
+"""
+
+import threading
+from array import array
+from collections import deque
+
+
+class AdjacencyIndex:
+    """Connection graph of all network objects, kept in step with the change log"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.version = 0
+        self._loading = False
+        self._pending = []
+        # Source of truth: object id -> type, relationship id -> (source id, target id, type)
+        self._nodes = {}
+        self._edges = {}
+        # Derived CSR structures, rebuilt when _dirty is set
+        self._dirty = True
+        self._ids = []
+        self._index = {}
+        self._offsets = array('i')
+        self._neighbors = array('i')
+        self._edge_types = array('i')
+        self._type_codes = {}
+
+    def load(self, read_graph, get_changes_since, current_version):
+        """
+        Populate the index from read_graph(), returning (nodes, edges) iterables of
+        (id, type) and (relationship id, source id, target id, type) tuples.
+
+        Changes recorded while the graph is being read are replayed afterwards so
+        none are lost between the read and the index going live.
+        """
+        with self._lock:
+            self._loading = True
+            self._pending = []
+        try:
+            start_version = current_version()
+            nodes, edges = read_graph()
+            nodes = {object_id: object_type for object_id, object_type in nodes}
+            edges = {rel_id: (source, target, rel_type) for rel_id, source, target, rel_type in edges}
+            version, changes = get_changes_since(start_version)
+        except Exception:
+            with self._lock:
+                self._loading = False
+                self._pending = []
+            raise
+
+        with self._lock:
+            self._loading = False
+            if changes is None:
+                # The log was compacted while reading; the next query retries
+                self._pending = []
+                return False
+            self._nodes = nodes
+            self._edges = edges
+            self.version = start_version
+            self._apply(changes + self._pending)
+            self._pending = []
+            self.loaded = True
+            self._dirty = True
+        return True
+
+    def on_changes(self, changes):
+        """Change log listener applying committed writes to the index"""
+        with self._lock:
+            if self.loaded:
+                self._apply(changes)
+            elif self._loading:
+                self._pending.extend(changes)
+
+    def invalidate(self):
+        """Forget the index so it is reloaded on the next query"""
+        with self._lock:
+            self.loaded = False
+            self._nodes = {}
+            self._edges = {}
+            self._dirty = True
+
+    def _apply(self, changes):
+        for change in changes:
+            if change["seq"] <= self.version:
+                continue
+            self.version = change["seq"]
+            kind = change["kind"]
+            properties = change.get("properties") or {}
+            if kind == "object":
+                if change["op"] == "create":
+                    self._nodes[change["id"]] = properties.get("type")
+                elif change["op"] == "delete":
+                    self._nodes.pop(change["id"], None)
+                else:
+                    continue
+            elif kind == "relationship":
+                if change["op"] == "create":
+                    self._edges[change["id"]] = (properties.get("source_id"), properties.get("target_id"), properties.get("type"))
+                elif change["op"] == "delete":
+                    self._edges.pop(change["id"], None)
+                else:
+                    continue
+            else:
+                continue
+            self._dirty = True
+
+    def _build(self):
+        """Re-intern object ids and rebuild the CSR arrays from the current edges"""
+        ids = list(self._nodes)
+        index = {object_id: i for i, object_id in enumerate(ids)}
+        type_codes = {}
+
+        endpoints = []
+        degree = [0] * (len(ids) + 1)
+        for source, target, rel_type in self._edges.values():
+            s = index.get(source)
+            t = index.get(target)
+            if s is None or t is None or s == t:
+                continue
+            code = type_codes.setdefault(rel_type, len(type_codes))
+            endpoints.append((s, t, code))
+            degree[s + 1] += 1
+            degree[t + 1] += 1
+
+        # Prefix sums give each node's slice of the neighbor array
+        for i in range(1, len(degree)):
+            degree[i] += degree[i - 1]
+        offsets = array('i', degree)
+        fill = array('i', degree)
+        neighbors = array('i', bytes(4 * len(endpoints) * 2))
+        edge_types = array('i', bytes(4 * len(endpoints) * 2))
+        for s, t, code in endpoints:
+            neighbors[fill[s]] = t
+            edge_types[fill[s]] = code
+            fill[s] += 1
+            neighbors[fill[t]] = s
+            edge_types[fill[t]] = code
+            fill[t] += 1
+
+        self._ids = ids
+        self._index = index
+        self._type_codes = type_codes
+        self._offsets = offsets
+        self._neighbors = neighbors
+        self._edge_types = edge_types
+        self._dirty = False
+
+    def _snapshot(self):
+        """Return the CSR arrays, rebuilding them first if the graph changed"""
+        with self._lock:
+            if self._dirty:
+                self._build()
+            return self._ids, self._index, self._offsets, self._neighbors, self._edge_types, self._type_codes
+
+    def _excluded_codes(self, type_codes, excluded_types):
+        return {type_codes[rel_type] for rel_type in excluded_types or () if rel_type in type_codes}
+
+    def _component(self, start, removed, offsets, neighbors, edge_types, excluded, seen):
+        """Breadth-first search from start, skipping removed and excluded connections"""
+        component = [start]
+        seen[start] = True
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for position in range(offsets[node], offsets[node + 1]):
+                neighbor = neighbors[position]
+                if seen[neighbor] or neighbor == removed or edge_types[position] in excluded:
+                    continue
+                seen[neighbor] = True
+                component.append(neighbor)
+                queue.append(neighbor)
+        return component
+
+    def contains(self, object_id):
+        with self._lock:
+            return object_id in self._nodes
+
+    def impact(self, object_id, root_ids=None, excluded_types=None):
+        """
+        Compute what is cut off when object_id fails.
+
+        Returns a dict with whether the object is an articulation point, the
+        objects that lose every path to a root (by default, all 'internet'
+        objects), and the components its neighbors fall into once it is removed.
+        Returns None when the object is unknown.
+        """
+        ids, index, offsets, neighbors, edge_types, type_codes = self._snapshot()
+        failed = index.get(object_id)
+        if failed is None:
+            return None
+        excluded = self._excluded_codes(type_codes, excluded_types)
+
+        if root_ids is None:
+            with self._lock:
+                root_ids = [node_id for node_id, node_type in self._nodes.items() if node_type == 'internet']
+        roots = [index[root_id] for root_id in root_ids if root_id in index and root_id != object_id]
+
+        # Objects that reach a root with and without the failed object present
+        def reachable_from_roots(removed):
+            seen = bytearray(len(ids))
+            for root in roots:
+                if not seen[root]:
+                    self._component(root, removed, offsets, neighbors, edge_types, excluded, seen)
+            return seen
+
+        before = reachable_from_roots(None)
+        after = reachable_from_roots(failed)
+        disconnected = [ids[i] for i in range(len(ids)) if before[i] and not after[i] and i != failed]
+
+        # Components the failed object's neighbors end up in once it is gone
+        seen = bytearray(len(ids))
+        components = []
+        root_set = set(roots)
+        for position in range(offsets[failed], offsets[failed + 1]):
+            neighbor = neighbors[position]
+            if seen[neighbor] or edge_types[position] in excluded:
+                continue
+            component = self._component(neighbor, failed, offsets, neighbors, edge_types, excluded, seen)
+            components.append({
+                "size": len(component),
+                "contains_root": any(node in root_set for node in component),
+                "ids": [ids[node] for node in component]
+            })
+
+        return {
+            "id": object_id,
+            "articulation_point": len(components) > 1,
+            "roots": [ids[root] for root in roots],
+            "disconnected": disconnected,
+            "components": components
+        }
+
+    def articulation_points(self, excluded_types=None):
+        """Return every object whose failure splits its connected component (iterative Tarjan)"""
+        ids, index, offsets, neighbors, edge_types, type_codes = self._snapshot()
+        excluded = self._excluded_codes(type_codes, excluded_types)
+        count = len(ids)
+        discovery = [-1] * count
+        low = [0] * count
+        points = set()
+        timer = 0
+
+        for root in range(count):
+            if discovery[root] != -1:
+                continue
+            discovery[root] = low[root] = timer
+            timer += 1
+            root_children = 0
+            # Stack entries: (node, parent, next neighbor position)
+            stack = [(root, -1, offsets[root])]
+            while stack:
+                node, parent, position = stack[-1]
+                if position < offsets[node + 1]:
+                    stack[-1] = (node, parent, position + 1)
+                    neighbor = neighbors[position]
+                    if edge_types[position] in excluded or neighbor == parent:
+                        continue
+                    if discovery[neighbor] == -1:
+                        discovery[neighbor] = low[neighbor] = timer
+                        timer += 1
+                        if node == root:
+                            root_children += 1
+                        stack.append((neighbor, node, offsets[neighbor]))
+                    else:
+                        low[node] = min(low[node], discovery[neighbor])
+                else:
+                    stack.pop()
+                    if parent != -1:
+                        low[parent] = min(low[parent], low[node])
+                        if parent != root and low[node] >= discovery[parent]:
+                            points.add(parent)
+            if root_children > 1:
+                points.add(root)
+
+        return [ids[i] for i in sorted(points)]
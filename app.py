@@ -1,59 +1,213 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, g, has_request_context, jsonify, request, send_from_directory
 from flask_cors import CORS
-from neo4j import GraphDatabase
+from neo4j import READ_ACCESS, Bookmarks
 import uuid
 import os
 import datetime
 import time
+import threading
 import json
+import re
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from topology import (SnapshotCache, add_change_listener, add_resync_listener, format_version, get_changes_since,
+                      get_topology_version, parse_version, record_change, record_changes)
+from adjacency import AdjacencyIndex
+from lookup import LOOKUP_METADATA_KEYS, LookupIndex
+from layout import LayoutTracker, compute_layout
+from graph_views import collapse_groups
+from metadata_codec import (METADATA_SCHEMA, coerce_metadata_value, decode_metadata, flatten_object_properties,
+                            flatten_relationship_properties, metadata_filter_forms, metadata_update_properties,
+                            split_properties)
+from init_schema import create_indexes, migrate_metadata
+from graph_store import STORAGE_BACKEND, load_store
+from metrics import (instrument_pool, observe_cache, observe_request, render_metrics, time_query, time_serialize,
+                     timed_query)
+from profiling import finish_profile, profile_requested, profiled, start_profile
+from snapshot import SNAPSHOT_MIMETYPE, SnapshotError, iter_snapshot, read_snapshot
+from serialization import (COMPRESS_MIN_BYTES, ENCODINGS, FastJSONProvider, compress, is_compressible,
+                           negotiate_encoding, snapshot_variant, variant_etag)
+from static_assets import STATIC_FINGERPRINT, StaticAssets
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Create Flask application with proper configuration
+class ProfiledJSONProvider(FastJSONProvider):
+    """The JSON provider of serialization.py, with serialization counted in request profiles"""
+    dumps = profiled('serialize')(FastJSONProvider.dumps)
+
 app = Flask(__name__, static_folder='static')
 app.config['PROPAGATE_EXCEPTIONS'] = True
 app.config['JSON_SORT_KEYS'] = False
+app.json = ProfiledJSONProvider(app)
+
+# Bookmarks of a request's writes are returned in this header; clients send it
+# back on their next read to be sure to see their own writes on a cluster
+BOOKMARK_HEADER = "X-Neo4j-Bookmark"
 
 # Configure CORS properly for production
-CORS(app, resources={r"/*": {"origins": os.getenv("CORS_ORIGINS", "*")}})
+CORS(app, resources={r"/*": {"origins": os.getenv("CORS_ORIGINS", "*")}},
+     expose_headers=["ETag", "X-Topology-Version", "X-Next-Cursor", BOOKMARK_HEADER])
+
+# Module of the storage backend (Neo4j or embedded) whose transaction
+# functions read and write the graph; see graph_store.py
+store = load_store()
+
+# Number of entities written per UNWIND transaction by the bulk import API
+BULK_BATCH_SIZE = int(os.environ.get("BULK_BATCH_SIZE", 1000))
+
+# Records fetched per round trip, and bytes per write, when streaming responses
+NEO4J_FETCH_SIZE = int(os.environ.get("NEO4J_FETCH_SIZE", 1000))
+STREAM_CHUNK_SIZE = 64 * 1024
 
-# Neo4j connection - more secure with required environment variables
-NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://neo4j:7687")
-NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
-NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "password12345678")
+# Largest page returned by paginated list endpoints
+MAX_PAGE_SIZE = int(os.environ.get("MAX_PAGE_SIZE", 1000))
+
+# Longest path, in hops, explored by path and reachability queries
+PATHS_MAX_HOPS = int(os.environ.get("PATHS_MAX_HOPS", 15))
+
+# Recompute the layout around changed objects automatically after writes
+LAYOUT_AUTO = os.environ.get("LAYOUT_AUTO", "false").lower() == "true"
+LAYOUT_DEBOUNCE_SECONDS = float(os.environ.get("LAYOUT_DEBOUNCE_SECONDS", 2))
+
+# Below this zoom level /network?collapse=groups collapses every group
+LOD_ZOOM_THRESHOLD = float(os.environ.get("LOD_ZOOM_THRESHOLD", 0.5))
 
 def create_db_driver():
-    """Create Neo4j driver with connection pooling and appropriate timeout settings"""
-    return GraphDatabase.driver(
-        NEO4J_URI, 
-        auth=(NEO4J_USER, NEO4J_PASSWORD),
-        max_connection_lifetime=3600,  # 1 hour
-        max_connection_pool_size=50,
-        connection_acquisition_timeout=60  # Wait up to 60 seconds for a connection
-    )
+    """Create the driver of the configured storage backend"""
+    return store.create_driver()
 
 # Create the global driver instance
 driver = create_db_driver()
+instrument_pool(driver, 'sync')
+
+# Serialized /network responses, rebuilt only when the topology version changes
+network_cache = SnapshotCache()
 
-def get_db_session():
-    """Get a database session with optional retry on failure"""
-    max_retries = 3
-    retry_delay = 1
+# Connection graph for impact analysis, loaded on first use and then kept
+# current from the change log
+adjacency_index = AdjacencyIndex()
+adjacency_load_lock = threading.Lock()
+add_change_listener(adjacency_index.on_changes)
+add_resync_listener(adjacency_index.invalidate)
+
+# Objects by address, subnet, MAC and name for /lookup, maintained the same way
+lookup_index = LookupIndex()
+lookup_load_lock = threading.Lock()
+add_change_listener(lookup_index.on_changes)
+add_resync_listener(lookup_index.invalidate)
+
+# Objects touched since the last layout run; only one layout runs at a time.
+# Each worker lays out around its own writes, so layouts are not repeated
+layout_tracker = LayoutTracker(LAYOUT_DEBOUNCE_SECONDS)
+layout_lock = threading.Lock()
+add_change_listener(layout_tracker.on_changes, local_only=True)
+
+def get_db_session(**config):
+    """
+    Get a database session.
     
-    for attempt in range(max_retries):
-        try:
-            return driver.session()
-        except Exception as e:
-            if attempt < max_retries - 1:
-                print(f"Database connection failed (attempt {attempt+1}/{max_retries}): {e}")
-                time.sleep(retry_delay)
-                # Exponential backoff
-                retry_delay = retry_delay * 2
-            else:
-                print(f"Failed to connect to database after {max_retries} attempts: {e}")
-                raise
+    Sessions connect lazily, so there is nothing to retry here: queries run in
+    execute_read/execute_write transaction functions, which the driver retries
+    on transient errors for up to NEO4J_TX_RETRY_SECONDS. Only streamed
+    responses use auto-commit queries, since rows already sent cannot be
+    replayed. The embedded backend's sessions work the same way.
+    """
+    return driver.session(**config)
+
+def request_bookmarks():
+    """Return the bookmarks sent in the request's BOOKMARK_HEADER, or None"""
+    raw = request.headers.get(BOOKMARK_HEADER) if has_request_context() else None
+    if not raw:
+        return None
+    return Bookmarks.from_raw_values(value.strip() for value in raw.split(',') if value.strip())
+
+def get_read_session(bookmarks=None, **config):
+    """
+    Get a session for reads, routed to followers on a cluster.
+    
+    It waits for the request's bookmarks, if any, so a client always reads
+    its own writes.
+    """
+    if bookmarks is None:
+        bookmarks = request_bookmarks()
+    return get_db_session(default_access_mode=READ_ACCESS, bookmarks=bookmarks, **config)
+
+def read_current(work, **config):
+    """
+    Run a read transaction whose result is cached or indexed under the
+    topology version read before it.
+    
+    A follower may not have applied writes already counted in that version,
+    so the read runs as a write transaction, which a cluster routes to its
+    leader; it changes nothing. Only reads that are neither cached nor
+    indexed go to followers.
+    """
+    with get_db_session(**config) as session:
+        return session.execute_write(work)
+
+@contextmanager
+def get_write_session(**config):
+    """Get a session for writes whose bookmarks are returned with the response"""
+    with get_db_session(**config) as session:
+        yield session
+        if has_request_context():
+            g.neo4j_bookmarks = session.last_bookmarks()
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.profile_token = start_profile(request.method, request.path, profile_requested(request.args, request.headers))
+
+@app.after_request
+def finish_request_profile(response):
+    server_timing = finish_profile(g.pop('profile_token', None), response.status_code)
+    if server_timing:
+        response.headers['Server-Timing'] = server_timing
+    return response
+
+@app.teardown_request
+def discard_request_profile(error=None):
+    # Only still set when the request failed before after_request ran
+    finish_profile(g.pop('profile_token', None), 500)
+
+@app.after_request
+def observe_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is not None:
+        # Labelled by URL rule rather than path so object ids do not become labels
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        size = None if response.is_streamed else response.calculate_content_length()
+        observe_request(request.method, route, response.status_code, time.perf_counter() - start, size)
+    return response
+
+@app.after_request
+def add_bookmark_header(response):
+    bookmarks = g.pop('neo4j_bookmarks', None)
+    if bookmarks and bookmarks.raw_values:
+        response.headers[BOOKMARK_HEADER] = ",".join(sorted(bookmarks.raw_values))
+    return response
+
+# Registered last so it runs first, and metrics and profiles include the compression
+@app.after_request
+def compress_response(response):
+    """Compress JSON bodies in the best encoding the client accepts; streamed bodies are sent as they are"""
+    if not ENCODINGS or response.direct_passthrough or response.is_streamed:
+        return response
+    if 'Content-Encoding' in response.headers or not is_compressible(response.mimetype):
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is not None:
+        response.set_data(compress(body, encoding))
+        response.headers['Content-Encoding'] = encoding
+    return response
 
 # Initialize Neo4j with constraints - this is now primarily used only for development mode
 # Production initialization is handled by init_schema.py
@@ -151,8 +305,205 @@ def init_db():
         # we can continue as the app may still function
         pass
     
+    try:
+        create_indexes(driver)
+    except Exception as e:
+        print(f"Warning: Error creating indexes: {e}")
+    
+    try:
+        migrate_metadata(driver)
+    except Exception as e:
+        print(f"Warning: Error migrating metadata: {e}")
+    
     print("Database initialization completed (with potential warnings)")
 
+# Top-level keys of the /network response, and the NDJSON kind of their items
+NETWORK_SECTIONS = {"nodes": "node", "links": "link", "groups": "group"}
+
+def requested_stream_mode():
+    """Return 'ndjson' or 'json' when the client asked for a streamed response, else None"""
+    best = request.accept_mimetypes.best_match(['application/json', 'application/x-ndjson'])
+    if best == 'application/x-ndjson':
+        return 'ndjson'
+    if request.args.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return 'json'
+    return None
+
+class JSONChunkWriter:
+    """
+    Serializes items one at a time as NDJSON lines or as pieces of a JSON
+    document, so sync and async readers can frame a streamed response the
+    same way: start(), then add() per item, then end().
+    
+    Without sections the JSON document is an array. With sections, items are
+    (section, item) pairs grouped by section, and the document is an object with
+    one array per section, matching the non-streamed response.
+    """
+    
+    def __init__(self, mode, sections=None):
+        self.mode = mode
+        self.sections = sections
+        self.opened = []
+        self.separator = ""
+    
+    def start(self):
+        return "[" if self.mode == 'json' and not self.sections else ""
+    
+    def add(self, item):
+        dumps = app.json.dumps
+        if self.mode == 'ndjson':
+            if self.sections:
+                section, item = item
+                item = {"kind": self.sections[section], "data": item}
+            return dumps(item) + "\n"
+        
+        prefix = ""
+        if self.sections:
+            section, item = item
+            if not self.opened or self.opened[-1] != section:
+                prefix = self._open(section)
+        piece = prefix + self.separator + dumps(item)
+        self.separator = ","
+        return piece
+    
+    def end(self):
+        if self.mode == 'ndjson':
+            return ""
+        if not self.sections:
+            return "]"
+        # Sections without any items still appear as empty arrays
+        missing = [self._open(section) for section in self.sections if section not in self.opened]
+        return "".join(missing) + "]}"
+    
+    def _open(self, section):
+        prefix = ("{" if not self.opened else "],") + app.json.dumps(section) + ":["
+        self.opened.append(section)
+        self.separator = ""
+        return prefix
+
+def iter_json_chunks(mode, items, sections=None):
+    """Serialize items one by one as NDJSON lines or a chunked JSON document, as JSONChunkWriter frames them"""
+    writer = JSONChunkWriter(mode, sections)
+    start = writer.start()
+    if start:
+        yield start
+    for item in items:
+        yield writer.add(item)
+    end = writer.end()
+    if end:
+        yield end
+
+def stream_response(mode, iter_items, sections=None):
+    """
+    Stream the records produced by iter_items(session) without materializing them.
+    
+    The session is opened inside the generator so it stays alive while the
+    response is sent, and records are fetched NEO4J_FETCH_SIZE at a time. Small
+    pieces are joined into STREAM_CHUNK_SIZE writes to keep syscalls down.
+    """
+    # Read now: the generator runs after the request context is gone
+    bookmarks = request_bookmarks()
+    
+    name = f"stream_{request.endpoint}"
+    
+    def generate():
+        start = time.perf_counter()
+        with get_read_session(bookmarks, fetch_size=NEO4J_FETCH_SIZE) as session:
+            buffer = []
+            size = 0
+            for piece in iter_json_chunks(mode, iter_items(session), sections):
+                buffer.append(piece)
+                size += len(piece)
+                if size >= STREAM_CHUNK_SIZE:
+                    yield "".join(buffer)
+                    buffer = []
+                    size = 0
+            if buffer:
+                yield "".join(buffer)
+        # Includes the time spent waiting for the client to read
+        time_query(name, time.perf_counter() - start)
+    
+    mimetype = 'application/x-ndjson' if mode == 'ndjson' else 'application/json'
+    return app.response_class(generate(), mimetype=mimetype)
+
+# Query parameters of the form metadata_<key>=<value> filter list endpoints
+METADATA_FILTER_PARAM = re.compile(r'^metadata_(\w+)$')
+
+# Fields that list endpoints can project; stores return metadata as the raw
+# properties, decoded here
+OBJECT_FIELDS = ['id', 'name', 'type', 'metadata']
+RELATIONSHIP_FIELDS = ['id', 'source_id', 'target_id', 'type', 'metadata']
+
+def metadata_filter_values(key, raw):
+    """Return the stored values a metadata filter matches, so ?metadata_vlan=10 finds 10 and '10'"""
+    if key in METADATA_SCHEMA:
+        # Declared keys are stored in one canonical form, which the index can
+        # match, plus any form older values may have until they are migrated
+        return metadata_filter_forms(key, raw)
+    values = [raw]
+    try:
+        parsed = json.loads(raw)
+    except ValueError:
+        return values
+    if isinstance(parsed, (int, float, bool)):
+        values.append(parsed)
+    return values
+
+def parse_list_options(fields, filter_params):
+    """
+    Parse the pagination, filter and projection parameters of a list endpoint.
+    
+    Pagination is keyset based: 'after' is the last id of the previous page and
+    'limit' the page size (at most MAX_PAGE_SIZE). Raises ValueError with a
+    message for the client when a parameter is invalid.
+    """
+    args = request.args
+    options = {
+        "after": args.get('after'),
+        "limit": None,
+        "filters": {},
+        "metadata": {},
+        "fields": list(fields)
+    }
+    
+    if 'limit' in args or options["after"] is not None:
+        raw_limit = args.get('limit', str(MAX_PAGE_SIZE))
+        if not raw_limit.isdigit() or int(raw_limit) < 1:
+            raise ValueError("'limit' must be a positive integer")
+        limit = int(raw_limit)
+        options["limit"] = min(limit, MAX_PAGE_SIZE)
+    
+    for name in filter_params:
+        if name in args:
+            options["filters"][name] = args.get(name).split(',')
+    
+    for key, value in args.items():
+        match = METADATA_FILTER_PARAM.match(key)
+        if match:
+            options["metadata"][match.group(1)] = metadata_filter_values(match.group(1), value)
+    
+    if 'fields' in args:
+        requested = [field.strip() for field in args.get('fields').split(',') if field.strip()]
+        unknown = [field for field in requested if field not in fields]
+        if not requested or unknown:
+            raise ValueError(f"'fields' must be a comma-separated subset of: {', '.join(fields)}")
+        options["fields"] = requested
+    
+    return options
+
+def list_response(mode, iter_items, options, name):
+    """Return a list endpoint response, streamed or with an X-Next-Cursor header for full pages"""
+    if mode:
+        return stream_response(mode, lambda session: iter_items(session, options))
+    
+    with get_read_session() as session:
+        items = session.execute_read(timed_query(name)(lambda tx: list(iter_items(tx, options))))
+    
+    response = jsonify(items)
+    if options["limit"] is not None and len(items) == options["limit"] and 'id' in options["fields"]:
+        response.headers['X-Next-Cursor'] = items[-1]['id']
+    return response
+
 # API endpoints
 @app.route('/objects', methods=['POST'])
 def add_object():
@@ -162,33 +513,26 @@ def add_object():
     obj_type = data.get('type', 'generic')
     metadata = data.get('metadata', {})
     
-    # Flatten metadata to primitive types since Neo4j doesn't support nested objects
-    flat_properties = {
-        'id': object_id,
-        'name': name,
-        'type': obj_type
-    }
+    # Flatten metadata to primitive types since stored properties can't hold nested objects
+    try:
+        flat_properties = flatten_object_properties(object_id, name, obj_type, metadata)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    metadata = decode_metadata(flat_properties)
     
-    # Add metadata fields as separate properties
-    if metadata:
-        for key, value in metadata.items():
-            flat_properties[f"metadata_{key}"] = value
+    @timed_query("create_object")
+    def create(tx):
+        return store.create_object(tx, flat_properties)
     
-    with get_db_session() as session:
-        # Build the Cypher query dynamically based on available properties
-        query_parts = []
-        for key in flat_properties:
-            query_parts.append(f"{key}: ${key}")
-        
-        query = f"""
-            CREATE (o:NetworkObject {{{', '.join(query_parts)}}})
-            RETURN o
-        """
-        
-        result = session.run(query, **flat_properties)
-        record = result.single()
+    with get_write_session() as session:
+        created_id = session.execute_write(create)
         
-        if record:
+        if created_id is not None:
+            record_change('create', 'object', object_id, {
+                'name': name,
+                'type': obj_type,
+                'metadata': metadata
+            })
             return jsonify({
                 'id': object_id,
                 'name': name,
@@ -198,26 +542,25 @@ def add_object():
         else:
             return jsonify({"error": "Failed to create object"}), 500
 
+# Unfiltered, unpaginated listings with every field, as returned without parameters
+DEFAULT_OBJECT_LIST = {"after": None, "limit": None, "filters": {}, "metadata": {}, "fields": OBJECT_FIELDS}
+DEFAULT_RELATIONSHIP_LIST = {"after": None, "limit": None, "filters": {}, "metadata": {}, "fields": RELATIONSHIP_FIELDS}
+
+def iter_objects(session, options=None):
+    """Yield network objects with metadata reconstructed from their flattened properties"""
+    for obj in store.iter_objects(session, options or DEFAULT_OBJECT_LIST):
+        if 'metadata' in obj:
+            obj['metadata'] = decode_metadata(obj['metadata'] or {})
+        yield obj
+
 @app.route('/objects', methods=['GET'])
 def get_objects():
-    with get_db_session() as session:
-        # Query to retrieve all objects and reconstruct metadata from flattened properties
-        result = session.run("""
-            MATCH (o:NetworkObject)
-            WITH o, 
-                 [k in keys(o) WHERE k STARTS WITH 'metadata_'] AS metadata_keys,
-                 o.id as id, o.name as name, o.type as type
-            
-            WITH o, metadata_keys, id, name, type,
-                 apoc.map.fromLists(
-                    [k in metadata_keys | substring(k, 9)],
-                    [k in metadata_keys | o[k]]
-                 ) AS metadata_map
-            
-            RETURN id, name, type, metadata_map as metadata
-        """)
-        objects = [dict(record) for record in result]
-        return jsonify(objects)
+    try:
+        options = parse_list_options(OBJECT_FIELDS, ['type'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return list_response(requested_stream_mode(), iter_objects, options, "list_objects")
 
 @app.route('/relationships', methods=['POST'])
 def add_relationship():
@@ -233,204 +576,222 @@ def add_relationship():
     if not source_id or not target_id:
         return jsonify({"error": "Source and target IDs are required"}), 400
     
-    # Handle metadata properly - Neo4j doesn't support complex types as properties
-    # Instead flatten any metadata properties or store as JSON string
-    rel_properties = {
-        'id': relationship_id,
-        'type': connection_type
-    }
+    # Handle metadata properly - stored properties can't hold complex types
+    try:
+        rel_properties = flatten_relationship_properties(relationship_id, connection_type, metadata)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Process metadata to ensure all values are primitive types
-    if metadata:
-        if isinstance(metadata, dict):
-            # Flatten simple key/value pairs
-            for key, value in metadata.items():
-                if isinstance(value, (str, int, float, bool)) or (isinstance(value, list) and all(isinstance(x, (str, int, float, bool)) for x in value)):
-                    # For primitive values, store directly
-                    rel_properties[f'metadata_{key}'] = value
-                else:
-                    # For complex values, serialize to JSON
-                    rel_properties[f'metadata_{key}_json'] = json.dumps(value)
-    
-    with get_db_session() as session:
-        # Check if both objects exist
-        result = session.run(
-            """
-            MATCH (source:NetworkObject {id: $source_id})
-            MATCH (target:NetworkObject {id: $target_id})
-            CREATE (source)-[r:CONNECTS $properties]->(target)
-            RETURN source.id as source_id, target.id as target_id, r.id as id, r.type as type
-            """,
-            source_id=source_id, target_id=target_id, properties=rel_properties
-        )
-        record = result.single()
+    @timed_query("create_relationship")
+    def create(tx):
+        # Only creates the relationship when both objects exist
+        return store.create_relationship(tx, source_id, target_id, rel_properties)
+    
+    with get_write_session() as session:
+        created = session.execute_write(create)
         
-        if record:
+        if created:
             # Extract all metadata properties from the relationship
-            response_data = dict(record)
+            response_data = created
             
             # Add any metadata back into the response in a structured way
-            metadata = {}
-            for key in rel_properties:
-                if key.startswith('metadata_'):
-                    # Strip the 'metadata_' prefix to get original key
-                    original_key = key[9:]
-                    if key.endswith('_json'):
-                        # Parse JSON for complex types
-                        original_key = original_key[:-5]  # Remove '_json' suffix
-                        try:
-                            metadata[original_key] = json.loads(rel_properties[key])
-                        except (ValueError, TypeError):
-                            metadata[original_key] = rel_properties[key]
-                    else:
-                        metadata[original_key] = rel_properties[key]
+            metadata = decode_metadata(rel_properties)
             
             # Add metadata to response if any exists
             if metadata:
                 response_data['metadata'] = metadata
-                
+            
+            record_change('create', 'relationship', relationship_id, {
+                'source_id': source_id,
+                'target_id': target_id,
+                'type': connection_type,
+                'metadata': metadata
+            })
             return jsonify(response_data), 201
         else:
             return jsonify({"error": "Failed to create relationship"}), 500
 
-@app.route('/relationships', methods=['GET'])
-def get_relationships():
-    with get_db_session() as session:
-        result = session.run(
-            """
-            MATCH (source:NetworkObject)-[r:CONNECTS]->(target:NetworkObject)
-            RETURN source.id as source_id, target.id as target_id, r.id as id, r.type as type,
-                   properties(r) as properties
-            """
-        )
-        
-        # Process relationships to extract metadata
-        relationships = []
-        for record in result:
-            rel_data = dict(record)
-            properties = rel_data.pop('properties', {})
-            
-            # Extract metadata into a structured object
-            metadata = {}
-            for key, value in properties.items():
-                if key.startswith('metadata_'):
-                    # Strip the 'metadata_' prefix
-                    orig_key = key[9:]
-                    if key.endswith('_json'):
-                        # Parse JSON for complex values
-                        orig_key = orig_key[:-5]  # Remove '_json' suffix
-                        try:
-                            metadata[orig_key] = json.loads(value)
-                        except (ValueError, TypeError):
-                            metadata[orig_key] = value
-                    else:
-                        metadata[orig_key] = value
+def iter_relationships(session, options=None):
+    """Yield relationships with their metadata decoded"""
+    for rel_data in store.iter_relationships(session, options or DEFAULT_RELATIONSHIP_LIST):
+        if 'metadata' in rel_data:
+            metadata = decode_metadata(rel_data.pop('metadata') or {})
             
             # Add metadata if it exists
             if metadata:
                 rel_data['metadata'] = metadata
-                
-            relationships.append(rel_data)
-            
-        return jsonify(relationships)
+        yield rel_data
+
+@app.route('/relationships', methods=['GET'])
+def get_relationships():
+    try:
+        options = parse_list_options(RELATIONSHIP_FIELDS, ['type', 'source_id', 'target_id'])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    return list_response(requested_stream_mode(), iter_relationships, options, "list_relationships")
+
+def network_item(section, properties, source, target, node_ids):
+    """Turn one row of store.iter_network() into its (section, item) pair"""
+    if section == "nodes":
+        node, metadata = split_properties(properties)
+        if metadata:
+            node["metadata"] = metadata
+        return section, node
+    if section == "links":
+        # Extract basic link properties
+        link = {
+            "id": properties.get("id"),
+            "source": source,
+            "target": target,
+            "type": properties.get("type")
+        }
+        
+        # Add metadata if it exists
+        metadata = decode_metadata(properties)
+        if metadata:
+            link["metadata"] = metadata
+        return section, link
+    properties["nodeIds"] = node_ids
+    return section, properties
+
+def iter_network(session):
+    """Yield (section, item) pairs for every node, link and group of the network graph"""
+    for row in store.iter_network(session):
+        yield network_item(*row)
+
+def read_network_graph():
+    """Read every object, relationship and group from the store"""
+    @timed_query("read_network")
+    def read(tx):
+        # Built inside the transaction function so a retry starts from scratch
+        graph = {section: [] for section in NETWORK_SECTIONS}
+        for section, item in iter_network(tx):
+            graph[section].append(item)
+        return graph
+    
+    # Cached under the current version; the whole result is needed anyway,
+    # so fetch it in one round trip
+    return read_current(read, fetch_size=-1)
+
+def snapshot_response(snapshot):
+    """Serve a cached snapshot with a strong ETag, answering 304 when it matches"""
+    # The compressed variant is built once per version and kept with the snapshot
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'))
+    response = app.response_class(snapshot_variant(snapshot, encoding), mimetype='application/json')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.set_etag(variant_etag(snapshot.etag, encoding))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Topology-Version'] = format_version(snapshot.version)
+    if ENCODINGS:
+        response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
+
+def network_view_key(collapse, zoom):
+    """
+    Return the snapshot cache key of the /network view selected by the
+    'collapse' and 'zoom' parameters; raises ValueError when they are invalid.
+    """
+    if collapse is None:
+        return 'network'
+    if collapse != 'groups':
+        raise ValueError("'collapse' must be 'groups'")
+    collapse_all = False
+    if zoom is not None:
+        try:
+            collapse_all = float(zoom) < LOD_ZOOM_THRESHOLD
+        except ValueError:
+            raise ValueError("'zoom' must be a number")
+    # Only two distinct collapsed views exist per version, whatever the exact zoom level
+    return 'network:collapsed:all' if collapse_all else 'network:collapsed'
+
+def serialize_network_view(key, graph):
+    """Serialize the graph as the view named by a network_view_key() key"""
+    start = time.perf_counter()
+    if key != 'network':
+        # Level-of-detail view with collapsed groups folded into super-nodes
+        graph = collapse_groups(graph, key == 'network:collapsed:all')
+    body = app.json.dumps(graph)
+    time_serialize(key, time.perf_counter() - start)
+    return body
 
 @app.route('/network', methods=['GET'])
 def get_network():
-    with get_db_session() as session:
-        # Get all objects
-        objects_result = session.run("""
-            MATCH (o:NetworkObject)
-            RETURN o
-        """)
-        
-        nodes = []
-        for record in objects_result:
-            node = dict(record["o"].items())
-            nodes.append(node)
-        
-        # Get all relationships
-        relationships_result = session.run("""
-            MATCH (source:NetworkObject)-[r:CONNECTS]->(target:NetworkObject)
-            RETURN r.id AS id, source.id AS source, target.id AS target, r.type AS type,
-                   properties(r) AS properties
-        """)
-        
-        links = []
-        for record in relationships_result:
-            # Extract basic link properties
-            link = {
-                "id": record["id"],
-                "source": record["source"],
-                "target": record["target"],
-                "type": record["type"]
-            }
-            
-            # Process metadata from properties
-            properties = record.get("properties", {})
-            metadata = {}
-            
-            for key, value in properties.items():
-                if key.startswith('metadata_'):
-                    # Strip the 'metadata_' prefix
-                    orig_key = key[9:]
-                    if key.endswith('_json'):
-                        # Parse JSON for complex values
-                        orig_key = orig_key[:-5]  # Remove '_json' suffix
-                        try:
-                            metadata[orig_key] = json.loads(value)
-                        except (ValueError, TypeError):
-                            metadata[orig_key] = value
-                    else:
-                        metadata[orig_key] = value
-            
-            # Add metadata if it exists
-            if metadata:
-                link['metadata'] = metadata
-            links.append(link)
-        
-        # Get all device groups
-        groups_result = session.run("""
-            MATCH (g:DeviceGroup)
-            OPTIONAL MATCH (g)-[:CONTAINS]->(o:NetworkObject)
-            RETURN g AS group, COLLECT(o.id) AS nodeIds
-        """)
-        
-        groups = []
-        for record in groups_result:
-            group_data = dict(record["group"].items())
-            group_data["nodeIds"] = record["nodeIds"]
-            groups.append(group_data)
-        
-        return jsonify({
-            "nodes": nodes,
-            "links": links,
-            "groups": groups
-        })
+    # Read the version before the graph so a concurrent write can only make
+    # the snapshot newer than its tag, never older
+    version = get_topology_version()
+    
+    try:
+        key = network_view_key(request.args.get('collapse'), request.args.get('zoom'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    # A client sending a bookmark has just written and must see that write, which
+    # may be newer than the cached snapshot
+    snapshot = None
+    if not request_bookmarks():
+        snapshot = network_cache.get(key, version)
+        observe_cache(key, snapshot is not None)
+    
+    # A cached snapshot is already in memory, so only stream when there is none
+    mode = requested_stream_mode()
+    if key == 'network' and (mode == 'ndjson' or (mode and snapshot is None)):
+        return stream_response(mode, iter_network, sections=NETWORK_SECTIONS)
+    
+    if snapshot is None:
+        snapshot = network_cache.put(key, version, serialize_network_view(key, read_network_graph()))
+    return snapshot_response(snapshot)
+
+def network_changes(since):
+    """
+    Return the /network/changes body for a 'since' version token, as given by
+    X-Topology-Version. Raises ValueError when it is not a version.
+    """
+    if since is None:
+        raise ValueError("A 'since' version, as given by X-Topology-Version, is required")
+    version, changes = get_changes_since(parse_version(since))
+    if changes is None:
+        # The log no longer reaches back to 'since', or 'since' is from before a
+        # restart; the client must reload /network
+        return {"version": format_version(version), "resync": True}
+    return {"version": format_version(version), "changes": changes}
+
+@app.route('/network/changes', methods=['GET'])
+def get_network_changes():
+    try:
+        return jsonify(network_changes(request.args.get('since')))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/events', methods=['GET'])
+def get_events():
+    """
+    The stream is served by asgi.py, which routes /events ahead of this app.
+    Under a WSGI server every open stream would hold a worker thread, so a few
+    open pages would stall every other route; clients poll /network/changes.
+    """
+    return jsonify({"error": "/events is only served with SERVER_MODE=asgi; poll /network/changes instead"}), 501
 
 @app.route('/objects/<object_id>', methods=['DELETE'])
 def delete_object(object_id):
-    with get_db_session() as session:
-        # First delete all relationships involving this object
-        session.run(
-            """
-            MATCH (n:NetworkObject {id: $id})-[r]-() 
-            DELETE r
-            """,
-            id=object_id
-        )
-        
-        # Then delete the object itself
-        result = session.run(
-            """
-            MATCH (n:NetworkObject {id: $id})
-            DELETE n
-            RETURN count(n) as deleted
-            """,
-            id=object_id
-        )
+    @timed_query("delete_object")
+    def delete(tx):
+        # Remove the object with its connections and group memberships, keeping
+        # what the cascade removed so it can be reported as changes
+        return store.delete_object(tx, object_id)
+    
+    with get_write_session() as session:
+        deleted = session.execute_write(delete)
         
-        record = result.single()
-        if record and record["deleted"] > 0:
+        if deleted is not None:
+            relationship_ids, groups = deleted
+            # Clients applying the log see the cascade as the changes it made:
+            # each connection deleted, and each group left with fewer members
+            record_changes(
+                [('delete', 'relationship', rel_id, None) for rel_id in relationship_ids] +
+                [('update', 'group', group_id, {'nodeIds': node_ids}) for group_id, node_ids in groups.items()] +
+                [('delete', 'object', object_id, None)]
+            )
             return jsonify({"message": "Object deleted successfully"}), 200
         else:
             return jsonify({"error": "Object not found"}), 404
@@ -440,68 +801,61 @@ def update_object(object_id):
     data = request.json
     metadata = data.get('metadata', {})
     
-    # Flatten metadata to primitive types
-    flat_properties = {}
-    if metadata:
-        for key, value in metadata.items():
-            if value is not None:  # Only include non-null values
-                flat_properties[f"metadata_{key}"] = value
-    
-    if not flat_properties:
+    if not isinstance(metadata, dict) or not metadata:
         return jsonify({"error": "No properties to update"}), 400
     
-    with get_db_session() as session:
-        # Build the Cypher query to set each property
-        set_clauses = []
-        for key in flat_properties:
-            set_clauses.append(f"o.{key} = ${key}")
-        
-        # Remove properties that are set to null
-        for key, value in metadata.items():
-            if value is None:
-                set_clauses.append(f"REMOVE o.metadata_{key}")
-        
-        query = f"""
-            MATCH (o:NetworkObject {{id: $id}})
-            SET {', '.join(set_clauses)}
-            WITH o,
-                 [k in keys(o) WHERE k STARTS WITH 'metadata_'] AS metadata_keys,
-                 o.id as id, o.name as name, o.type as type
-            
-            WITH o, metadata_keys, id, name, type,
-                 apoc.map.fromLists(
-                    [k in metadata_keys | substring(k, 9)],
-                    [k in metadata_keys | o[k]]
-                 ) AS metadata_map
-            
-            RETURN id, name, type, metadata_map as metadata
-        """
-        
-        result = session.run(query, id=object_id, **flat_properties)
-        record = result.single()
+    # A None value removes that property
+    try:
+        properties = metadata_update_properties(metadata)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    @timed_query("update_object")
+    def update(tx):
+        return store.update_object(tx, object_id, properties)
+    
+    with get_write_session() as session:
+        record = session.execute_write(update)
         
         if record:
-            return jsonify(dict(record)), 200
+            record_change('update', 'object', object_id, {
+                'metadata': {key: coerce_metadata_value(key, value) for key, value in metadata.items()}
+            })
+            return jsonify({
+                'id': record['id'],
+                'name': record['name'],
+                'type': record['type'],
+                'metadata': decode_metadata(record['properties'])
+            }), 200
         else:
             return jsonify({"error": "Object not found"}), 404
 
 @app.route('/groups', methods=['GET'])
 def get_all_groups():
-    with get_db_session() as session:
-        result = session.run("""
-            MATCH (g:DeviceGroup)
-            OPTIONAL MATCH (g)-[:CONTAINS]->(o:NetworkObject)
-            RETURN g AS group, COLLECT(o.id) AS nodeIds
-        """)
-        
+    @timed_query("read_groups")
+    def read(tx):
         groups = []
-        for record in result:
-            group_data = record["group"]
-            group = dict(group_data.items())
-            group["nodeIds"] = record["nodeIds"]
+        for group, node_ids in store.read_groups(tx):
+            group["nodeIds"] = node_ids
             groups.append(group)
-            
-        return jsonify(groups)
+        return groups
+    
+    with get_read_session() as session:
+        return jsonify(session.execute_read(read))
+
+def apply_group_membership_diff(tx, group_id, added_ids, removed_ids):
+    """Create and delete only the CONTAINS edges that changed, returning (added ids, removed count)"""
+    added = []
+    removed = 0
+    
+    if removed_ids:
+        removed = store.remove_group_members(tx, group_id, removed_ids)
+    
+    if added_ids:
+        # Ids of objects that do not exist are skipped, as before
+        added = store.add_group_members(tx, group_id, added_ids)
+    
+    return added, removed
 
 @app.route('/groups', methods=['POST'])
 def create_group():
@@ -513,52 +867,49 @@ def create_group():
     y = data.get('y', 0)
     expanded = data.get('expanded', False)
     
-    with get_db_session() as session:
-        # Create the group node
-        group_result = session.run("""
-            CREATE (g:DeviceGroup {id: $id, name: $name, x: $x, y: $y, expanded: $expanded})
-            RETURN g
-        """, id=group_id, name=name, x=x, y=y, expanded=expanded)
-        
-        # Link the group to its member nodes
-        for node_id in node_ids:
-            session.run("""
-                MATCH (g:DeviceGroup {id: $group_id})
-                MATCH (o:NetworkObject {id: $node_id})
-                CREATE (g)-[:CONTAINS]->(o)
-            """, group_id=group_id, node_id=node_id)
+    @timed_query("create_group")
+    def create(tx):
+        # Create the group node and link it to its members in the same transaction
+        group = store.create_group(tx, {"id": group_id, "name": name, "x": x, "y": y, "expanded": expanded})
+        added, _ = apply_group_membership_diff(tx, group_id, list(dict.fromkeys(node_ids)), [])
+        return group, added
+    
+    with get_write_session() as session:
+        group, added = session.execute_write(create)
         
-        # Return the created group
-        group = group_result.single()["g"]
+        # Return the created group with the members actually linked: repeated
+        # ids and ids of objects that do not exist are left out
+        record_change('create', 'group', group_id, {
+            'name': name,
+            'x': x,
+            'y': y,
+            'expanded': expanded,
+            'nodeIds': added
+        })
         return jsonify({
-            "id": group["id"],
-            "name": group["name"],
-            "x": group["x"],
-            "y": group["y"],
-            "expanded": group["expanded"],
-            "nodeIds": node_ids
+            "id": group.get("id"),
+            "name": group.get("name"),
+            "x": group.get("x"),
+            "y": group.get("y"),
+            "expanded": group.get("expanded"),
+            "nodeIds": added,
+            "added": len(added),
+            "removed": 0
         })
 
 @app.route('/groups/<group_id>', methods=['DELETE'])
 def delete_group(group_id):
-    with get_db_session() as session:
-        # Delete the group's relationships first
-        session.run("""
-            MATCH (g:DeviceGroup {id: $id})-[r:CONTAINS]->()
-            DELETE r
-        """, id=group_id)
-        
-        # Delete the group
-        result = session.run("""
-            MATCH (g:DeviceGroup {id: $id})
-            DELETE g
-            RETURN COUNT(g) AS deleted
-        """, id=group_id)
-        
-        count = result.single()["deleted"]
+    @timed_query("delete_group")
+    def delete(tx):
+        # Delete the group together with its CONTAINS relationships
+        return store.delete_group(tx, group_id)
+    
+    with get_write_session() as session:
+        count = session.execute_write(delete)
         if count == 0:
             return jsonify({"error": "Group not found"}), 404
         
+        record_change('delete', 'group', group_id)
         return jsonify({"message": "Group deleted successfully"})
 
 @app.route('/groups/<group_id>', methods=['PATCH'])
@@ -576,63 +927,602 @@ def update_group(group_id):
     if 'expanded' in data:
         updates["expanded"] = data["expanded"]
     
-    update_clause = ", ".join([f"g.{key} = ${key}" for key in updates.keys()])
-    
-    with get_db_session() as session:
-        if update_clause:
-            result = session.run(f"""
-                MATCH (g:DeviceGroup {{id: $id}})
-                SET {update_clause}
-                RETURN g
-            """, id=group_id, **updates)
-        else:
-            result = session.run("""
-                MATCH (g:DeviceGroup {id: $id})
-                RETURN g
-            """, id=group_id)
+    @timed_query("update_group")
+    def update(tx):
+        updated = store.update_group(tx, group_id, updates)
+        if updated is None:
+            return None
         
-        group = result.single()
-        if not group:
-            return jsonify({"error": "Group not found"}), 404
+        group, node_ids = updated
+        added, removed = [], 0
         
-        # Update node memberships if nodeIds is provided
+        # Update node memberships if nodeIds is provided, touching only the edges that changed
         if 'nodeIds' in data:
-            new_node_ids = data['nodeIds']
-            
-            # Remove all existing relationships
-            session.run("""
-                MATCH (g:DeviceGroup {id: $id})-[r:CONTAINS]->()
-                DELETE r
-            """, id=group_id)
-            
-            # Create new relationships
-            for node_id in new_node_ids:
-                session.run("""
-                    MATCH (g:DeviceGroup {id: $group_id})
-                    MATCH (o:NetworkObject {id: $node_id})
-                    CREATE (g)-[:CONTAINS]->(o)
-                """, group_id=group_id, node_id=node_id)
+            current_ids = set(node_ids)
+            wanted_ids = list(dict.fromkeys(data['nodeIds']))
+            wanted_set = set(wanted_ids)
+            added, removed = apply_group_membership_diff(
+                tx, group_id,
+                [node_id for node_id in wanted_ids if node_id not in current_ids],
+                [node_id for node_id in node_ids if node_id not in wanted_set]
+            )
+            node_ids = [node_id for node_id in node_ids if node_id in wanted_set] + added
         
-        # Get the updated group with its node IDs
-        final_result = session.run("""
-            MATCH (g:DeviceGroup {id: $id})
-            OPTIONAL MATCH (g)-[:CONTAINS]->(o:NetworkObject)
-            RETURN g AS group, COLLECT(o.id) AS nodeIds
-        """, id=group_id)
+        return group, node_ids, added, removed
+    
+    with get_write_session() as session:
+        result = session.execute_write(update)
+        if result is None:
+            return jsonify({"error": "Group not found"}), 404
         
-        record = final_result.single()
-        group_data = dict(record["group"].items())
-        group_data["nodeIds"] = record["nodeIds"]
+        group_data, node_ids, added, removed = result
+        group_data["nodeIds"] = node_ids
+        group_data["added"] = len(added)
+        group_data["removed"] = removed
         
+        changed = dict(updates)
+        if 'nodeIds' in data:
+            changed['nodeIds'] = node_ids
+        record_change('update', 'group', group_id, changed)
         return jsonify(group_data)
 
+def parse_connection_type_filter():
+    """
+    Return the via_types and exclude_types store arguments given by the via_type
+    and exclude_type query parameters (comma-separated connection types).
+    """
+    type_filter = {}
+    if request.args.get('via_type'):
+        type_filter["via_types"] = request.args.get('via_type').split(',')
+    if request.args.get('exclude_type'):
+        type_filter["exclude_types"] = request.args.get('exclude_type').split(',')
+    return type_filter
+
+def parse_bounded_int(name, default, maximum):
+    """Read a positive integer query parameter, capped at maximum"""
+    raw = request.args.get(name, str(default))
+    if not raw.isdigit() or int(raw) < 1:
+        raise ValueError(f"'{name}' must be a positive integer")
+    return min(int(raw), maximum)
+
+@app.route('/paths', methods=['GET'])
+def find_paths():
+    from_id = request.args.get('from')
+    to_id = request.args.get('to')
+    if not from_id or not to_id:
+        return jsonify({"error": "Both 'from' and 'to' object IDs are required"}), 400
+    
+    try:
+        max_hops = parse_bounded_int('max_hops', PATHS_MAX_HOPS, PATHS_MAX_HOPS)
+        limit = parse_bounded_int('limit', 10, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    type_filter = parse_connection_type_filter()
+    all_paths = request.args.get('all', '').lower() in ('1', 'true', 'yes')
+    
+    @timed_query("find_paths")
+    def read_paths(tx):
+        found = {node["id"]: node for node in store.read_object_summaries(tx, [from_id, to_id])}
+        missing = [object_id for object_id in (from_id, to_id) if object_id not in found]
+        if missing:
+            return missing, []
+        if from_id == to_id:
+            return missing, [{"hops": 0, "nodes": [found[from_id]], "links": []}]
+        
+        paths = store.shortest_paths(tx, from_id, to_id, max_hops, limit, all_paths, **type_filter)
+        return missing, [{"hops": len(links), "nodes": nodes, "links": links} for nodes, links in paths]
+    
+    with get_read_session() as session:
+        missing, paths = session.execute_read(read_paths)
+    
+    if missing:
+        return jsonify({"error": f"Object not found: {', '.join(missing)}"}), 404
+    
+    return jsonify({
+        "from": from_id,
+        "to": to_id,
+        "found": bool(paths),
+        "paths": paths
+    })
+
+@app.route('/objects/<object_id>/reachable', methods=['GET'])
+def get_reachable_objects(object_id):
+    try:
+        depth = parse_bounded_int('depth', 3, PATHS_MAX_HOPS)
+        limit = parse_bounded_int('limit', MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    type_filter = parse_connection_type_filter()
+    
+    @timed_query("read_reachable")
+    def read_reachable(tx):
+        if not store.object_exists(tx, object_id):
+            return None, False
+        
+        # Breadth-first expansion one hop per query, visiting each object once,
+        # instead of a variable-length match that enumerates every path
+        visited = {object_id}
+        frontier = [object_id]
+        reachable = []
+        for hops in range(1, depth + 1):
+            if not frontier:
+                break
+            neighbors = store.read_neighbors(tx, frontier, **type_filter)
+            frontier = []
+            for neighbor in neighbors:
+                if neighbor["id"] in visited:
+                    continue
+                if len(reachable) == limit:
+                    return reachable, True
+                visited.add(neighbor["id"])
+                frontier.append(neighbor["id"])
+                reachable.append({**neighbor, "hops": hops})
+        return reachable, False
+    
+    with get_read_session() as session:
+        reachable, truncated = session.execute_read(read_reachable)
+    
+    if reachable is None:
+        return jsonify({"error": "Object not found"}), 404
+    
+    return jsonify({
+        "id": object_id,
+        "depth": depth,
+        "reachable": reachable,
+        "truncated": truncated
+    })
+
+def read_adjacency_graph():
+    """Read the (id, type) of every object and the endpoints of every connection"""
+    return read_current(timed_query("read_adjacency")(store.read_adjacency), fetch_size=NEO4J_FETCH_SIZE)
+
+def get_adjacency_index():
+    """Return the adjacency index, loading it from the store on first use"""
+    if not adjacency_index.loaded:
+        with adjacency_load_lock:
+            # The change log can be compacted mid-read on a busy system; try again
+            for _ in range(3):
+                if adjacency_index.loaded or adjacency_index.load(read_adjacency_graph, get_changes_since, get_topology_version):
+                    break
+    return adjacency_index if adjacency_index.loaded else None
+
+def parse_excluded_types():
+    exclude_type = request.args.get('exclude_type')
+    return exclude_type.split(',') if exclude_type else None
+
+@app.route('/objects/<object_id>/impact', methods=['GET'])
+def get_object_impact(object_id):
+    index = get_adjacency_index()
+    if index is None:
+        return jsonify({"error": "Adjacency index is not available, try again"}), 503
+    
+    # Roots default to every 'internet' object
+    root = request.args.get('root')
+    impact = index.impact(object_id, root.split(',') if root else None, parse_excluded_types())
+    if impact is None:
+        return jsonify({"error": "Object not found"}), 404
+    
+    return jsonify(impact)
+
+@app.route('/network/articulation-points', methods=['GET'])
+def get_articulation_points():
+    index = get_adjacency_index()
+    if index is None:
+        return jsonify({"error": "Adjacency index is not available, try again"}), 503
+    
+    return jsonify({"ids": index.articulation_points(parse_excluded_types())})
+
+def read_lookup_objects():
+    """Read the name, type and addressing metadata of every object"""
+    @timed_query("read_lookup_objects")
+    def read(tx):
+        return [
+            (object_id, name, obj_type, decode_metadata(properties))
+            for object_id, name, obj_type, properties in store.read_lookup_objects(tx, LOOKUP_METADATA_KEYS)
+        ]
+    
+    return read_current(read, fetch_size=NEO4J_FETCH_SIZE)
+
+def get_lookup_index():
+    """Return the lookup index, loading it from the store on first use"""
+    if not lookup_index.loaded:
+        with lookup_load_lock:
+            for _ in range(3):
+                if lookup_index.loaded or lookup_index.load(read_lookup_objects, get_changes_since, get_topology_version):
+                    break
+    return lookup_index if lookup_index.loaded else None
+
+@app.route('/lookup', methods=['GET'])
+def lookup_objects():
+    searches = [name for name in ('ip', 'mac', 'cidr', 'name_prefix') if request.args.get(name)]
+    if len(searches) != 1:
+        return jsonify({"error": "Exactly one of 'ip', 'mac', 'cidr' or 'name_prefix' is required"}), 400
+    search = searches[0]
+    value = request.args[search]
+    
+    try:
+        limit = parse_bounded_int('limit', MAX_PAGE_SIZE, MAX_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    index = get_lookup_index()
+    if index is None:
+        return jsonify({"error": "Lookup index is not available, try again"}), 503
+    
+    try:
+        if search == 'ip':
+            objects = index.by_ip(value)
+        elif search == 'mac':
+            objects = index.by_mac(value)
+        elif search == 'cidr':
+            objects = index.in_cidr(value, limit)
+        else:
+            objects = index.by_name_prefix(value, limit)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid '{search}': {e}"}), 400
+    
+    return jsonify(objects)
+
+@app.route('/lookup/subnets', methods=['GET'])
+def lookup_subnets():
+    index = get_lookup_index()
+    if index is None:
+        return jsonify({"error": "Lookup index is not available, try again"}), 503
+    
+    return jsonify(index.subnets())
+
+def write_positions(session, kind, positions):
+    """Store x/y coordinates on objects or groups, as kind says, in BULK_BATCH_SIZE batches"""
+    rows = [{"id": node_id, "x": x, "y": y} for node_id, (x, y) in positions.items()]
+    for start in range(0, len(rows), BULK_BATCH_SIZE):
+        session.execute_write(timed_query("write_positions")(store.write_positions), kind,
+                              rows[start:start + BULK_BATCH_SIZE])
+
+def run_layout(incremental=True, iterations=None):
+    """
+    Compute and persist positions, returning (objects moved, groups moved).
+    
+    An incremental run only moves objects without a stored position and those
+    touched by topology changes since the last run, plus their neighbors.
+    """
+    changed = layout_tracker.take_changed() if incremental else set()
+    try:
+        with get_write_session(fetch_size=NEO4J_FETCH_SIZE) as session:
+            nodes, edges, groups = session.execute_read(timed_query("read_layout_graph")(store.read_layout_graph))
+            node_positions, group_positions = compute_layout(
+                nodes.keys(), edges, groups,
+                positions=nodes,
+                movable_ids=changed if incremental else None,
+                iterations=iterations
+            )
+            if incremental:
+                # Only groups with a member that moved need a new centre
+                group_positions = {
+                    group_id: position for group_id, position in group_positions.items()
+                    if any(node_id in node_positions for node_id in groups[group_id])
+                }
+            write_positions(session, 'object', node_positions)
+            write_positions(session, 'group', group_positions)
+    except Exception:
+        layout_tracker.restore_changed(changed)
+        raise
+    
+    record_changes(
+        [('update', 'object', node_id, {'x': x, 'y': y}) for node_id, (x, y) in node_positions.items()] +
+        [('update', 'group', group_id, {'x': x, 'y': y}) for group_id, (x, y) in group_positions.items()]
+    )
+    return len(node_positions), len(group_positions)
+
+def run_auto_layout():
+    """Debounced incremental layout scheduled by the layout tracker after writes"""
+    if not layout_lock.acquire(blocking=False):
+        return
+    try:
+        moved, _ = run_layout(incremental=True)
+        print(f"Automatic layout positioned {moved} objects")
+    except Exception as e:
+        print(f"Automatic layout failed: {e}")
+    finally:
+        layout_lock.release()
+
+if LAYOUT_AUTO:
+    layout_tracker.on_settled = run_auto_layout
+
+@app.route('/layout', methods=['POST'])
+def update_layout():
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode', 'incremental')
+    if mode not in ('incremental', 'full'):
+        return jsonify({"error": "mode must be 'incremental' or 'full'"}), 400
+    
+    iterations = data.get('iterations')
+    if iterations is not None and (not isinstance(iterations, int) or not 1 <= iterations <= 1000):
+        return jsonify({"error": "iterations must be an integer between 1 and 1000"}), 400
+    
+    if not layout_lock.acquire(blocking=False):
+        return jsonify({"error": "A layout is already being computed"}), 409
+    try:
+        started = time.time()
+        moved, groups_moved = run_layout(incremental=(mode == 'incremental'), iterations=iterations)
+    finally:
+        layout_lock.release()
+    
+    return jsonify({
+        "mode": mode,
+        "objects": moved,
+        "groups": groups_moved,
+        "duration_ms": round((time.time() - started) * 1000, 1)
+    })
+
+# Entity kinds of /bulk, in the order they are written, and the kind each is
+# recorded as in the change log
+BULK_KINDS = {'objects': 'object', 'relationships': 'relationship', 'groups': 'group'}
+
+# NDJSON lines name their entity kind in the singular
+BULK_LINE_KINDS = {'object': 'objects', 'relationship': 'relationships', 'group': 'groups'}
+
+class BulkImporter:
+    """Buffer bulk entities per kind and write them in chunked UNWIND transactions"""
+    
+    def __init__(self, session, batch_size):
+        self.session = session
+        self.batch_size = batch_size
+        self.pending = {kind: [] for kind in BULK_KINDS}
+        self.results = []
+        self.created = 0
+        self.failed = 0
+    
+    def add(self, kind, index, item):
+        """Validate one entity and queue it, writing its chunk once it is full"""
+        change_kind = BULK_KINDS[kind]
+        if not isinstance(item, dict):
+            self.fail(change_kind, index, None, "Entity must be a JSON object")
+            return
+        
+        entity_id = item.get('id') or str(uuid.uuid4())
+        metadata = item.get('metadata') or {}
+        if kind == 'objects':
+            name = item.get('name', 'Unnamed Object')
+            obj_type = item.get('type', 'generic')
+            try:
+                row = {'properties': flatten_object_properties(entity_id, name, obj_type, metadata)}
+            except ValueError as e:
+                self.fail(change_kind, index, entity_id, str(e))
+                return
+            change = {'name': name, 'type': obj_type, 'metadata': decode_metadata(row['properties'])}
+        elif kind == 'relationships':
+            source_id = item.get('source_id')
+            target_id = item.get('target_id')
+            if not source_id or not target_id:
+                self.fail(change_kind, index, entity_id, "Source and target IDs are required")
+                return
+            connection_type = item.get('type', item.get('rel_type', 'ethernet'))
+            try:
+                properties = flatten_relationship_properties(entity_id, connection_type, metadata)
+            except ValueError as e:
+                self.fail(change_kind, index, entity_id, str(e))
+                return
+            row = {'source_id': source_id, 'target_id': target_id, 'properties': properties}
+            change = {
+                'source_id': source_id,
+                'target_id': target_id,
+                'type': connection_type,
+                'metadata': decode_metadata(properties)
+            }
+        else:
+            node_ids = item.get('nodeIds', [])
+            if not isinstance(node_ids, list) or not all(isinstance(node_id, str) for node_id in node_ids):
+                self.fail(change_kind, index, entity_id, "nodeIds must be a list of object ids")
+                return
+            row = {
+                'name': item.get('name', 'Unnamed Group'),
+                'x': item.get('x', 0),
+                'y': item.get('y', 0),
+                'expanded': item.get('expanded', False),
+                # Each member is linked once, as create_group does
+                'nodeIds': list(dict.fromkeys(node_ids))
+            }
+            change = dict(row)
+        
+        row.update(index=index, id=entity_id)
+        self.queue(kind, row, change)
+    
+    def queue(self, kind, row, change):
+        """Queue a row already in the form store.bulk_create() takes, with the change recorded for it"""
+        self.pending[kind].append((row, change))
+        if len(self.pending[kind]) >= self.batch_size:
+            self.flush(kind)
+    
+    def fail(self, change_kind, index, entity_id, error):
+        self.failed += 1
+        self.results.append({"kind": change_kind, "index": index, "id": entity_id, "status": "error", "error": error})
+    
+    def flush(self, kind):
+        """Write the pending chunk of a kind, writing pending objects first since others reference them"""
+        if kind != 'objects':
+            self.write_chunk('objects')
+        self.write_chunk(kind)
+    
+    def finish(self):
+        """Write every remaining chunk and return the import summary"""
+        for kind in BULK_KINDS:
+            self.write_chunk(kind)
+        return {"created": self.created, "failed": self.failed, "results": self.results}
+    
+    def write_chunk(self, kind):
+        pending = self.pending[kind]
+        if not pending:
+            return
+        self.pending[kind] = []
+        change_kind = BULK_KINDS[kind]
+        
+        # Ids repeated within the chunk would violate the uniqueness constraints;
+        # only the first row of an id is written, the others fail here once
+        accepted = []
+        seen_ids = set()
+        for row, change in pending:
+            if row['id'] in seen_ids:
+                self.fail(change_kind, row['index'], row['id'], "Duplicate id in request")
+            else:
+                seen_ids.add(row['id'])
+                accepted.append((row, change))
+        rows = [row for row, _ in accepted]
+        
+        @timed_query("bulk_write")
+        def write(tx):
+            existing = store.bulk_existing_ids(tx, kind, list(seen_ids))
+            new_rows = [row for row in rows if row['id'] not in existing]
+            written = store.bulk_create(tx, kind, new_rows)
+            return existing, written
+        
+        try:
+            existing, written = self.session.execute_write(write)
+        except Exception as e:
+            print(f"Bulk import of {len(rows)} {kind} failed: {e}")
+            for row in rows:
+                self.fail(change_kind, row['index'], row['id'], str(e))
+            return
+        
+        changes = []
+        for row, change in accepted:
+            if row['index'] in written:
+                self.created += 1
+                self.results.append({"kind": change_kind, "index": row['index'], "id": row['id'], "status": "created"})
+                if kind == 'groups':
+                    # Ids of objects that do not exist were not linked
+                    change = dict(change, nodeIds=written[row['index']])
+                changes.append(('create', change_kind, row['id'], change))
+            elif row['id'] in existing:
+                self.fail(change_kind, row['index'], row['id'], f"{change_kind.capitalize()} already exists")
+            else:
+                self.fail(change_kind, row['index'], row['id'], "Source or target object not found")
+        if changes:
+            record_changes(changes)
+
+@app.route('/bulk', methods=['POST'])
+def bulk_import():
+    batch_size = max(1, request.args.get('batch_size', BULK_BATCH_SIZE, type=int))
+    
+    with get_write_session() as session:
+        importer = BulkImporter(session, batch_size)
+        
+        if request.mimetype == 'application/x-ndjson':
+            # Stream large bodies line by line: {"kind": "object", "name": ...}
+            for line_number, line in enumerate(request.stream):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                    kind = BULK_LINE_KINDS[item.pop('kind')]
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    importer.fail(None, line_number, None, "Line must be a JSON object with a kind of object, relationship or group")
+                    continue
+                importer.add(kind, line_number, item)
+        else:
+            data = request.get_json(silent=True)
+            if not isinstance(data, dict):
+                return jsonify({"error": "Expected a JSON object with objects, relationships and/or groups arrays"}), 400
+            for kind in BULK_KINDS:
+                items = data.get(kind) or []
+                if not isinstance(items, list):
+                    return jsonify({"error": f"'{kind}' must be an array"}), 400
+                for index, item in enumerate(items):
+                    importer.add(kind, index, item)
+        
+        return jsonify(importer.finish())
+
+# Snapshot sections and the bulk entity kind each is restored as
+SNAPSHOT_KINDS = {'nodes': 'objects', 'links': 'relationships', 'groups': 'groups'}
+
+def restore_snapshot(stream, batch_size):
+    """
+    Write the entities of a snapshot read from a binary stream, batch_size per
+    transaction, and return a summary with the entities that failed.
+    
+    Properties are written as stored in the snapshot. Entities whose id already
+    exists are reported as failed and left unchanged. Raises SnapshotError when
+    the stream is not a valid snapshot; chunks written before are kept.
+    """
+    indexes = dict.fromkeys(SNAPSHOT_KINDS.values(), 0)
+    with get_write_session() as session:
+        importer = BulkImporter(session, batch_size)
+        for section, properties, source, target, node_ids in read_snapshot(stream):
+            kind = SNAPSHOT_KINDS[section]
+            index = indexes[kind]
+            indexes[kind] += 1
+            entity_id = properties.get('id')
+            if not entity_id:
+                importer.fail(BULK_KINDS[kind], index, None, "Entity has no id")
+                continue
+            
+            if kind == 'objects':
+                row = {'properties': properties}
+                change = {'name': properties.get('name'), 'type': properties.get('type'),
+                          'metadata': decode_metadata(properties)}
+            elif kind == 'relationships':
+                row = {'source_id': source, 'target_id': target, 'properties': properties}
+                change = {'source_id': source, 'target_id': target, 'type': properties.get('type'),
+                          'metadata': decode_metadata(properties)}
+            else:
+                row = {
+                    'name': properties.get('name', 'Unnamed Group'),
+                    'x': properties.get('x', 0),
+                    'y': properties.get('y', 0),
+                    'expanded': properties.get('expanded', False),
+                    'nodeIds': list(dict.fromkeys(node_id for node_id in node_ids or [] if isinstance(node_id, str)))
+                }
+                change = dict(row)
+            row.update(index=index, id=entity_id)
+            importer.queue(kind, row, change)
+        
+        summary = importer.finish()
+    # Per-entity results of a whole graph would dwarf the summary, so only errors are listed
+    return {
+        "created": summary["created"],
+        "failed": summary["failed"],
+        "errors": [result for result in summary["results"] if result["status"] == "error"]
+    }
+
+@app.route('/export', methods=['GET'])
+def export_graph():
+    # Read now: the generator runs after the request context is gone
+    bookmarks = request_bookmarks()
+    version = get_topology_version()
+    name = f"stream_{request.endpoint}"
+    
+    def generate():
+        start = time.perf_counter()
+        with get_read_session(bookmarks, fetch_size=NEO4J_FETCH_SIZE) as session:
+            yield from iter_snapshot(store.iter_network(session), version)
+        time_query(name, time.perf_counter() - start)
+    
+    response = app.response_class(generate(), mimetype=SNAPSHOT_MIMETYPE)
+    response.headers['Content-Disposition'] = f'attachment; filename="network-{version}.nvsnap"'
+    response.headers['X-Topology-Version'] = format_version(version)
+    return response
+
+@app.route('/import', methods=['POST'])
+def import_graph():
+    batch_size = max(1, request.args.get('batch_size', BULK_BATCH_SIZE, type=int))
+    try:
+        summary = restore_snapshot(request.stream, batch_size)
+    except SnapshotError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(summary)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    body, content_type = render_metrics()
+    return app.response_class(body, content_type=content_type)
+
 @app.route('/healthcheck', methods=['GET'])
 def health_check():
     try:
         # Check database connection
         with get_db_session() as session:
-            result = session.run("RETURN 1 as n")
-            result.single()
+            store.check_health(session)
         
         return jsonify({
             "status": "ok",
@@ -646,11 +1536,26 @@ def health_check():
             "timestamp": datetime.datetime.now().isoformat()
         }), 500
 
+# Static files fingerprinted and pre-compressed in memory, once per worker
+static_assets = StaticAssets(app.static_folder) if STATIC_FINGERPRINT else None
+
 # Serve static files
 @app.route('/', defaults={'path': 'index.html'})
 @app.route('/<path:path>')
 def serve_static(path):
-    return send_from_directory('static', path)
+    asset = static_assets.get(path) if static_assets else None
+    if asset is None:
+        return send_from_directory('static', path)
+    
+    encoding = negotiate_encoding(request.headers.get('Accept-Encoding'), asset.variants)
+    response = app.response_class(asset.variants[encoding] if encoding else asset.body, mimetype=asset.mimetype)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    if asset.variants:
+        response.vary.add('Accept-Encoding')
+    response.set_etag(variant_etag(asset.etag, encoding))
+    response.headers['Cache-Control'] = static_assets.cache_control(path)
+    return response.make_conditional(request)
 
 # Production-ready initialization
 with app.app_context():
@@ -661,6 +1566,7 @@ with app.app_context():
 # This allows for both development and production modes
 if __name__ == '__main__':
     # Initialize database immediately in development mode
-    init_db()
+    if STORAGE_BACKEND == 'neo4j':
+        init_db()
     # Only use the Flask development server when running directly
     app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 5000)))
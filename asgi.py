@@ -0,0 +1,456 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+ASGI entry point for serving with Uvicorn.
+
+The routes dashboards poll - GET /network (including collapsed views and
+NDJSON or chunked JSON streaming), /network/changes, the /events stream and
+/healthcheck - run natively on the async Neo4j driver, so a single process
+holds thousands of concurrent polls and open streams without a thread per
+request. They share the snapshot cache and change log with the Flask app,
+which keeps serving every other route through a WSGI adapter; wsgi.py
+remains the entry point for Gunicorn, which does not serve /events. With the
+embedded storage backend, /network and /healthcheck are Flask routes too.
+"""
+
+import asyncio
+import datetime
+import os
+import time
+from contextlib import asynccontextmanager
+
+from a2wsgi import WSGIMiddleware
+from neo4j import READ_ACCESS, AsyncGraphDatabase, Bookmarks
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+import app as flask_app
+from app import (BOOKMARK_HEADER, NEO4J_FETCH_SIZE, NETWORK_SECTIONS, STREAM_CHUNK_SIZE, JSONChunkWriter, network_cache,
+                 network_changes, network_item, network_view_key, serialize_network_view)
+from graph_store import STORAGE_BACKEND
+from metrics import instrument_pool, observe_cache, observe_request, observe_summary, time_query
+from neo4j_store import NEO4J_PASSWORD, NEO4J_TX_RETRY_SECONDS, NEO4J_URI, NEO4J_USER, NETWORK_QUERY
+from profiling import current_profile, finish_profile, profile_requested, start_profile
+from serialization import COMPRESS_MIN_BYTES, ENCODINGS, compress, negotiate_encoding, snapshot_variant, variant_etag
+from topology import (CHANGELOG_POLL_SECONDS, add_change_listener, format_version, get_changes_since, get_topology_version,
+                      parse_version)
+
+# Threads running Flask routes that have no async implementation
+ASGI_WSGI_THREADS = int(os.environ.get("ASGI_WSGI_THREADS", 10))
+
+# Idle /events streams send a heartbeat this often so proxies keep them open
+EVENTS_HEARTBEAT_SECONDS = float(os.environ.get("EVENTS_HEARTBEAT_SECONDS", 15))
+# Reconnection delay suggested to EventSource clients, in milliseconds
+EVENTS_RETRY_MS = 3000
+
+dumps = flask_app.app.json.dumps
+async_driver = None
+
+# One rebuild per snapshot key at a time; concurrent misses wait for it
+_rebuild_locks = {}
+
+
+def events_start_version(last_event_id, since):
+    """
+    Return the version an /events stream starts after: the Last-Event-ID of a
+    reconnecting EventSource, else the 'since' parameter, else the current
+    version. None stands for a version from before a restart, for which the
+    stream starts with a 'resync' event. Raises ValueError when the given
+    value is not a version.
+    """
+    raw = last_event_id or since
+    if raw is None:
+        return get_topology_version()
+    return parse_version(raw)
+
+
+def sse_event(event, data, version):
+    """Format one Server-Sent Event; its id, the version token, lets EventSource resume after it"""
+    return f"id: {format_version(version)}\nevent: {event}\ndata: {dumps(data)}\n\n"
+
+
+def sse_events(version, changes):
+    """Format the result of get_changes_since() as 'change' events, or one 'resync' event"""
+    if changes is None:
+        # The log no longer reaches back far enough; the client must reload /network
+        return sse_event("resync", {"version": format_version(version)}, version)
+    return "".join(sse_event("change", change, change["seq"]) for change in changes)
+
+
+def sse_preamble(version):
+    """First lines of a stream: the reconnection delay, and the version it starts after if known"""
+    if version is None:
+        # The 'resync' event that follows gives the client the current version
+        return f"retry: {EVENTS_RETRY_MS}\n\n"
+    return f"retry: {EVENTS_RETRY_MS}\nid: {format_version(version)}\n\n"
+
+
+SSE_HEARTBEAT = ": heartbeat\n\n"
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+class VersionWatcher:
+    """
+    Follows the topology version for every /events stream of the process, so
+    idle streams wait on one event instead of each polling the change log.
+    Writes made in this process wake the streams at once; other workers'
+    writes are noticed by a single task checking every CHANGELOG_POLL_SECONDS.
+    """
+
+    def __init__(self):
+        self.version = None
+        self._loop = None
+        self._changed = None
+        self._task = None
+        add_change_listener(self._on_changes, local_only=True)
+
+    def start(self):
+        """Start following the version from the running event loop, if not already"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+        self.version = get_topology_version()
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def changed(self, seen, timeout):
+        """Wait up to timeout seconds for the version to differ from seen, and return it"""
+        if self.version == seen:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.version
+
+    def _advance(self, version):
+        if self.version is not None and version <= self.version:
+            return
+        self.version = version
+        # Wake every waiting stream; later waits use a fresh event
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _on_changes(self, changes):
+        # Called in the thread that recorded the write, with the change log locked
+        if self._loop is not None and changes:
+            self._loop.call_soon_threadsafe(self._advance, changes[-1]["seq"])
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(CHANGELOG_POLL_SECONDS)
+            # Reading other workers' changes locks the log, which writes in the WSGI threads also hold
+            self._advance(await asyncio.to_thread(get_topology_version))
+
+
+version_watcher = VersionWatcher()
+
+
+def create_async_driver():
+    """Create the async Neo4j driver with the same pool settings as the sync one"""
+    return AsyncGraphDatabase.driver(
+        NEO4J_URI,
+        auth=(NEO4J_USER, NEO4J_PASSWORD),
+        max_connection_lifetime=3600,
+        max_connection_pool_size=50,
+        connection_acquisition_timeout=60,
+        max_transaction_retry_time=NEO4J_TX_RETRY_SECONDS
+    )
+
+
+@asynccontextmanager
+async def lifespan(application):
+    global async_driver
+    if STORAGE_BACKEND == 'neo4j':
+        async_driver = create_async_driver()
+        instrument_pool(async_driver, 'async')
+    try:
+        yield
+    finally:
+        await version_watcher.stop()
+        if async_driver is not None:
+            await async_driver.close()
+
+
+def json_response(data, status_code=200, request=None):
+    """
+    Serialize like the Flask app does, so both entry points return identical
+    bodies, compressing large ones when the request's client accepts it.
+    """
+    body = dumps(data).encode('utf-8')
+    headers = {'Vary': 'Accept-Encoding'} if ENCODINGS else {}
+    encoding = None
+    if request is not None and len(body) >= COMPRESS_MIN_BYTES:
+        encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+    if encoding is not None:
+        body = compress(body, encoding)
+        headers['Content-Encoding'] = encoding
+    return Response(body, status_code=status_code, media_type='application/json', headers=headers)
+
+
+def error_response(message, status_code):
+    return json_response({"error": message}, status_code)
+
+
+def requested_stream_mode(request):
+    """Return 'ndjson' or 'json' when the client asked for a streamed response, as the Flask app decides"""
+    accept = parse_accept_header(request.headers.get('accept'), MIMEAccept)
+    if accept.best_match(['application/json', 'application/x-ndjson']) == 'application/x-ndjson':
+        return 'ndjson'
+    if request.query_params.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return 'json'
+    return None
+
+
+def request_bookmarks(request):
+    """Return the bookmarks sent in the request's BOOKMARK_HEADER, or None"""
+    raw = request.headers.get(BOOKMARK_HEADER)
+    if not raw:
+        return None
+    return Bookmarks.from_raw_values(value.strip() for value in raw.split(',') if value.strip())
+
+
+def read_session(bookmarks=None, **config):
+    """Get a session for reads, routed to followers and waiting for the client's bookmarks"""
+    return async_driver.session(default_access_mode=READ_ACCESS, bookmarks=bookmarks, **config)
+
+
+async def read_network_graph():
+    """
+    Read every object, relationship and group in one query and one round trip.
+
+    The graph is cached under the version read before it, so like
+    read_current() in the Flask app it reads in a write transaction, which a
+    cluster routes to its leader: a follower may not have applied every write
+    that version counts.
+    """
+    async def read(tx):
+        # Built inside the transaction function so a retry starts from scratch
+        start = time.perf_counter()
+        profile = current_profile()
+        query = "PROFILE " + NETWORK_QUERY if profile is not None and profile.db_hits else NETWORK_QUERY
+        graph = {section: [] for section in NETWORK_SECTIONS}
+        result = await tx.run(query)
+        async for record in result:
+            section, item = network_item(*record)
+            graph[section].append(item)
+        summary = await result.consume()
+        observe_summary("read_network", summary)
+        if profile is not None:
+            profile.add_query("read_network", query, {}, summary)
+        time_query("read_network", time.perf_counter() - start)
+        return graph
+
+    async with async_driver.session(fetch_size=-1) as session:
+        return await session.execute_write(read)
+
+
+async def iter_network_stream(mode, bookmarks=None):
+    """
+    Stream the graph as NDJSON lines or as a chunked JSON document shaped like
+    the non-streamed response, framed by the Flask app's JSONChunkWriter and
+    joined into STREAM_CHUNK_SIZE writes.
+    """
+    start = time.perf_counter()
+    writer = JSONChunkWriter(mode, NETWORK_SECTIONS)
+    async with read_session(bookmarks, fetch_size=NEO4J_FETCH_SIZE) as session:
+        result = await session.run(NETWORK_QUERY)
+        buffer = [writer.start()]
+        size = 0
+        async for record in result:
+            piece = writer.add(network_item(*record))
+            buffer.append(piece)
+            size += len(piece)
+            if size >= STREAM_CHUNK_SIZE:
+                yield "".join(buffer)
+                buffer = []
+                size = 0
+        buffer.append(writer.end())
+        body = "".join(buffer)
+        if body:
+            yield body
+    time_query("stream_get_network", time.perf_counter() - start)
+
+
+def etag_matches(if_none_match, etag):
+    """Return True when an If-None-Match header lists the given strong ETag"""
+    if if_none_match.strip() == '*':
+        return True
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+async def snapshot_response(request, snapshot):
+    """Serve a cached snapshot with a strong ETag, answering 304 when it matches"""
+    encoding = negotiate_encoding(request.headers.get('accept-encoding'))
+    etag = variant_etag(snapshot.etag, encoding)
+    headers = {
+        'ETag': f'"{etag}"',
+        'Cache-Control': 'no-cache',
+        'X-Topology-Version': format_version(snapshot.version)
+    }
+    if ENCODINGS:
+        headers['Vary'] = 'Accept-Encoding'
+    if etag_matches(request.headers.get('if-none-match', ''), etag):
+        return Response(status_code=304, headers=headers)
+    body = snapshot.body
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+        # Compressing a large graph is CPU bound too, but only done once per version
+        body = snapshot.variants.get(encoding) or await asyncio.to_thread(snapshot_variant, snapshot, encoding)
+    return Response(body, media_type='application/json', headers=headers)
+
+
+async def get_network(request):
+    # Read the version before the graph so a concurrent write can only make
+    # the snapshot newer than its tag, never older
+    version = get_topology_version()
+    try:
+        key = network_view_key(request.query_params.get('collapse'), request.query_params.get('zoom'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    bookmarks = request_bookmarks(request)
+    mode = requested_stream_mode(request)
+    # A cached snapshot is already in memory, so only stream when there is none
+    if key == 'network' and (mode == 'ndjson' or (mode and (bookmarks is not None or network_cache.get(key, version) is None))):
+        media_type = 'application/x-ndjson' if mode == 'ndjson' else 'application/json'
+        return StreamingResponse(iter_network_stream(mode, bookmarks), media_type=media_type)
+
+    if bookmarks is not None:
+        # The client has just written and must see that write, which may be
+        # newer than the cached snapshot; the leader has applied it
+        graph = await read_network_graph()
+        body = await asyncio.to_thread(serialize_network_view, key, graph)
+        return await snapshot_response(request, network_cache.put(key, version, body))
+
+    snapshot = network_cache.get(key, version)
+    observe_cache(key, snapshot is not None)
+    if snapshot is None:
+        lock = _rebuild_locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            version = get_topology_version()
+            snapshot = network_cache.get(key, version)
+            if snapshot is None:
+                graph = await read_network_graph()
+                # Serializing a large graph is CPU bound; keep the event loop free for other polls
+                body = await asyncio.to_thread(serialize_network_view, key, graph)
+                snapshot = network_cache.put(key, version, body)
+    return await snapshot_response(request, snapshot)
+
+
+async def get_network_changes(request):
+    try:
+        body = network_changes(request.query_params.get('since'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+    return json_response(body, request=request)
+
+
+async def get_events(request):
+    try:
+        since = events_start_version(request.headers.get('last-event-id'), request.query_params.get('since'))
+    except ValueError as e:
+        return error_response(str(e), 400)
+
+    version_watcher.start()
+
+    async def generate():
+        version = since
+        yield sse_preamble(version)
+        # The watcher's version when this stream last read the log; None reads it at once
+        seen = None
+        while True:
+            current = await version_watcher.changed(seen, EVENTS_HEARTBEAT_SECONDS)
+            if current == seen:
+                yield SSE_HEARTBEAT
+                continue
+            seen = current
+            latest, changes = get_changes_since(version)
+            if latest != version or changes is None:
+                yield sse_events(latest, changes)
+                version = latest
+
+    return StreamingResponse(generate(), media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def health_check(request):
+    try:
+        # Check database connection
+        async with async_driver.session() as session:
+            result = await session.run("RETURN 1 as n")
+            await result.single()
+
+        return json_response({
+            "status": "ok",
+            "message": "Service is healthy",
+            "timestamp": datetime.datetime.now().isoformat()
+        })
+    except Exception as e:
+        return json_response({
+            "status": "error",
+            "message": str(e),
+            "timestamp": datetime.datetime.now().isoformat()
+        }, 500)
+
+
+def native_route(path, endpoint):
+    """A GET route served natively, recording request metrics and profiles as the Flask routes do"""
+    async def handle(request):
+        start = time.perf_counter()
+        token = start_profile(request.method, request.url.path, profile_requested(request.query_params, request.headers))
+        try:
+            response = await endpoint(request)
+        except Exception:
+            finish_profile(token, 500)
+            raise
+        server_timing = finish_profile(token, response.status_code)
+        if server_timing:
+            response.headers['Server-Timing'] = server_timing
+        size = response.headers.get('content-length')
+        observe_request(request.method, path, response.status_code, time.perf_counter() - start,
+                        int(size) if size is not None else None)
+        return response
+    return Route(path, handle, methods=['GET'])
+
+
+# The embedded store answers in-process without waiting on the network, so
+# only Neo4j reads have native async versions
+database_routes = [
+    native_route('/network', get_network),
+    native_route('/healthcheck', health_check),
+] if STORAGE_BACKEND == 'neo4j' else []
+
+app = Starlette(
+    routes=database_routes + [
+        native_route('/network/changes', get_network_changes),
+        native_route('/events', get_events),
+        # Everything else is served by the Flask app
+        Mount('/', app=WSGIMiddleware(flask_app.app, workers=ASGI_WSGI_THREADS)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=os.getenv("CORS_ORIGINS", "*").split(","),
+                   allow_methods=["*"], allow_headers=["*"], expose_headers=["ETag", "X-Topology-Version", "X-Next-Cursor", BOOKMARK_HEADER])
+    ],
+    lifespan=lifespan
+)
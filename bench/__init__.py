@@ -0,0 +1,9 @@
+"""
+Benchmark suite for the API.
+
+generate.py builds synthetic topologies in the /bulk import format,
+fake_neo4j.py is an in-memory stand-in for the parts of the Neo4j driver the
+benchmarked routes use, serve.py runs the app on top of it, and run.py puts
+routes under concurrent load and writes the results as JSON that compare.py
+diffs between versions. See the Benchmarks section of the README.
+"""
@@ -0,0 +1,59 @@
+"""
+Compare two run.py result files and flag regressions.
+
+    python -m bench.compare baseline.json candidate.json --threshold 10
+
+Prints p50, p99 and throughput per topology size and scenario, with the
+change from the baseline, and exits with status 1 when any p99 latency grew
+or any throughput fell by more than --threshold percent.
+"""
+
+import argparse
+import json
+import sys
+
+
+def change(old, new):
+    if not old or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def format_change(value):
+    return "   n/a" if value is None else f"{value:+6.1f}%"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10, help="percent change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = {(r["nodes"], r["scenario"]): r for r in json.load(f)["results"]}
+    with open(args.candidate) as f:
+        candidate = json.load(f)["results"]
+
+    regressions = []
+    print(f"{'nodes':>7} {'scenario':<20} {'p50 ms':>9} {'':>7} {'p99 ms':>9} {'':>7} {'req/s':>9} {'':>7}")
+    for result in candidate:
+        key = (result["nodes"], result["scenario"])
+        old = baseline.get(key)
+        if old is None:
+            continue
+        p50 = change(old["latency_ms"]["p50"], result["latency_ms"]["p50"])
+        p99 = change(old["latency_ms"]["p99"], result["latency_ms"]["p99"])
+        throughput = change(old["throughput_rps"], result["throughput_rps"])
+        print(f"{key[0]:>7} {key[1]:<20} {result['latency_ms']['p50']:>9} {format_change(p50)} "
+              f"{result['latency_ms']['p99']:>9} {format_change(p99)} {result['throughput_rps']:>9} {format_change(throughput)}")
+        if (p99 is not None and p99 > args.threshold) or (throughput is not None and throughput < -args.threshold):
+            regressions.append(key)
+
+    for nodes, scenario in regressions:
+        print(f"Regression: {scenario} at {nodes} nodes", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
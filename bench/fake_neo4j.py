@@ -0,0 +1,224 @@
+"""
+In-memory stand-in for the Neo4j driver, so benchmarks run without a database.
+
+It implements the driver surface app.py uses (sessions, managed
+transactions, results, records and summaries) and answers the queries of the
+benchmarked routes: the /network query, the object and relationship listings
+built by build_list_query(), object and relationship creation, object
+updates and deletes, and the health check. Entities are stored with the
+same flattened properties Neo4j would hold. Any other query raises
+NotImplementedError naming it, so a benchmark never silently measures a
+query the stand-in does not understand.
+
+Query times measured against it are Python overhead only; use a real Neo4j
+(run.py --url) to include the database.
+"""
+
+import re
+import threading
+from collections import namedtuple
+
+from neo4j import Bookmarks, Record
+
+from metadata_codec import flatten_object_properties, flatten_relationship_properties
+
+Summary = namedtuple('Summary', ['result_available_after', 'result_consumed_after', 'profile'])
+EMPTY_SUMMARY = Summary(0, 0, None)
+
+# "expression AS field" pairs of a RETURN clause, and "expression IN $param" conditions
+RETURN_ITEM = re.compile(r'(\S+) AS (\w+)')
+CONDITION = re.compile(r'([\w.`]+) IN \$(\w+)')
+
+
+class FakeGraph:
+    """Objects, relationships and groups held in dicts, guarded by one lock"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.objects = {}
+        # id -> (source id, target id, properties)
+        self.relationships = {}
+        # id -> (properties, member ids)
+        self.groups = {}
+
+    def load(self, topology):
+        """Load a topology in the /bulk request format"""
+        with self.lock:
+            for item in topology.get('objects', []):
+                self.objects[item['id']] = flatten_object_properties(
+                    item['id'], item.get('name'), item.get('type'), item.get('metadata'))
+            for item in topology.get('relationships', []):
+                self.relationships[item['id']] = (item['source_id'], item['target_id'], flatten_relationship_properties(
+                    item['id'], item.get('type'), item.get('metadata')))
+            for item in topology.get('groups', []):
+                properties = {key: item[key] for key in ('id', 'name', 'x', 'y', 'expanded') if key in item}
+                self.groups[item['id']] = (properties, list(item.get('nodeIds', [])))
+        return self
+
+
+def _evaluate(expression, row):
+    """Evaluate a projection like 'o.id', 'source.id' or 'properties(r)' against bound entities"""
+    if expression.startswith('properties('):
+        return dict(row[expression[len('properties('):-1]])
+    alias, _, key = expression.partition('.')
+    return row[alias].get(key.strip('`'))
+
+
+def _list_rows(graph, query, params):
+    """Rows of a build_list_query() listing, filtered, paged and projected like the Cypher would be"""
+    if '[r:CONNECTS]' in query:
+        rows = [{'r': properties, 'source': graph.objects[source], 'target': graph.objects[target]}
+                for source, target, properties in graph.relationships.values()]
+        alias = 'r'
+    else:
+        rows = [{'o': properties} for properties in graph.objects.values()]
+        alias = 'o'
+
+    where, _, rest = query.partition('WITH *')
+    if '$after' in where:
+        rows = [row for row in rows if row[alias]['id'] > params['after']]
+    for expression, param in CONDITION.findall(where):
+        values = params[param]
+        rows = [row for row in rows if _evaluate(expression, row) in values]
+    if '$limit' in rest:
+        rows = sorted(rows, key=lambda row: row[alias]['id'])[:params['limit']]
+
+    items = RETURN_ITEM.findall(rest.partition('RETURN')[2])
+    keys = [field for _, field in items]
+    return keys, [[_evaluate(expression, row) for expression, _ in items] for row in rows]
+
+
+def _network_rows(graph, query, params):
+    rows = [['nodes', dict(properties), None, None, None] for properties in graph.objects.values()]
+    rows.extend(['links', dict(properties), source, target, None]
+                for source, target, properties in graph.relationships.values())
+    rows.extend(['groups', dict(properties), None, None, list(members)] for properties, members in graph.groups.values())
+    return ['section', 'properties', 'source', 'target', 'nodeIds'], rows
+
+
+def _create_object(graph, query, params):
+    properties = dict(params['properties'])
+    graph.objects[properties['id']] = properties
+    return ['id'], [[properties['id']]]
+
+
+def _create_relationship(graph, query, params):
+    if params['source_id'] not in graph.objects or params['target_id'] not in graph.objects:
+        return ['source_id', 'target_id', 'id', 'type'], []
+    properties = dict(params['properties'])
+    graph.relationships[properties['id']] = (params['source_id'], params['target_id'], properties)
+    return ['source_id', 'target_id', 'id', 'type'], [[params['source_id'], params['target_id'], properties['id'],
+                                                       properties.get('type')]]
+
+
+def _update_object(graph, query, params):
+    properties = graph.objects.get(params['id'])
+    if properties is None:
+        return ['id', 'name', 'type', 'properties'], []
+    for key, value in params['properties'].items():
+        if value is None:
+            properties.pop(key, None)
+        else:
+            properties[key] = value
+    return ['id', 'name', 'type', 'properties'], [[properties['id'], properties.get('name'), properties.get('type'),
+                                                   dict(properties)]]
+
+
+def _delete_object(graph, query, params):
+    object_id = params['id']
+    if graph.objects.pop(object_id, None) is None:
+        return ['relationship_ids', 'groups'], []
+    removed = [rel_id for rel_id, (source, target, _) in graph.relationships.items() if object_id in (source, target)]
+    for rel_id in removed:
+        del graph.relationships[rel_id]
+    groups = []
+    for group_id, (_, members) in graph.groups.items():
+        if object_id in members:
+            members.remove(object_id)
+            groups.append({'id': group_id, 'nodeIds': list(members)})
+    return ['relationship_ids', 'groups'], [[removed, groups]]
+
+
+def _health(graph, query, params):
+    return ['n'], [[1]]
+
+
+# Text identifying each supported query -> handler, checked in order
+HANDLERS = [
+    ("'nodes' AS section", _network_rows),
+    ("CREATE (o:NetworkObject $properties)", _create_object),
+    ("CREATE (source)-[r:CONNECTS $properties]->(target)", _create_relationship),
+    ("SET o += $properties", _update_object),
+    ("DETACH DELETE n", _delete_object),
+    ("WITH *", _list_rows),
+    ("RETURN 1 as n", _health),
+]
+
+
+class FakeResult:
+    def __init__(self, keys, rows):
+        self._keys = keys
+        self._records = [Record(zip(keys, row)) for row in rows]
+
+    def __iter__(self):
+        return iter(self._records)
+
+    def keys(self):
+        return list(self._keys)
+
+    def single(self):
+        return self._records[0] if self._records else None
+
+    def data(self):
+        return [dict(record) for record in self._records]
+
+    def consume(self):
+        return EMPTY_SUMMARY
+
+
+class FakeTransaction:
+    def __init__(self, graph):
+        self._graph = graph
+
+    def run(self, query, parameters=None, **kwargs):
+        params = {**(parameters or {}), **kwargs}
+        text = " ".join(query.split())
+        if text.startswith('PROFILE '):
+            text = text[len('PROFILE '):]
+        for marker, handler in HANDLERS:
+            if marker in text:
+                with self._graph.lock:
+                    return FakeResult(*handler(self._graph, text, params))
+        raise NotImplementedError(f"The benchmark stand-in does not handle this query: {text[:200]}")
+
+
+class FakeSession(FakeTransaction):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def execute_read(self, work, *args, **kwargs):
+        return work(FakeTransaction(self._graph), *args, **kwargs)
+
+    execute_write = execute_read
+
+    def last_bookmarks(self):
+        return Bookmarks()
+
+
+class FakeDriver:
+    """Driver whose sessions all read and write one FakeGraph"""
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def session(self, **config):
+        return FakeSession(self.graph)
+
+    def close(self):
+        pass
@@ -0,0 +1,151 @@
+"""
+Synthetic network topologies for benchmarks.
+
+A topology is a set of sites hanging off one internet uplink. Each site has a
+router, distribution switches, access switches and the servers, NAS boxes,
+access points and clients plugged into them, with wireless clients joined to
+the access points. Site routers are meshed with VPN links. Every site is a
+DeviceGroup, and objects and connections carry the metadata the UI sets
+(addresses, MACs, VLANs, interfaces). Output is deterministic for a given
+size and seed and uses the /bulk request format, so the same file can be
+loaded into the in-memory stand-in or into a real Neo4j through the API.
+
+    python -m bench.generate --nodes 10000 > topology.json
+"""
+
+import argparse
+import json
+import random
+import sys
+
+# Objects per site, including its router
+SITE_SIZE = 250
+DISTRIBUTION_FANOUT = 4
+ACCESS_PORTS = 24
+WIRELESS_CLIENTS_PER_AP = 8
+
+# Devices plugged into access switch ports, with their relative frequency
+ENDPOINT_TYPES = (('client', 60), ('server', 15), ('ap', 15), ('nas', 10))
+
+
+class TopologyBuilder:
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.objects = []
+        self.relationships = []
+        self.groups = []
+        self._counts = {}
+
+    def add_object(self, obj_type, site, members=None):
+        index = self._counts.get(obj_type, 0)
+        self._counts[obj_type] = index + 1
+        number = len(self.objects)
+        object_id = f"{obj_type}-{index}"
+        metadata = {
+            'hostname': f"{obj_type}{index}.site{site}.example.net",
+            'mac': ':'.join(f"{byte:02x}" for byte in (0x02, 0, number >> 24 & 0xff, number >> 16 & 0xff,
+                                                        number >> 8 & 0xff, number & 0xff)),
+        }
+        if obj_type != 'internet':
+            metadata['ip'] = f"10.{site % 256}.{number // 250 % 256}.{number % 250 + 1}"
+            metadata['netmask'] = '24'
+        if obj_type in ('client', 'server', 'nas'):
+            metadata['vlan'] = 10 * (1 + self.rng.randrange(4))
+        self.objects.append({'id': object_id, 'name': f"{obj_type.title()} {index}", 'type': obj_type, 'metadata': metadata})
+        if members is not None:
+            members.append(object_id)
+        return object_id
+
+    def connect(self, source_id, target_id, connection_type, port, **metadata):
+        self.relationships.append({
+            'id': f"link-{len(self.relationships)}",
+            'source_id': source_id,
+            'target_id': target_id,
+            'type': connection_type,
+            'metadata': {'interface': f"ge-0/0/{port}", **metadata}
+        })
+
+    def endpoint_type(self):
+        total = sum(weight for _, weight in ENDPOINT_TYPES)
+        pick = self.rng.randrange(total)
+        for obj_type, weight in ENDPOINT_TYPES:
+            if pick < weight:
+                return obj_type
+            pick -= weight
+        return ENDPOINT_TYPES[0][0]
+
+    def add_site(self, site, uplink, budget):
+        """Add a site of about budget objects below uplink and return its router"""
+        members = []
+        router = self.add_object('router', site, members)
+        self.connect(uplink, router, 'fiber', site, speed='10G')
+        remaining = budget - 1
+
+        while remaining > 0:
+            distribution = self.add_object('switch', site, members)
+            self.connect(router, distribution, 'fiber', len(members), speed='10G')
+            remaining -= 1
+            for access_port in range(DISTRIBUTION_FANOUT):
+                if remaining <= 0:
+                    break
+                access = self.add_object('switch', site, members)
+                self.connect(distribution, access, 'ethernet', access_port, speed='1G')
+                remaining -= 1
+                port = 0
+                while port < ACCESS_PORTS and remaining > 0:
+                    obj_type = self.endpoint_type()
+                    endpoint = self.add_object(obj_type, site, members)
+                    self.connect(access, endpoint, 'ethernet', port, speed='1G')
+                    remaining -= 1
+                    port += 1
+                    if obj_type != 'ap':
+                        continue
+                    for _ in range(min(WIRELESS_CLIENTS_PER_AP, remaining)):
+                        client = self.add_object('client', site, members)
+                        self.connect(endpoint, client, 'wireless', 0, ssid=f"site{site}")
+                        remaining -= 1
+
+        self.groups.append({
+            'id': f"site-{site}",
+            'name': f"Site {site}",
+            'x': 0,
+            'y': 0,
+            'expanded': self.rng.random() < 0.25,
+            'nodeIds': members
+        })
+        return router
+
+    def to_bulk(self):
+        return {'objects': self.objects, 'relationships': self.relationships, 'groups': self.groups}
+
+
+def generate_topology(node_count, seed=0):
+    """Return a topology of node_count objects in the /bulk request format"""
+    builder = TopologyBuilder(seed)
+    internet = builder.add_object('internet', 0)
+    sites = max(1, (node_count - 1) // SITE_SIZE)
+    budget, extra = divmod(node_count - 1, sites)
+    routers = [builder.add_site(site, internet, budget + (site < extra)) for site in range(sites)]
+
+    # VPN ring between sites, plus a few shortcuts across it
+    if len(routers) > 1:
+        for site, router in enumerate(routers):
+            peer = routers[(site + 1) % len(routers)]
+            if peer != router:
+                builder.connect(router, peer, 'vpn', 100 + site, tunnel=f"vpn{site}")
+        for shortcut in range(len(routers) // 4):
+            source, target = builder.rng.sample(routers, 2)
+            builder.connect(source, target, 'vpn', 200 + shortcut, tunnel=f"vpn-x{shortcut}")
+    return builder.to_bulk()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic topology in /bulk format to stdout")
+    parser.add_argument('--nodes', type=int, default=1000, help="number of objects (default 1000)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    json.dump(generate_topology(args.nodes, args.seed), sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""
+Load test the API and write the results as JSON.
+
+By default each topology size gets its own server process (bench/serve.py)
+on the in-memory Neo4j stand-in, so the suite runs offline; --store embedded
+measures the embedded storage backend the same way. With --url the
+routes of a running deployment are measured instead, e.g. the docker compose
+stack on a throwaway Neo4j; --load first imports the generated topology
+through /bulk and --pid names the worker process whose memory is reported.
+
+    python -m bench.run --nodes 1000 10000 --concurrency 8 --duration 10 --output results.json
+
+Every scenario runs its requests from --concurrency threads over keep-alive
+connections for --duration seconds, and reports latency percentiles,
+throughput, status codes, response bytes and the server's resident memory.
+"""
+
+import argparse
+import datetime
+import http.client
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+
+from bench.generate import generate_topology
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def read_rss_mb(pid):
+    """Return (current, peak) resident memory of a process in MB, or (None, None) off Linux"""
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    values[key] = int(value.split()[0]) / 1024
+    except OSError:
+        return None, None
+    return values.get('VmRSS'), values.get('VmHWM')
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Client:
+    """One keep-alive HTTP connection to the server under test"""
+
+    def __init__(self, base_url):
+        parsed = urllib.parse.urlsplit(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.prefix = parsed.path.rstrip('/')
+        self.connection = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Return (status, body bytes); reconnects once if the server closed the connection"""
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        for attempt in (0, 1):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            try:
+                self.connection.request(method, self.prefix + path, body=payload, headers=headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status, data
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class Workload:
+    """Ids of the loaded topology and of objects created during the run, shared by the scenarios"""
+
+    def __init__(self, topology, seed):
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.object_ids = [item['id'] for item in topology['objects']]
+        self.created = []
+        self.counter = 0
+
+    def next_id(self, prefix):
+        with self.lock:
+            self.counter += 1
+            return f"bench-{prefix}-{os.getpid()}-{self.counter}"
+
+    def existing_object(self):
+        return self.rng.choice(self.object_ids)
+
+    def take_created(self):
+        with self.lock:
+            return self.created.pop() if self.created else None
+
+
+def create_object(client, workload):
+    object_id = workload.next_id('object')
+    status, data = client.request('POST', '/objects', {
+        'id': object_id, 'name': 'Bench object', 'type': 'server',
+        'metadata': {'ip': '10.255.0.1', 'netmask': '24', 'vlan': 10}
+    })
+    if status == 201:
+        with workload.lock:
+            workload.created.append(object_id)
+    return status, data
+
+
+def update_object(client, workload):
+    return client.request('PATCH', f"/objects/{workload.existing_object()}",
+                          {'metadata': {'location': f"rack {workload.rng.randrange(100)}", 'vlan': 20}})
+
+
+def create_relationship(client, workload):
+    return client.request('POST', '/relationships', {
+        'id': workload.next_id('link'), 'source_id': workload.existing_object(),
+        'target_id': workload.existing_object(), 'type': 'ethernet', 'metadata': {'interface': 'ge-0/0/99'}
+    })
+
+
+def delete_object(client, workload):
+    object_id = workload.take_created()
+    if object_id is None:
+        # Nothing left to delete; make one so the route is still measured
+        create_object(client, workload)
+        object_id = workload.take_created()
+    return client.request('DELETE', f"/objects/{object_id}")
+
+
+# Scenario name -> request function or (method, path, headers)
+SCENARIOS = {
+    'network': ('GET', '/network', None),
+    # A bookmark header makes /network bypass its snapshot cache and rebuild
+    'network_uncached': ('GET', '/network', {'X-Neo4j-Bookmark': 'bench'}),
+    'network_collapsed': ('GET', '/network?collapse=groups', None),
+    'objects_page': ('GET', '/objects?limit=1000', None),
+    'objects_all': ('GET', '/objects', None),
+    'relationships_page': ('GET', '/relationships?limit=1000', None),
+    'relationships_all': ('GET', '/relationships', None),
+    'create_object': create_object,
+    'update_object': update_object,
+    'create_relationship': create_relationship,
+    'delete_object': delete_object,
+}
+
+
+def run_scenario(base_url, name, workload, concurrency, duration, pid):
+    """Run one scenario from concurrency threads for duration seconds and summarize it"""
+    scenario = SCENARIOS[name]
+    latencies = []
+    statuses = {}
+    errors = []
+    received = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        client = Client(base_url)
+        local_latencies = []
+        local_statuses = {}
+        local_bytes = 0
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    if callable(scenario):
+                        status, data = scenario(client, workload)
+                    else:
+                        method, path, headers = scenario
+                        status, data = client.request(method, path, headers=headers)
+                except Exception as e:
+                    with lock:
+                        errors.append(str(e))
+                    continue
+                local_latencies.append(time.perf_counter() - start)
+                local_statuses[status] = local_statuses.get(status, 0) + 1
+                local_bytes += len(data)
+        finally:
+            client.close()
+            with lock:
+                latencies.extend(local_latencies)
+                for status, count in local_statuses.items():
+                    statuses[status] = statuses.get(status, 0) + count
+                received[0] += local_bytes
+
+    rss_before, _ = read_rss_mb(pid) if pid else (None, None)
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    rss_after, rss_peak = read_rss_mb(pid) if pid else (None, None)
+
+    ordered = sorted(latencies)
+    failed = len(errors) + sum(count for status, count in statuses.items() if status >= 400)
+    return {
+        "scenario": name,
+        "requests": len(latencies),
+        "errors": failed,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "error_samples": errors[:5],
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            **{f"p{p}": round(percentile(ordered, p) * 1000, 2) if ordered else None for p in PERCENTILES},
+            "mean": round(sum(ordered) / len(ordered) * 1000, 2) if ordered else None,
+            "max": round(ordered[-1] * 1000, 2) if ordered else None
+        },
+        "response_bytes_mean": round(received[0] / len(latencies)) if latencies else None,
+        "rss_mb": {"before": rss_before, "after": rss_after, "peak": rss_peak}
+    }
+
+
+def start_server(nodes, seed, store):
+    """Start bench/serve.py in a subprocess and return (process, base url)"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'bench.serve', '--nodes', str(nodes), '--seed', str(seed), '--port', '0',
+         '--store', store],
+        cwd=root, stdout=subprocess.PIPE, text=True
+    )
+    for line in process.stdout:
+        if line.startswith('ready '):
+            # Keep draining output so the server never blocks on a full pipe
+            threading.Thread(target=lambda: process.stdout.read(), daemon=True).start()
+            return process, f"http://127.0.0.1:{int(line.split()[1])}"
+    process.wait()
+    raise RuntimeError(f"Benchmark server exited with code {process.returncode} before it was ready")
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark API routes under concurrent load")
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1000, 10000], help="topology sizes to test")
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10, help="seconds per scenario")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--store', choices=['stand-in', 'embedded'], default='stand-in',
+                        help="backend of the local server: the Neo4j stand-in or the embedded store")
+    parser.add_argument('--url', help="measure a running deployment instead of a local server")
+    parser.add_argument('--pid', type=int, help="with --url, the server process whose memory is reported")
+    parser.add_argument('--load', action='store_true', help="with --url, import the topology through /bulk first")
+    parser.add_argument('--output', help="write results to this file instead of stdout")
+    args = parser.parse_args()
+    if args.url and len(args.nodes) > 1:
+        parser.error("--url measures one deployment, so give a single --nodes size")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "backend": args.url or ("embedded store" if args.store == 'embedded' else "in-memory stand-in"),
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "seed": args.seed
+        },
+        "results": []
+    }
+
+    for nodes in args.nodes:
+        topology = generate_topology(nodes, args.seed)
+        workload = Workload(topology, args.seed)
+        process = None
+        if args.url:
+            base_url, pid = args.url, args.pid
+            if args.load:
+                status, data = Client(base_url).request('POST', '/bulk', topology)
+                if status != 200:
+                    raise RuntimeError(f"Loading the topology failed with {status}: {data[:200]!r}")
+        else:
+            process, base_url = start_server(nodes, args.seed, args.store)
+            pid = process.pid
+        try:
+            for name in args.scenarios:
+                print(f"{nodes} nodes: {name}", file=sys.stderr)
+                result = run_scenario(base_url, name, workload, args.concurrency, args.duration, pid)
+                report["results"].append({"nodes": nodes, **result})
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Serve the app on the in-memory Neo4j stand-in, loaded with a synthetic topology.
+
+    python -m bench.serve --nodes 10000 --port 5055
+
+With --store embedded the app uses the embedded storage backend instead, in
+memory only, loaded through the /bulk import code.
+
+Requests are handled by a threaded Werkzeug server with keep-alive. The line
+"ready <port>" is printed once the server accepts connections, which is what
+run.py waits for.
+"""
+
+import argparse
+import sys
+
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+import app as app_module
+import embedded_store
+from bench.fake_neo4j import FakeDriver, FakeGraph
+from bench.generate import generate_topology
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Keep connections open between requests and skip per-request logging"""
+    protocol_version = "HTTP/1.1"
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def load_embedded(topology):
+    """Return an in-memory embedded store driver holding the topology"""
+    driver = embedded_store.EmbeddedDriver(None)
+    with driver.session() as session:
+        importer = app_module.BulkImporter(session, app_module.BULK_BATCH_SIZE)
+        for kind in app_module.BULK_KINDS:
+            for index, item in enumerate(topology.get(kind, [])):
+                importer.add(kind, index, item)
+        importer.finish()
+    return driver
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API on an in-memory graph")
+    parser.add_argument('--nodes', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--store', choices=['stand-in', 'embedded'], default='stand-in',
+                        help="Neo4j stand-in (default) or the embedded storage backend")
+    args = parser.parse_args()
+
+    topology = generate_topology(args.nodes, args.seed)
+    if args.store == 'embedded':
+        app_module.store = embedded_store
+        app_module.driver = load_embedded(topology)
+    else:
+        app_module.driver = FakeDriver(FakeGraph().load(topology))
+    server = make_server(args.host, args.port, app_module.app, threaded=True, request_handler=QuietRequestHandler)
+    print(f"ready {server.server_port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,734 @@
+"""
+Embedded storage backend: the graph held in memory and persisted to SQLite.
+
+Meant for small single-site deployments that do not need a Neo4j server.
+Objects, connections and groups live in dicts, with each object's
+connections and group memberships indexed so traversals and cascading
+deletes never scan the whole graph. Every entity keeps the flattened
+properties Neo4j would hold, and the transaction functions mirror
+neo4j_store.py statement by statement, including what a uniqueness
+constraint would reject and which properties a null removes.
+
+Transactions are serialized by one lock. A write transaction changes the
+in-memory graph directly, remembering how to undo each change, and commits
+by writing the rows it touched to SQLite in one SQLite transaction; if the
+function or the commit fails the changes are undone. The SQLite file, in
+WAL mode, is only read when the store is opened, and it is locked so a
+single process owns it: run one worker process with this backend.
+EMBEDDED_STORE_PATH set to an empty string keeps the graph in memory only.
+"""
+
+import fcntl
+import json
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+
+from neo4j import Bookmarks
+from neo4j.exceptions import ConstraintError, CypherTypeError
+
+# SQLite database the graph is persisted to; empty to keep it in memory only
+EMBEDDED_STORE_PATH = os.environ.get("EMBEDDED_STORE_PATH", "data/graph.db")
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS objects (id PRIMARY KEY, properties TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS relationships (id PRIMARY KEY, source_id NOT NULL, target_id NOT NULL,
+                                              properties TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS groups (id PRIMARY KEY, properties TEXT NOT NULL);
+    CREATE TABLE IF NOT EXISTS group_members (group_id NOT NULL, object_id NOT NULL,
+                                              PRIMARY KEY (group_id, object_id));
+"""
+
+Connection = namedtuple('Connection', ['source', 'target', 'properties'])
+
+_PRIMITIVES = (str, int, float, bool)
+
+
+def _stored(properties):
+    """Properties as Neo4j stores them: nulls are dropped, and maps or nested lists rejected"""
+    stored = {}
+    for key, value in properties.items():
+        if value is None:
+            continue
+        if not isinstance(value, _PRIMITIVES) and not (
+                isinstance(value, list) and all(isinstance(item, _PRIMITIVES) for item in value)):
+            raise CypherTypeError(f"Property values can only be of primitive types or arrays thereof: {key}")
+        stored[key] = value
+    return stored
+
+
+def _matches(value, values):
+    """Cypher 'value IN values': never true for null, and booleans never equal numbers"""
+    if value is None:
+        return False
+    return any(candidate == value and isinstance(candidate, bool) == isinstance(value, bool)
+               for candidate in values)
+
+
+def _sort_key(value):
+    """Order ids like Cypher's ORDER BY does across types: strings, booleans, numbers, then nulls"""
+    if isinstance(value, str):
+        return (0, value)
+    if isinstance(value, bool):
+        return (1, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    return (3, 0)
+
+
+def _greater(value, bound):
+    """Cypher 'value > bound', which is null (so false here) between different types"""
+    if isinstance(value, bool) != isinstance(bound, bool):
+        return False
+    try:
+        return value > bound
+    except TypeError:
+        return False
+
+
+class EmbeddedGraph:
+    """The whole graph with its indexes; every access holds lock"""
+
+    def __init__(self, path=None):
+        self.lock = threading.RLock()
+        self.objects = {}
+        self.relationships = {}
+        self.groups = {}
+        # Object id -> ids of its connections in either direction; dicts keep insertion order
+        self.connections = {}
+        # Group id -> member object ids, and object id -> ids of the groups it is in
+        self.members = {}
+        self.memberships = {}
+        self.db = None
+        self._lock_file = None
+        if path:
+            self._open(path)
+
+    def _open(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock_file = open(path + ".lock", "a")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"{path} is in use by another process; the embedded store allows one worker process")
+
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        version = self.db.execute("PRAGMA user_version").fetchone()[0]
+        if version > SCHEMA_VERSION:
+            raise RuntimeError(f"{path} was written by a newer version (schema {version})")
+        self.db.executescript(SCHEMA)
+        self.db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+        for object_id, properties in self.db.execute("SELECT id, properties FROM objects"):
+            self.objects[object_id] = json.loads(properties)
+            self.connections[object_id] = {}
+            self.memberships[object_id] = {}
+        for rel_id, source, target, properties in self.db.execute(
+                "SELECT id, source_id, target_id, properties FROM relationships"):
+            if source in self.objects and target in self.objects:
+                self.relationships[rel_id] = Connection(source, target, json.loads(properties))
+                self.connections[source][rel_id] = None
+                self.connections[target][rel_id] = None
+        for group_id, properties in self.db.execute("SELECT id, properties FROM groups"):
+            self.groups[group_id] = json.loads(properties)
+            self.members[group_id] = {}
+        for group_id, object_id in self.db.execute("SELECT group_id, object_id FROM group_members"):
+            if group_id in self.groups and object_id in self.objects:
+                self.members[group_id][object_id] = None
+                self.memberships[object_id][group_id] = None
+        print(f"Embedded store opened {path}: {len(self.objects)} objects, "
+              f"{len(self.relationships)} connections, {len(self.groups)} groups")
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class EmbeddedTransaction:
+    """
+    A transaction on an EmbeddedGraph, run while holding its lock.
+
+    Writes go through the methods below, which update the graph and its
+    indexes, record how to undo the change and which rows commit() persists.
+    """
+
+    def __init__(self, graph, writable):
+        self.graph = graph
+        self.writable = writable
+        self._undo = []
+        self._dirty = {'objects': set(), 'relationships': set(), 'groups': set(), 'group_members': set()}
+
+    def _changing(self, table, key):
+        if not self.writable:
+            raise RuntimeError("Writing is not allowed in a read transaction")
+        self._dirty[table].add(key)
+
+    def put_object(self, object_id, properties):
+        graph = self.graph
+        self._changing('objects', object_id)
+        previous = graph.objects.get(object_id)
+        graph.objects[object_id] = properties
+        if previous is None:
+            graph.connections[object_id] = {}
+            graph.memberships[object_id] = {}
+            self._undo.append(lambda: (graph.objects.pop(object_id), graph.connections.pop(object_id),
+                                       graph.memberships.pop(object_id)))
+        else:
+            self._undo.append(lambda: graph.objects.__setitem__(object_id, previous))
+
+    def remove_object(self, object_id):
+        """Remove an object that has no connections or memberships left"""
+        graph = self.graph
+        self._changing('objects', object_id)
+        previous = graph.objects.pop(object_id)
+        del graph.connections[object_id]
+        del graph.memberships[object_id]
+        self._undo.append(lambda: (graph.objects.__setitem__(object_id, previous),
+                                   graph.connections.__setitem__(object_id, {}),
+                                   graph.memberships.__setitem__(object_id, {})))
+
+    def put_relationship(self, rel_id, connection):
+        graph = self.graph
+        self._changing('relationships', rel_id)
+        previous = graph.relationships.get(rel_id)
+        graph.relationships[rel_id] = connection
+        if previous is None:
+            graph.connections[connection.source][rel_id] = None
+            graph.connections[connection.target][rel_id] = None
+            self._undo.append(lambda: self._unlink(rel_id, connection))
+        else:
+            self._undo.append(lambda: graph.relationships.__setitem__(rel_id, previous))
+
+    def remove_relationship(self, rel_id):
+        graph = self.graph
+        self._changing('relationships', rel_id)
+        connection = graph.relationships[rel_id]
+        self._unlink(rel_id, connection)
+
+        def restore():
+            graph.relationships[rel_id] = connection
+            graph.connections[connection.source][rel_id] = None
+            graph.connections[connection.target][rel_id] = None
+        self._undo.append(restore)
+
+    def _unlink(self, rel_id, connection):
+        graph = self.graph
+        del graph.relationships[rel_id]
+        graph.connections[connection.source].pop(rel_id, None)
+        graph.connections[connection.target].pop(rel_id, None)
+
+    def put_group(self, group_id, properties):
+        graph = self.graph
+        self._changing('groups', group_id)
+        previous = graph.groups.get(group_id)
+        graph.groups[group_id] = properties
+        if previous is None:
+            graph.members[group_id] = {}
+            self._undo.append(lambda: (graph.groups.pop(group_id), graph.members.pop(group_id)))
+        else:
+            self._undo.append(lambda: graph.groups.__setitem__(group_id, previous))
+
+    def remove_group(self, group_id):
+        """Remove a group that has no members left"""
+        graph = self.graph
+        self._changing('groups', group_id)
+        previous = graph.groups.pop(group_id)
+        del graph.members[group_id]
+        self._undo.append(lambda: (graph.groups.__setitem__(group_id, previous),
+                                   graph.members.__setitem__(group_id, {})))
+
+    def add_member(self, group_id, object_id):
+        graph = self.graph
+        self._changing('group_members', (group_id, object_id))
+        graph.members[group_id][object_id] = None
+        graph.memberships[object_id][group_id] = None
+        self._undo.append(lambda: (graph.members[group_id].pop(object_id), graph.memberships[object_id].pop(group_id)))
+
+    def remove_member(self, group_id, object_id):
+        graph = self.graph
+        self._changing('group_members', (group_id, object_id))
+        del graph.members[group_id][object_id]
+        del graph.memberships[object_id][group_id]
+        self._undo.append(lambda: (graph.members[group_id].__setitem__(object_id, None),
+                                   graph.memberships[object_id].__setitem__(group_id, None)))
+
+    def commit(self):
+        """Write every row this transaction touched to SQLite, in one SQLite transaction"""
+        graph = self.graph
+        if graph.db is None or not any(self._dirty.values()):
+            return
+        db = graph.db
+        db.execute("BEGIN")
+        try:
+            for object_id in self._dirty['objects']:
+                properties = graph.objects.get(object_id)
+                if properties is None:
+                    db.execute("DELETE FROM objects WHERE id = ?", (object_id,))
+                else:
+                    db.execute("INSERT OR REPLACE INTO objects VALUES (?, ?)", (object_id, json.dumps(properties)))
+            for rel_id in self._dirty['relationships']:
+                connection = graph.relationships.get(rel_id)
+                if connection is None:
+                    db.execute("DELETE FROM relationships WHERE id = ?", (rel_id,))
+                else:
+                    db.execute("INSERT OR REPLACE INTO relationships VALUES (?, ?, ?, ?)",
+                               (rel_id, connection.source, connection.target, json.dumps(connection.properties)))
+            for group_id in self._dirty['groups']:
+                properties = graph.groups.get(group_id)
+                if properties is None:
+                    db.execute("DELETE FROM groups WHERE id = ?", (group_id,))
+                else:
+                    db.execute("INSERT OR REPLACE INTO groups VALUES (?, ?)", (group_id, json.dumps(properties)))
+            for group_id, object_id in self._dirty['group_members']:
+                if object_id in graph.members.get(group_id, ()):
+                    db.execute("INSERT OR IGNORE INTO group_members VALUES (?, ?)", (group_id, object_id))
+                else:
+                    db.execute("DELETE FROM group_members WHERE group_id = ? AND object_id = ?", (group_id, object_id))
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def rollback(self):
+        """Undo every change, newest first"""
+        while self._undo:
+            self._undo.pop()()
+
+
+class EmbeddedSession:
+    """
+    Session over an EmbeddedGraph with the Neo4j session methods the app uses.
+
+    Store functions may also be given the session itself to read outside a
+    managed transaction, as streamed responses do; they hold the graph lock
+    while they read.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        pass
+
+    def execute_read(self, work, *args, **kwargs):
+        with self.graph.lock:
+            return work(EmbeddedTransaction(self.graph, writable=False), *args, **kwargs)
+
+    def execute_write(self, work, *args, **kwargs):
+        with self.graph.lock:
+            tx = EmbeddedTransaction(self.graph, writable=True)
+            try:
+                value = work(tx, *args, **kwargs)
+                tx.commit()
+            except BaseException:
+                tx.rollback()
+                raise
+            return value
+
+    def last_bookmarks(self):
+        # One copy of the graph, so there is never anything to wait for
+        return Bookmarks()
+
+
+class EmbeddedDriver:
+    """Driver whose sessions all use one EmbeddedGraph, opened on first use"""
+
+    def __init__(self, path):
+        self.path = path
+        self._graph = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def graph(self):
+        # Opened lazily so a preloading server opens the file in its worker, not its master
+        if self._graph is None:
+            with self._open_lock:
+                if self._graph is None:
+                    self._graph = EmbeddedGraph(self.path)
+        return self._graph
+
+    def session(self, **config):
+        return EmbeddedSession(self.graph)
+
+    def close(self):
+        if self._graph is not None:
+            self._graph.close()
+
+
+def create_driver():
+    return EmbeddedDriver(EMBEDDED_STORE_PATH)
+
+
+def check_health(session):
+    graph = session.graph
+    with graph.lock:
+        if graph.db is not None:
+            graph.db.execute("SELECT 1").fetchone()
+
+
+def _summary(graph, object_id):
+    properties = graph.objects[object_id]
+    return {'id': properties.get('id'), 'name': properties.get('name'), 'type': properties.get('type')}
+
+
+# Objects
+
+def create_object(tx, properties):
+    properties = _stored(properties)
+    object_id = properties.get('id')
+    if object_id in tx.graph.objects:
+        raise ConstraintError(f"Node already exists with label `NetworkObject` and property `id` = {object_id!r}")
+    tx.put_object(object_id, properties)
+    return object_id
+
+
+def update_object(tx, object_id, properties):
+    current = tx.graph.objects.get(object_id)
+    if current is None:
+        return None
+    updated = _stored({**current, **properties})
+    tx.put_object(object_id, updated)
+    return {'id': updated.get('id'), 'name': updated.get('name'), 'type': updated.get('type'),
+            'properties': dict(updated)}
+
+
+def delete_object(tx, object_id):
+    graph = tx.graph
+    if object_id not in graph.objects:
+        return None
+    relationship_ids = list(graph.connections[object_id])
+    for rel_id in relationship_ids:
+        tx.remove_relationship(rel_id)
+    groups = {}
+    for group_id in list(graph.memberships[object_id]):
+        tx.remove_member(group_id, object_id)
+        groups[group_id] = list(graph.members[group_id])
+    tx.remove_object(object_id)
+    return relationship_ids, groups
+
+
+def object_exists(tx, object_id):
+    with tx.graph.lock:
+        return object_id in tx.graph.objects
+
+
+def read_object_summaries(tx, object_ids):
+    graph = tx.graph
+    with graph.lock:
+        return [_summary(graph, object_id) for object_id in dict.fromkeys(object_ids) if object_id in graph.objects]
+
+
+# Relationships
+
+def create_relationship(tx, source_id, target_id, properties):
+    graph = tx.graph
+    if source_id not in graph.objects or target_id not in graph.objects:
+        return None
+    properties = _stored(properties)
+    rel_id = properties.get('id')
+    if rel_id in graph.relationships:
+        raise ConstraintError(f"Relationship already exists with type `CONNECTS` and property `id` = {rel_id!r}")
+    tx.put_relationship(rel_id, Connection(source_id, target_id, properties))
+    return {'source_id': source_id, 'target_id': target_id, 'id': rel_id, 'type': properties.get('type')}
+
+
+# Listings
+
+def _list_rows(rows, options, filter_values, alias_id):
+    """Filter, order and page (entity, ...) rows like build_list_query() does in Cypher"""
+    if options["after"] is not None:
+        rows = [row for row in rows if _greater(alias_id(row), options["after"])]
+    for name, values in options["filters"].items():
+        rows = [row for row in rows if _matches(filter_values[name](row), values)]
+    for key, values in options["metadata"].items():
+        name = f"metadata_{key}"
+        rows = [row for row in rows if _matches(row[-1].get(name), values)]
+    if options["limit"] is not None:
+        rows = sorted(rows, key=lambda row: _sort_key(alias_id(row)))[:options["limit"]]
+    return rows
+
+
+OBJECT_FIELDS = {
+    'id': lambda properties: properties.get('id'),
+    'name': lambda properties: properties.get('name'),
+    'type': lambda properties: properties.get('type'),
+    'metadata': dict
+}
+
+RELATIONSHIP_FIELDS = {
+    'id': lambda connection: connection.properties.get('id'),
+    'source_id': lambda connection: connection.source,
+    'target_id': lambda connection: connection.target,
+    'type': lambda connection: connection.properties.get('type'),
+    'metadata': lambda connection: dict(connection.properties)
+}
+
+
+def iter_objects(tx, options):
+    graph = tx.graph
+    with graph.lock:
+        rows = _list_rows(
+            [(properties,) for properties in graph.objects.values()], options,
+            {'type': lambda row: row[0].get('type')}, lambda row: row[0].get('id')
+        )
+        items = [{field: OBJECT_FIELDS[field](properties) for field in options["fields"]} for properties, in rows]
+    yield from items
+
+
+def iter_relationships(tx, options):
+    graph = tx.graph
+    with graph.lock:
+        rows = _list_rows(
+            [(connection, connection.properties) for connection in graph.relationships.values()], options,
+            {
+                'type': lambda row: row[1].get('type'),
+                'source_id': lambda row: row[0].source,
+                'target_id': lambda row: row[0].target
+            },
+            lambda row: row[1].get('id')
+        )
+        items = [{field: RELATIONSHIP_FIELDS[field](connection) for field in options["fields"]}
+                 for connection, _ in rows]
+    yield from items
+
+
+def iter_network(tx):
+    graph = tx.graph
+    with graph.lock:
+        rows = [('nodes', dict(properties), None, None, None) for properties in graph.objects.values()]
+        rows.extend(('links', dict(connection.properties), connection.source, connection.target, None)
+                    for connection in graph.relationships.values())
+        rows.extend(('groups', dict(properties), None, None, list(graph.members[group_id]))
+                    for group_id, properties in graph.groups.items())
+    yield from rows
+
+
+# Groups
+
+def read_groups(tx):
+    graph = tx.graph
+    with graph.lock:
+        return [(dict(properties), list(graph.members[group_id])) for group_id, properties in graph.groups.items()]
+
+
+def create_group(tx, properties):
+    properties = _stored(properties)
+    group_id = properties.get('id')
+    if group_id in tx.graph.groups:
+        raise ConstraintError(f"Node already exists with label `DeviceGroup` and property `id` = {group_id!r}")
+    tx.put_group(group_id, properties)
+    return dict(properties)
+
+
+def delete_group(tx, group_id):
+    graph = tx.graph
+    if group_id not in graph.groups:
+        return 0
+    for object_id in list(graph.members[group_id]):
+        tx.remove_member(group_id, object_id)
+    tx.remove_group(group_id)
+    return 1
+
+
+def update_group(tx, group_id, updates):
+    graph = tx.graph
+    current = graph.groups.get(group_id)
+    if current is None:
+        return None
+    if updates:
+        current = _stored({**current, **updates})
+        tx.put_group(group_id, current)
+    return dict(current), list(graph.members[group_id])
+
+
+def remove_group_members(tx, group_id, node_ids):
+    members = tx.graph.members.get(group_id, {})
+    removed = 0
+    for object_id in node_ids:
+        if object_id in members:
+            tx.remove_member(group_id, object_id)
+            removed += 1
+    return removed
+
+
+def add_group_members(tx, group_id, node_ids):
+    graph = tx.graph
+    if group_id not in graph.groups:
+        return []
+    added = []
+    for object_id in node_ids:
+        if object_id in graph.objects:
+            if object_id not in graph.members[group_id]:
+                tx.add_member(group_id, object_id)
+            added.append(object_id)
+    return added
+
+
+# Traversals
+
+def _type_allowed(via_types, exclude_types):
+    """Predicate on a connection's properties for the via_type/exclude_type filters"""
+    def allowed(properties):
+        connection_type = properties.get('type')
+        if via_types and not _matches(connection_type, via_types):
+            return False
+        if exclude_types and _matches(connection_type if connection_type is not None else '', exclude_types):
+            return False
+        return True
+    return allowed
+
+
+def _other_end(connection, object_id):
+    return connection.target if connection.source == object_id else connection.source
+
+
+def shortest_paths(tx, from_id, to_id, max_hops, limit, all_paths=False, via_types=None, exclude_types=None):
+    graph = tx.graph
+    allowed = _type_allowed(via_types, exclude_types)
+    with graph.lock:
+        if from_id not in graph.objects or to_id not in graph.objects:
+            return []
+
+        # Breadth-first search by layers, remembering every (previous object,
+        # connection) that reaches an object at its shortest distance
+        distance = {from_id: 0}
+        previous = {from_id: []}
+        frontier = [from_id]
+        for hops in range(1, max_hops + 1):
+            if not frontier or to_id in distance:
+                break
+            next_frontier = []
+            for object_id in frontier:
+                for rel_id in graph.connections[object_id]:
+                    connection = graph.relationships[rel_id]
+                    if not allowed(connection.properties):
+                        continue
+                    neighbor = _other_end(connection, object_id)
+                    if neighbor not in distance:
+                        distance[neighbor] = hops
+                        previous[neighbor] = []
+                        next_frontier.append(neighbor)
+                    if distance[neighbor] == hops:
+                        previous[neighbor].append((object_id, rel_id))
+            frontier = next_frontier
+        if to_id not in distance:
+            return []
+
+        def walk_back(object_id):
+            """Yield (objects, connections) of every shortest path from from_id to object_id"""
+            if object_id == from_id:
+                yield [from_id], []
+                return
+            for prior, rel_id in previous[object_id]:
+                for objects, rels in walk_back(prior):
+                    yield objects + [object_id], rels + [rel_id]
+
+        paths = []
+        for objects, rels in walk_back(to_id):
+            nodes = [_summary(graph, object_id) for object_id in objects]
+            links = []
+            for rel_id in rels:
+                connection = graph.relationships[rel_id]
+                links.append({'id': connection.properties.get('id'), 'source': connection.source,
+                              'target': connection.target, 'type': connection.properties.get('type')})
+            paths.append((nodes, links))
+            if len(paths) == (limit if all_paths else 1):
+                break
+        return paths
+
+
+def read_neighbors(tx, object_ids, via_types=None, exclude_types=None):
+    graph = tx.graph
+    allowed = _type_allowed(via_types, exclude_types)
+    with graph.lock:
+        neighbors = {}
+        for object_id in object_ids:
+            for rel_id in graph.connections.get(object_id, ()):
+                connection = graph.relationships[rel_id]
+                if allowed(connection.properties):
+                    neighbor = _other_end(connection, object_id)
+                    if neighbor not in neighbors:
+                        neighbors[neighbor] = _summary(graph, neighbor)
+        return list(neighbors.values())
+
+
+# Index and layout loads
+
+def read_adjacency(tx):
+    graph = tx.graph
+    with graph.lock:
+        nodes = [(properties.get('id'), properties.get('type')) for properties in graph.objects.values()]
+        edges = [(connection.properties.get('id'), connection.source, connection.target, connection.properties.get('type'))
+                 for connection in graph.relationships.values()]
+        return nodes, edges
+
+
+def read_lookup_objects(tx, metadata_keys):
+    graph = tx.graph
+    names = [f"metadata_{key}" for key in metadata_keys]
+    with graph.lock:
+        return [
+            (properties.get('id'), properties.get('name'), properties.get('type'),
+             {name: properties.get(name) for name in names})
+            for properties in graph.objects.values()
+        ]
+
+
+def read_layout_graph(tx):
+    graph = tx.graph
+    with graph.lock:
+        nodes = {object_id: (properties.get('x'), properties.get('y')) for object_id, properties in graph.objects.items()}
+        edges = [(connection.source, connection.target) for connection in graph.relationships.values()]
+        groups = {group_id: list(graph.members[group_id]) for group_id in graph.groups}
+        return nodes, edges, groups
+
+
+def write_positions(tx, kind, rows):
+    graph = tx.graph
+    entities, put = (graph.objects, tx.put_object) if kind == 'object' else (graph.groups, tx.put_group)
+    for row in rows:
+        current = entities.get(row['id'])
+        if current is not None:
+            put(row['id'], _stored({**current, 'x': row['x'], 'y': row['y']}))
+
+
+# Bulk import
+
+def bulk_existing_ids(tx, kind, ids):
+    graph = tx.graph
+    entities = {'objects': graph.objects, 'relationships': graph.relationships, 'groups': graph.groups}[kind]
+    return {entity_id for entity_id in ids if entity_id in entities}
+
+
+def bulk_create(tx, kind, rows):
+    if kind == 'groups':
+        written = {}
+        for row in rows:
+            create_group(tx, {key: row[key] for key in ('id', 'name', 'x', 'y', 'expanded')})
+            written[row['index']] = add_group_members(tx, row['id'], row['nodeIds'])
+        return written
+    written = set()
+    for row in rows:
+        if kind == 'objects':
+            create_object(tx, row['properties'])
+        elif create_relationship(tx, row['source_id'], row['target_id'], row['properties']) is None:
+            continue
+        written.add(row['index'])
+    return written
@@ -0,0 +1,43 @@
+"""
+Selection of the backend the graph is stored in.
+
+STORAGE_BACKEND names the module route handlers store the graph with:
+'neo4j' (neo4j_store.py), or 'embedded' (embedded_store.py), an in-process
+graph persisted to SQLite for small single-site deployments.
+
+A backend module provides create_driver(), whose sessions offer the Neo4j
+session methods the app uses (execute_read, execute_write, last_bookmarks
+and close), and the functions in STORE_FUNCTIONS. Each takes a transaction
+of those sessions first and returns plain Python values; the iter_
+functions may also be given a session, to stream a result outside a
+managed transaction.
+"""
+
+import importlib
+import os
+
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "neo4j")
+
+BACKEND_MODULES = {'neo4j': 'neo4j_store', 'embedded': 'embedded_store'}
+
+STORE_FUNCTIONS = (
+    'create_driver', 'check_health',
+    'create_object', 'update_object', 'delete_object', 'object_exists', 'read_object_summaries',
+    'create_relationship',
+    'iter_objects', 'iter_relationships', 'iter_network',
+    'read_groups', 'create_group', 'delete_group', 'update_group', 'remove_group_members', 'add_group_members',
+    'shortest_paths', 'read_neighbors',
+    'read_adjacency', 'read_lookup_objects', 'read_layout_graph', 'write_positions',
+    'bulk_existing_ids', 'bulk_create',
+)
+
+
+def load_store(backend=STORAGE_BACKEND):
+    """Import the module of a storage backend, checking that it provides every store function"""
+    if backend not in BACKEND_MODULES:
+        raise ValueError(f"STORAGE_BACKEND must be one of: {', '.join(BACKEND_MODULES)}")
+    module = importlib.import_module(BACKEND_MODULES[backend])
+    missing = [name for name in STORE_FUNCTIONS if not hasattr(module, name)]
+    if missing:
+        raise ImportError(f"{module.__name__} does not provide: {', '.join(missing)}")
+    return module
@@ -0,0 +1,83 @@
+"""
+Derived views of the network graph returned by GET /network.
+
+Views take the plain {"nodes", "links", "groups"} graph read from Neo4j and
+reshape it in a single pass over nodes and links, so payload size and render
+cost follow the number of visible entities rather than the total inventory.
+"""
+
+
+def collapse_groups(graph, collapse_all=False):
+    """
+    Replace collapsed DeviceGroups by a single super-node each.
+
+    A group is collapsed when its 'expanded' flag is not true, or always when
+    collapse_all is set (e.g. when zoomed far out). Links inside a collapsed
+    group are counted on its super-node; links leaving it are merged into one
+    weighted link per pair of visible endpoints, with a count per connection
+    type. An object in several collapsed groups is folded into the first one.
+    """
+    groups = []
+    super_nodes = {}
+    owner = {}
+    for group in graph["groups"]:
+        collapsed = collapse_all or group.get("expanded") is not True
+        groups.append({**group, "collapsed": collapsed})
+        if not collapsed:
+            continue
+        super_nodes[group["id"]] = {
+            "id": group["id"],
+            "name": group.get("name"),
+            "type": "group",
+            "collapsed": True,
+            "x": group.get("x"),
+            "y": group.get("y"),
+            "memberCount": 0,
+            "memberTypes": {},
+            "internalLinks": 0
+        }
+        for node_id in group.get("nodeIds", []):
+            owner.setdefault(node_id, group["id"])
+
+    nodes = []
+    for node in graph["nodes"]:
+        group_id = owner.get(node["id"])
+        if group_id is None:
+            nodes.append(node)
+            continue
+        super_node = super_nodes[group_id]
+        super_node["memberCount"] += 1
+        node_type = node.get("type")
+        super_node["memberTypes"][node_type] = super_node["memberTypes"].get(node_type, 0) + 1
+
+    links = []
+    aggregated = {}
+    for link in graph["links"]:
+        source = owner.get(link["source"], link["source"])
+        target = owner.get(link["target"], link["target"])
+        if source == link["source"] and target == link["target"]:
+            links.append(link)
+            continue
+        if source == target:
+            super_nodes[source]["internalLinks"] += 1
+            continue
+
+        # Links are undirected for aggregation purposes
+        key = (source, target) if source <= target else (target, source)
+        entry = aggregated.get(key)
+        if entry is None:
+            entry = aggregated[key] = {
+                "id": f"aggregate:{key[0]}:{key[1]}",
+                "source": key[0],
+                "target": key[1],
+                "type": "aggregate",
+                "count": 0,
+                "types": {}
+            }
+        entry["count"] += 1
+        link_type = link.get("type")
+        entry["types"][link_type] = entry["types"].get(link_type, 0) + 1
+
+    nodes.extend(super_nodes.values())
+    links.extend(aggregated.values())
+    return {"nodes": nodes, "links": links, "groups": groups}
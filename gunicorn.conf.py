@@ -0,0 +1,8 @@
+"""Gunicorn server hooks; the remaining settings are passed on the command line in start.sh."""
+
+from prometheus_client import multiprocess
+
+
+def child_exit(server, worker):
+    # Drop the exited worker's live gauges (connection pool usage) from /metrics
+    multiprocess.mark_process_dead(worker.pid)
@@ -8,6 +8,8 @@ This script will safely initialize the Neo4j schema by:
 1. Checking for existing constraints
 2. Only creating constraints if they don't exist
 3. Using explicit names for constraints to avoid conflicts
+4. Creating indexes for lookups by name, type and indexed metadata keys
+5. Rewriting metadata values of declared keys to their canonical form
 """
 
 import os
@@ -15,6 +17,7 @@ import sys
 import time
 from neo4j import GraphDatabase
 from neo4j.exceptions import ClientError, ServiceUnavailable
+from metadata_codec import METADATA_PREFIX, METADATA_SCHEMA, coerce_metadata_value, metadata_indexes
 
 # Neo4j connection parameters
 NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://neo4j:7687")
@@ -198,6 +201,82 @@ def create_constraints(driver):
     
     return True
 
+def index_definitions(modern_syntax=True):
+    """Return (name, query) for every index the application relies on"""
+    # Plain property indexes, plus one per indexed field of METADATA_SCHEMA
+    indexes = [
+        ("networkobject_name", "range", "object", "name"),
+        ("networkobject_type", "range", "object", "type"),
+        ("connects_type", "range", "relationship", "type"),
+    ]
+    indexes.extend(metadata_indexes())
+    
+    definitions = []
+    for name, kind, target, prop in indexes:
+        if modern_syntax:
+            pattern = "(n:NetworkObject)" if target == "object" else "()-[n:CONNECTS]-()"
+            keyword = "TEXT INDEX" if kind == "text" else "RANGE INDEX"
+            definitions.append((name, f"CREATE {keyword} {name} IF NOT EXISTS FOR {pattern} ON (n.`{prop}`)"))
+        elif target == "object":
+            # Neo4j 3.x/4.x only has unnamed b-tree indexes on node properties here
+            definitions.append((name, f"CREATE INDEX ON :NetworkObject(`{prop}`)"))
+    return definitions
+
+def create_indexes(driver):
+    """Create lookup indexes, skipping any that fail so the rest are still created"""
+    neo4j_version = get_neo4j_version(driver)
+    modern_syntax = not (neo4j_version.startswith("4.") or neo4j_version.startswith("3."))
+    
+    created = 0
+    with driver.session() as session:
+        for name, query in index_definitions(modern_syntax):
+            try:
+                session.run(query).consume()
+                created += 1
+            except ClientError as e:
+                if "already exists" in str(e).lower() or "equivalent" in str(e).lower():
+                    created += 1
+                else:
+                    print(f"Error creating index {name}: {e}")
+    print(f"Ensured {created} indexes")
+    return created
+
+# Values rewritten per transaction by migrate_metadata()
+MIGRATION_BATCH_SIZE = 1000
+
+def migrate_metadata(driver):
+    """
+    Rewrite metadata of the keys declared in METADATA_SCHEMA to the form the
+    API now stores them in, e.g. vlan "7" to 7 and MACs to lower-case colon
+    notation, so indexes and filters match values written by older versions.
+    Values that do not fit the declared type are left as they are.
+    """
+    patterns = {'object': "(n:NetworkObject)", 'relationship': "()-[n:CONNECTS]->()"}
+    migrated = 0
+    with driver.session() as session:
+        for key, field in METADATA_SCHEMA.items():
+            prop = f"{METADATA_PREFIX}{key}"
+            for target in field.targets:
+                pattern = patterns[target]
+                rows = []
+                for record in session.run(f"MATCH {pattern} WHERE n.`{prop}` IS NOT NULL RETURN n.id AS id, n.`{prop}` AS value"):
+                    try:
+                        value = coerce_metadata_value(key, record["value"])
+                    except ValueError:
+                        continue
+                    if value != record["value"] or type(value) is not type(record["value"]):
+                        rows.append({'id': record["id"], 'value': value})
+                
+                for start in range(0, len(rows), MIGRATION_BATCH_SIZE):
+                    session.run(f"""
+                        UNWIND $rows AS row
+                        MATCH {pattern} WHERE n.id = row.id
+                        SET n.`{prop}` = row.value
+                    """, rows=rows[start:start + MIGRATION_BATCH_SIZE]).consume()
+                migrated += len(rows)
+    print(f"Migrated {migrated} metadata values to their canonical form")
+    return migrated
+
 def drop_existing_constraints(driver):
     """Drop all existing constraints (to be used in recovery mode)"""
     print("WARNING: Dropping all existing constraints for recovery")
@@ -256,6 +335,18 @@ def main():
                 print("Schema initialization completed with some issues")
                 # Don't exit with error - app might still work
             
+            # Create lookup indexes; a failure here is not fatal either
+            try:
+                create_indexes(driver)
+            except Exception as e:
+                print(f"Error creating indexes: {e}")
+            
+            # Older values of declared metadata keys; also not fatal
+            try:
+                migrate_metadata(driver)
+            except Exception as e:
+                print(f"Error migrating metadata: {e}")
+            
             # Verify constraints after creation
             print("\nVerifying final schema:")
             check_constraints(driver)
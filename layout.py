@@ -0,0 +1,274 @@
+"""
+Server-side force-directed layout for the network graph.
+
+A vectorized Fruchterman-Reingold simulation: objects repel each other,
+connections pull their endpoints together, and members of a DeviceGroup are
+pulled towards the group's centroid the way groupingForce does in the browser.
+Small graphs use exact pairwise repulsion; larger ones approximate far-away
+objects by the centroid of their grid cell so each iteration stays well below
+quadratic cost. Positions are deterministic for a given graph, so the layout
+no longer changes from one page load to the next.
+"""
+
+import os
+import threading
+
+import numpy as np
+
+# Preferred connection length, matching the d3 link distance used by the UI
+LAYOUT_LINK_DISTANCE = float(os.environ.get("LAYOUT_LINK_DISTANCE", 150))
+# Iterations for a full layout; incremental layouts use a quarter of this
+LAYOUT_ITERATIONS = int(os.environ.get("LAYOUT_ITERATIONS", 100))
+# Pull of DeviceGroup members towards their group centre, like groupingStrength
+LAYOUT_GROUP_STRENGTH = float(os.environ.get("LAYOUT_GROUP_STRENGTH", 0.1))
+# Above this many objects repulsion is approximated on a grid of cells
+LAYOUT_EXACT_LIMIT = int(os.environ.get("LAYOUT_EXACT_LIMIT", 1000))
+
+GRID_SIZE = 16
+REPULSION_BLOCK = 512
+GRAVITY = 4.0
+
+
+def _exact_repulsion(positions, rows, k2, columns=None):
+    """Return the k^2/d repulsion on each object in rows from every object in columns"""
+    if columns is None:
+        columns = np.arange(len(positions))
+    x = positions[columns, 0]
+    y = positions[columns, 1]
+    force = np.zeros((len(rows), 2))
+    for start in range(0, len(rows), REPULSION_BLOCK):
+        block = rows[start:start + REPULSION_BLOCK]
+        dx = positions[block, 0, None] - x[None, :]
+        dy = positions[block, 1, None] - y[None, :]
+        weight = dx * dx + dy * dy
+        np.maximum(weight, 0.01, out=weight)
+        np.divide(k2, weight, out=weight)
+        force[start:start + len(block), 0] = (dx * weight).sum(axis=1)
+        force[start:start + len(block), 1] = (dy * weight).sum(axis=1)
+    return force
+
+
+def _grid_repulsion(positions, rows, k2):
+    """
+    Approximate repulsion: exact from objects in the same grid cell, and from
+    the mass-weighted centroid of every other cell.
+    """
+    low = positions.min(axis=0)
+    span = np.maximum(positions.max(axis=0) - low, 1e-6)
+    cell_xy = np.minimum(((positions - low) / span * GRID_SIZE).astype(np.int64), GRID_SIZE - 1)
+    cells = cell_xy[:, 0] * GRID_SIZE + cell_xy[:, 1]
+
+    occupied, cell_of, counts = np.unique(cells, return_inverse=True, return_counts=True)
+    centroids = np.empty((len(occupied), 2))
+    centroids[:, 0] = np.bincount(cell_of, weights=positions[:, 0]) / counts
+    centroids[:, 1] = np.bincount(cell_of, weights=positions[:, 1]) / counts
+
+    # Far field from other cells' centroids, weighted by how many objects they hold
+    force = np.zeros((len(rows), 2))
+    for start in range(0, len(rows), REPULSION_BLOCK):
+        block = rows[start:start + REPULSION_BLOCK]
+        dx = positions[block, 0, None] - centroids[None, :, 0]
+        dy = positions[block, 1, None] - centroids[None, :, 1]
+        weight = dx * dx + dy * dy
+        np.maximum(weight, 0.01, out=weight)
+        weight = k2 * counts[None, :] / weight
+        weight[np.arange(len(block)), cell_of[block]] = 0.0
+        force[start:start + len(block), 0] = (dx * weight).sum(axis=1)
+        force[start:start + len(block), 1] = (dy * weight).sum(axis=1)
+
+    # Near field: exact repulsion between objects sharing a cell
+    order = np.argsort(cell_of, kind='stable')
+    members_by_cell = np.split(order, np.cumsum(counts)[:-1])
+    row_position = np.arange(len(rows))
+    row_cells = cell_of[rows]
+    for cell in np.unique(row_cells):
+        members = members_by_cell[cell]
+        if len(members) > 1:
+            selected = row_position[row_cells == cell]
+            force[selected] += _exact_repulsion(positions, rows[selected], k2, members)
+    return force
+
+
+def force_layout(positions, movable, edges, groups, iterations):
+    """
+    Run the simulation in place on an (n, 2) positions array.
+
+    movable is a boolean mask of objects allowed to move, edges an (m, 2) array of
+    endpoint indices and groups a list of member index arrays. Forces are only
+    evaluated for movable objects, so incremental layouts stay cheap.
+    """
+    count = len(positions)
+    rows = np.flatnonzero(movable)
+    if count == 0 or not len(rows):
+        return positions
+
+    k = LAYOUT_LINK_DISTANCE
+    k2 = k * k
+    repulsion = _exact_repulsion if count <= LAYOUT_EXACT_LIMIT else _grid_repulsion
+
+    # Linear cooling from a tenth of the current extent, as in Fruchterman-Reingold
+    extent = float(np.ptp(positions, axis=0).max()) if count > 1 else k
+    temperature = max(extent, k) * 0.1
+    cooling = temperature / (iterations + 1)
+
+    if len(groups):
+        group_index = np.concatenate([np.full(len(members), i) for i, members in enumerate(groups)])
+        group_members = np.concatenate(groups)
+        group_sizes = np.array([len(members) for members in groups], dtype=float)
+
+    for _ in range(iterations):
+        displacement = np.zeros_like(positions)
+        displacement[rows] = repulsion(positions, rows, k2)
+
+        # Springs along connections: attraction d^2/k
+        if len(edges):
+            delta = positions[edges[:, 0]] - positions[edges[:, 1]]
+            pull = delta * (np.sqrt(np.einsum('ij,ij->i', delta, delta)) / k)[:, None]
+            for axis in (0, 1):
+                displacement[:, axis] -= np.bincount(edges[:, 0], weights=pull[:, axis], minlength=count)
+                displacement[:, axis] += np.bincount(edges[:, 1], weights=pull[:, axis], minlength=count)
+
+        # Pull group members towards their group's centroid
+        if len(groups):
+            for axis in (0, 1):
+                centers = np.bincount(group_index, weights=positions[group_members, axis]) / group_sizes
+                displacement[:, axis] += np.bincount(
+                    group_members,
+                    weights=(centers[group_index] - positions[group_members, axis]) * LAYOUT_GROUP_STRENGTH * k,
+                    minlength=count
+                )
+
+        # Weak gravity keeps disconnected parts of the network together
+        displacement -= positions * GRAVITY
+
+        # Move each object at most 'temperature' along its displacement
+        step = displacement[rows]
+        length = np.maximum(np.sqrt(np.einsum('ij,ij->i', step, step)), 1e-9)
+        positions[rows] += step * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    return positions
+
+
+def compute_layout(node_ids, edges, groups, positions=None, movable_ids=None, iterations=None):
+    """
+    Lay out the graph and return ({object id: (x, y)}, {group id: (x, y)}).
+
+    edges is a list of (source id, target id) pairs and groups maps group ids to
+    member object ids. positions holds known coordinates; when movable_ids is
+    given only those objects (plus any without coordinates) move and only their
+    positions are returned, otherwise every object is laid out from scratch.
+    """
+    positions = positions or {}
+    node_ids = sorted(node_ids)
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    count = len(node_ids)
+    incremental = movable_ids is not None
+    if iterations is None:
+        iterations = LAYOUT_ITERATIONS // 4 if incremental else LAYOUT_ITERATIONS
+
+    edge_array = np.array(
+        [(index[source], index[target]) for source, target in edges
+         if source in index and target in index and source != target],
+        dtype=np.int64
+    ).reshape(-1, 2)
+    group_arrays = []
+    group_ids = []
+    for group_id, member_ids in groups.items():
+        members = np.array(sorted({index[member] for member in member_ids if member in index}), dtype=np.int64)
+        group_ids.append(group_id)
+        group_arrays.append(members)
+    simulated_groups = [members for members in group_arrays if len(members) > 1]
+
+    # Seeded by the graph itself so the same topology always gets the same layout
+    rng = np.random.default_rng(count * 7919 + len(edge_array))
+    coords = np.zeros((count, 2))
+    known = np.zeros(count, dtype=bool)
+    if incremental:
+        for node_id, (x, y) in positions.items():
+            if node_id in index and x is not None and y is not None:
+                coords[index[node_id]] = (x, y)
+                known[index[node_id]] = True
+
+    # Place unknown objects next to positioned neighbors, or scattered around the centre
+    spread = LAYOUT_LINK_DISTANCE * np.sqrt(max(count, 1)) / 2
+    unknown = np.flatnonzero(~known)
+    coords[unknown] = rng.uniform(-spread, spread, size=(len(unknown), 2))
+    if incremental and len(edge_array) and known.any():
+        for a, b in ((0, 1), (1, 0)):
+            anchored = known[edge_array[:, a]] & ~known[edge_array[:, b]]
+            targets = edge_array[anchored, b]
+            coords[targets] = coords[edge_array[anchored, a]] + rng.normal(0, LAYOUT_LINK_DISTANCE / 3, size=(len(targets), 2))
+
+    if incremental:
+        movable = ~known
+        for node_id in movable_ids:
+            if node_id in index:
+                movable[index[node_id]] = True
+        # Let the immediate neighbors of changed objects settle around them too
+        if len(edge_array):
+            seeds = movable.copy()
+            movable[edge_array[seeds[edge_array[:, 0]], 1]] = True
+            movable[edge_array[seeds[edge_array[:, 1]], 0]] = True
+    else:
+        movable = np.ones(count, dtype=bool)
+
+    force_layout(coords, movable, edge_array, simulated_groups, iterations)
+
+    node_positions = {
+        node_ids[i]: (round(float(coords[i, 0]), 1), round(float(coords[i, 1]), 1))
+        for i in np.flatnonzero(movable)
+    }
+    group_positions = {
+        group_id: (round(float(coords[members, 0].mean()), 1), round(float(coords[members, 1].mean()), 1))
+        for group_id, members in zip(group_ids, group_arrays) if len(members)
+    }
+    return node_positions, group_positions
+
+
+class LayoutTracker:
+    """
+    Collect the objects touched by topology changes since the last layout, and
+    optionally schedule a debounced incremental layout after writes.
+    """
+
+    def __init__(self, debounce_seconds=2.0):
+        self._lock = threading.Lock()
+        self._changed = set()
+        self._timer = None
+        self.debounce_seconds = debounce_seconds
+        self.on_settled = None
+
+    def on_changes(self, changes):
+        """Change log listener; layout updates themselves are 'update' records and ignored"""
+        touched = set()
+        for change in changes:
+            if change["op"] != "create":
+                continue
+            properties = change.get("properties") or {}
+            if change["kind"] == "object":
+                touched.add(change["id"])
+            elif change["kind"] == "relationship":
+                touched.update(filter(None, (properties.get("source_id"), properties.get("target_id"))))
+        if not touched:
+            return
+
+        with self._lock:
+            self._changed |= touched
+            if self.on_settled is not None:
+                if self._timer is not None:
+                    self._timer.cancel()
+                self._timer = threading.Timer(self.debounce_seconds, self.on_settled)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def take_changed(self):
+        """Return and forget the objects changed since the last call"""
+        with self._lock:
+            changed, self._changed = self._changed, set()
+            return changed
+
+    def restore_changed(self, changed):
+        """Put back changed objects after a layout run failed"""
+        with self._lock:
+            self._changed |= changed
@@ -0,0 +1,289 @@
+"""
+In-memory lookup index over object addresses and names.
+
+Each object's metadata 'ip' and 'netmask' (either a prefix length or a dotted
+mask, as the UI accepts) are parsed once into an integer address and the
+subnet it belongs to. Exact address and MAC lookups are dictionary hits;
+CIDR and name prefix searches bisect sorted (key, id) lists. Write handlers
+keep the index current through the topology change log, like the adjacency
+index: each change re-indexes only the objects it touches, inserting into
+and removing from the sorted lists by bisection, so a write costs about the
+same on a large graph as on a small one. The whole index is only built when
+it is loaded, on first use and after a resync.
+"""
+
+import ipaddress
+import threading
+from bisect import bisect_left, bisect_right, insort
+from operator import itemgetter
+
+from metadata_codec import normalize_mac
+
+# Metadata keys copied into lookup results
+LOOKUP_METADATA_KEYS = ('ip', 'netmask', 'mac')
+
+
+def parse_address(ip, netmask=None):
+    """
+    Return ((version, integer address), subnet or None) for an IP address.
+
+    Raises ValueError when ip is not an address. An unusable netmask only
+    leaves the subnet unknown.
+    """
+    address = ipaddress.ip_address(str(ip).strip())
+    subnet = None
+    if netmask not in (None, ''):
+        try:
+            subnet = ipaddress.ip_interface(f"{address}/{str(netmask).strip()}").network
+        except ValueError:
+            pass
+    return (address.version, int(address)), subnet
+
+
+class LookupIndex:
+    """Objects by IP address, subnet, MAC address and name, kept in step with the change log"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.version = 0
+        self._loading = False
+        self._pending = []
+        # Source of truth: object id -> {"id", "name", "type", "metadata"} with indexed metadata only
+        self._objects = {}
+        # Object id -> the (address, subnet, MAC, name) keys it is indexed under
+        self._keys = {}
+        # Derived structures, updated with each object
+        self._by_ip = {}
+        self._by_mac = {}
+        self._subnets = {}
+        # Sorted (key, object id) pairs
+        self._addresses = []
+        self._names = []
+
+    def load(self, read_objects, get_changes_since, current_version):
+        """
+        Populate the index from read_objects(), returning (id, name, type,
+        metadata) tuples; changes recorded while reading are replayed afterwards.
+        """
+        with self._lock:
+            self._loading = True
+            self._pending = []
+        try:
+            start_version = current_version()
+            objects = {}
+            for object_id, name, object_type, metadata in read_objects():
+                objects[object_id] = self._entry(object_id, name, object_type, metadata)
+            version, changes = get_changes_since(start_version)
+        except Exception:
+            with self._lock:
+                self._loading = False
+                self._pending = []
+            raise
+
+        with self._lock:
+            self._loading = False
+            if changes is None:
+                # The log was compacted while reading; the next search retries
+                self._pending = []
+                return False
+            self._objects = objects
+            self._build()
+            self.version = start_version
+            self._apply(changes + self._pending)
+            self._pending = []
+            self.loaded = True
+        return True
+
+    def on_changes(self, changes):
+        """Change log listener applying committed writes to the index"""
+        with self._lock:
+            if self.loaded:
+                self._apply(changes)
+            elif self._loading:
+                self._pending.extend(changes)
+
+    def invalidate(self):
+        """Forget the index so it is reloaded on the next search"""
+        with self._lock:
+            self.loaded = False
+            self._objects = {}
+            self._build()
+
+    def _entry(self, object_id, name, object_type, metadata):
+        metadata = metadata or {}
+        return {
+            "id": object_id,
+            "name": name,
+            "type": object_type,
+            "metadata": {key: metadata[key] for key in LOOKUP_METADATA_KEYS if metadata.get(key) is not None}
+        }
+
+    def _apply(self, changes):
+        for change in changes:
+            if change["seq"] <= self.version:
+                continue
+            self.version = change["seq"]
+            if change["kind"] != "object":
+                continue
+            object_id = change["id"]
+            properties = change.get("properties") or {}
+            if change["op"] == "create":
+                self._unindex(object_id)
+                self._objects[object_id] = self._entry(
+                    object_id, properties.get("name"), properties.get("type"), properties.get("metadata")
+                )
+                self._index(object_id)
+            elif change["op"] == "delete":
+                self._unindex(object_id)
+                self._objects.pop(object_id, None)
+            else:
+                entry = self._objects.get(object_id)
+                patch = properties.get("metadata") or {}
+                if entry is None or not any(key in patch for key in LOOKUP_METADATA_KEYS):
+                    continue
+                self._unindex(object_id)
+                for key in LOOKUP_METADATA_KEYS:
+                    if key in patch:
+                        if patch[key] is None:
+                            entry["metadata"].pop(key, None)
+                        else:
+                            entry["metadata"][key] = patch[key]
+                self._index(object_id)
+
+    def _object_keys(self, entry):
+        """Return the (address, subnet, MAC, name) keys of an entry, None where it has none"""
+        metadata = entry["metadata"]
+        address = subnet = None
+        if metadata.get("ip"):
+            try:
+                address, subnet = parse_address(metadata["ip"], metadata.get("netmask"))
+            except ValueError:
+                pass
+        mac = normalize_mac(metadata["mac"]) if metadata.get("mac") else None
+        name = str(entry["name"]).lower() if entry["name"] else None
+        return address, subnet, mac, name
+
+    def _index(self, object_id):
+        """Add an object of _objects to the derived structures"""
+        address, subnet, mac, name = keys = self._object_keys(self._objects[object_id])
+        self._keys[object_id] = keys
+        if address is not None:
+            self._by_ip.setdefault(address, []).append(object_id)
+            insort(self._addresses, (address, object_id))
+            if subnet is not None:
+                self._subnets.setdefault(subnet, []).append(object_id)
+        if mac is not None:
+            self._by_mac.setdefault(mac, []).append(object_id)
+        if name is not None:
+            insort(self._names, (name, object_id))
+
+    def _unindex(self, object_id):
+        """Remove an object from the derived structures, if it is in them"""
+        keys = self._keys.pop(object_id, None)
+        if keys is None:
+            return
+        address, subnet, mac, name = keys
+        if address is not None:
+            _remove_id(self._by_ip, address, object_id)
+            _remove_pair(self._addresses, (address, object_id))
+            if subnet is not None:
+                _remove_id(self._subnets, subnet, object_id)
+        if mac is not None:
+            _remove_id(self._by_mac, mac, object_id)
+        if name is not None:
+            _remove_pair(self._names, (name, object_id))
+
+    def _build(self):
+        """Index every object from scratch, after a load"""
+        self._keys = {}
+        self._by_ip = {}
+        self._by_mac = {}
+        self._subnets = {}
+        addresses = []
+        names = []
+        for object_id, entry in self._objects.items():
+            address, subnet, mac, name = keys = self._object_keys(entry)
+            self._keys[object_id] = keys
+            if address is not None:
+                self._by_ip.setdefault(address, []).append(object_id)
+                addresses.append((address, object_id))
+                if subnet is not None:
+                    self._subnets.setdefault(subnet, []).append(object_id)
+            if mac is not None:
+                self._by_mac.setdefault(mac, []).append(object_id)
+            if name is not None:
+                names.append((name, object_id))
+        addresses.sort()
+        names.sort()
+        self._addresses = addresses
+        self._names = names
+
+    def _results(self, object_ids, limit=None):
+        """Return copies of the entries for object_ids, at most limit of them"""
+        if limit is not None:
+            object_ids = object_ids[:limit]
+        return [dict(self._objects[object_id], metadata=dict(self._objects[object_id]["metadata"]))
+                for object_id in object_ids]
+
+    def by_ip(self, ip):
+        """Return the objects with exactly this IP address; raises ValueError for a bad address"""
+        key = parse_address(ip)[0]
+        with self._lock:
+            return self._results(self._by_ip.get(key, []))
+
+    def by_mac(self, mac):
+        """Return the objects with this MAC address"""
+        with self._lock:
+            return self._results(self._by_mac.get(normalize_mac(mac), []))
+
+    def in_cidr(self, cidr, limit=None):
+        """Return objects whose IP address falls in the network, in address order"""
+        network = ipaddress.ip_network(str(cidr).strip(), strict=False)
+        low = (network.version, int(network.network_address))
+        high = (network.version, int(network.broadcast_address))
+        with self._lock:
+            start = bisect_left(self._addresses, low, key=itemgetter(0))
+            end = bisect_right(self._addresses, high, lo=start, key=itemgetter(0))
+            return self._results(_window_ids(self._addresses, start, end, limit))
+
+    def by_name_prefix(self, prefix, limit=None):
+        """Return objects whose name starts with prefix, ignoring case, in name order"""
+        prefix = prefix.lower()
+        with self._lock:
+            start = bisect_left(self._names, prefix, key=itemgetter(0))
+            end = bisect_left(self._names, prefix + '\U0010ffff', lo=start, key=itemgetter(0))
+            return self._results(_window_ids(self._names, start, end, limit))
+
+    def subnets(self):
+        """Return [{"subnet", "ids"}] for every subnet derived from object netmasks"""
+        with self._lock:
+            ordered = sorted(self._subnets.items(), key=lambda item: (item[0].version, item[0]))
+            return [{"subnet": str(subnet), "ids": list(ids)} for subnet, ids in ordered]
+
+
+def _window_ids(pairs, start, end, limit=None):
+    """Return the object ids of pairs[start:end], at most limit of them"""
+    if limit is not None:
+        end = min(end, start + limit)
+    return [object_id for _, object_id in pairs[start:end]]
+
+
+def _remove_id(index, key, object_id):
+    """Remove object_id from the list index[key], dropping the key once its list is empty"""
+    object_ids = index.get(key)
+    if object_ids is None:
+        return
+    try:
+        object_ids.remove(object_id)
+    except ValueError:
+        return
+    if not object_ids:
+        del index[key]
+
+
+def _remove_pair(pairs, pair):
+    """Remove a (key, object id) pair from a sorted list of them"""
+    position = bisect_left(pairs, pair)
+    if position < len(pairs) and pairs[position] == pair:
+        del pairs[position]
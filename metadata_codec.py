@@ -0,0 +1,200 @@
+"""
+Encoding of object and relationship metadata as Neo4j properties.
+
+Neo4j properties cannot hold maps, so each metadata key is stored as its own
+'metadata_<key>' property. Values that are not primitives (or lists of
+primitives) are stored as JSON strings under 'metadata_<key>_json'. Objects
+and relationships are encoded the same way.
+
+Well-known keys are declared in METADATA_SCHEMA with a type, so they are
+always stored in a form the indexes created by init_schema.py can match.
+Keys not in the schema are stored as given.
+
+Decoding runs once per record on every graph read, so the meaning of each
+property name is worked out once and remembered.
+"""
+
+import json
+from collections import namedtuple
+
+from profiling import profiled
+
+METADATA_PREFIX = 'metadata_'
+JSON_SUFFIX = '_json'
+
+# A declared metadata key: its value type, the Neo4j index kind to create for
+# it ('range', 'text' or None) and the entity kinds it is indexed on
+MetadataField = namedtuple('MetadataField', ['type', 'index', 'targets'])
+
+METADATA_SCHEMA = {
+    'ip': MetadataField('string', 'range', ('object',)),
+    'netmask': MetadataField('string', None, ('object',)),
+    'mac': MetadataField('string', 'range', ('object',)),
+    'hostname': MetadataField('string', 'text', ('object',)),
+    'vlan': MetadataField('integer', 'range', ('object', 'relationship')),
+    'interface': MetadataField('string', None, ('relationship',)),
+}
+
+# Property name -> (metadata key, is JSON) or None for non-metadata properties
+_KEY_CACHE_LIMIT = 4096
+_key_cache = {}
+
+
+def _is_primitive(value):
+    return isinstance(value, (str, int, float, bool))
+
+
+def normalize_mac(value):
+    """Return a MAC address in its canonical lower-case, colon separated form"""
+    return str(value).strip().lower().replace('-', ':')
+
+
+def coerce_metadata_value(key, value):
+    """
+    Convert a value to the type declared for key in METADATA_SCHEMA.
+
+    Undeclared keys are returned unchanged. Raises ValueError with a message
+    for the client when the value does not fit the declared type.
+    """
+    field = METADATA_SCHEMA.get(key)
+    if field is None or value is None:
+        return value
+    if field.type == 'integer':
+        if isinstance(value, bool):
+            raise ValueError(f"metadata '{key}' must be an integer")
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value.strip().lstrip('-').isdigit():
+            return int(value)
+        if isinstance(value, int):
+            return value
+        raise ValueError(f"metadata '{key}' must be an integer")
+    if not _is_primitive(value):
+        raise ValueError(f"metadata '{key}' must be a string")
+    # MAC addresses are stored the way /lookup searches them, so filters and
+    # the index match whichever notation a client sent
+    return normalize_mac(value) if key == 'mac' else str(value).strip()
+
+
+def metadata_filter_forms(key, value):
+    """
+    Return the stored values a filter on a declared key matches: the canonical
+    form, and the forms that values written before the key was declared (or
+    before MACs were normalized) may still have. init_schema.py rewrites those
+    to the canonical form. Raises ValueError like coerce_metadata_value().
+    """
+    canonical = coerce_metadata_value(key, value)
+    forms = [canonical]
+    for legacy in (str(value), str(canonical), str(canonical).replace(':', '-') if key == 'mac' else None):
+        if legacy is not None and legacy not in forms:
+            forms.append(legacy)
+    return forms
+
+
+def metadata_property_name(key, value):
+    """Return the property a metadata value is stored under"""
+    if value is None or _is_primitive(value) or (isinstance(value, list) and all(_is_primitive(x) for x in value)):
+        return f"{METADATA_PREFIX}{key}"
+    return f"{METADATA_PREFIX}{key}{JSON_SUFFIX}"
+
+
+def flatten_metadata(metadata):
+    """Encode a metadata dict as properties; raises ValueError for values that break the schema"""
+    properties = {}
+    if metadata and isinstance(metadata, dict):
+        for key, value in metadata.items():
+            value = coerce_metadata_value(key, value)
+            name = metadata_property_name(key, value)
+            properties[name] = json.dumps(value) if name.endswith(JSON_SUFFIX) else value
+    return properties
+
+
+def metadata_update_properties(metadata):
+    """
+    Encode a metadata patch for SET += on an existing entity.
+
+    A None value removes the key. Setting a key also clears the property of
+    its other encoding, so a value switching between plain and JSON storage
+    never leaves a stale copy behind.
+    """
+    properties = {}
+    for key, value in metadata.items():
+        plain = f"{METADATA_PREFIX}{key}"
+        encoded = f"{METADATA_PREFIX}{key}{JSON_SUFFIX}"
+        properties[plain] = None
+        properties[encoded] = None
+        if value is not None:
+            properties.update(flatten_metadata({key: value}))
+    return properties
+
+
+def flatten_object_properties(object_id, name, obj_type, metadata):
+    """Build NetworkObject node properties, storing each metadata key as its own property"""
+    flat_properties = {
+        'id': object_id,
+        'name': name,
+        'type': obj_type
+    }
+    flat_properties.update(flatten_metadata(metadata))
+    return flat_properties
+
+
+def flatten_relationship_properties(relationship_id, connection_type, metadata):
+    """Build CONNECTS relationship properties, storing each metadata key as its own property"""
+    rel_properties = {
+        'id': relationship_id,
+        'type': connection_type
+    }
+    rel_properties.update(flatten_metadata(metadata))
+    return rel_properties
+
+
+def metadata_indexes():
+    """Yield (index name, kind, target, property) for every indexed schema field"""
+    for key, field in METADATA_SCHEMA.items():
+        if field.index is None:
+            continue
+        for target in field.targets:
+            prefix = 'networkobject' if target == 'object' else 'connects'
+            yield f"{prefix}_metadata_{key}", field.index, target, f"{METADATA_PREFIX}{key}"
+
+
+def _parse_key(name):
+    """Return (metadata key, is JSON) for a property name, or None"""
+    parsed = _key_cache.get(name, False)
+    if parsed is not False:
+        return parsed
+    if not name.startswith(METADATA_PREFIX):
+        parsed = None
+    elif name.endswith(JSON_SUFFIX):
+        parsed = (name[len(METADATA_PREFIX):-len(JSON_SUFFIX)], True)
+    else:
+        parsed = (name[len(METADATA_PREFIX):], False)
+    if len(_key_cache) < _KEY_CACHE_LIMIT:
+        _key_cache[name] = parsed
+    return parsed
+
+
+@profiled('decode_metadata')
+def split_properties(properties):
+    """Split stored properties into (plain properties, decoded metadata)"""
+    plain = {}
+    metadata = {}
+    for name, value in properties.items():
+        parsed = _parse_key(name)
+        if parsed is None:
+            plain[name] = value
+            continue
+        key, is_json = parsed
+        if is_json:
+            try:
+                value = json.loads(value)
+            except (ValueError, TypeError):
+                pass
+        metadata[key] = value
+    return plain, metadata
+
+
+def decode_metadata(properties):
+    """Rebuild metadata from metadata_ and metadata_*_json properties"""
+    return split_properties(properties)[1]
@@ -0,0 +1,200 @@
+"""
+Prometheus metrics served at GET /metrics.
+
+Requests are timed per route, queries per name: the wall time of a
+transaction function (which includes decoding records in Python) next to the
+server times Neo4j reports in each result summary, and snapshot serialization
+on its own, so a slow /network can be attributed to the database, the driver
+or JSON encoding. Connection pool usage is sampled whenever a connection is
+acquired or released.
+
+With several worker processes, PROMETHEUS_MULTIPROC_DIR (set by start.sh)
+makes every worker write its samples to memory-mapped files that /metrics
+aggregates, so any worker answers for all of them. Updating a metric is a
+lock and an add, cheap enough to leave on in production.
+"""
+
+import functools
+import inspect
+import os
+import time
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+from profiling import add_span, current_profile
+
+PROMETHEUS_MULTIPROC_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+
+# Response sizes from 1 KB to 100 MB
+SIZE_BUCKETS = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+REQUEST_SECONDS = Histogram(
+    'http_request_duration_seconds', 'Time to handle a request, up to the start of a streamed body',
+    ['method', 'route', 'status']
+)
+RESPONSE_BYTES = Histogram(
+    'http_response_size_bytes', 'Size of response bodies with a known length', ['route'], buckets=SIZE_BUCKETS
+)
+QUERY_SECONDS = Histogram(
+    'neo4j_query_duration_seconds', 'Wall time of a named query or transaction function, including record decoding',
+    ['query']
+)
+QUERY_SERVER_SECONDS = Histogram(
+    'neo4j_query_server_seconds', 'Server time from result summaries: until the first record is available, '
+    'and until the last one was consumed', ['query', 'phase']
+)
+SERIALIZE_SECONDS = Histogram('graph_serialize_duration_seconds', 'Time to serialize a graph view', ['view'])
+CACHE_REQUESTS = Counter('snapshot_cache_requests_total', 'Snapshot cache lookups', ['view', 'result'])
+POOL_CONNECTIONS = Gauge(
+    'neo4j_pool_connections', 'Connections in the driver pool', ['driver', 'state'], multiprocess_mode='livesum'
+)
+POOL_ACQUIRE_SECONDS = Histogram('neo4j_pool_acquire_duration_seconds', 'Time waited for a pooled connection', ['driver'])
+
+
+def observe_request(method, route, status, seconds, size=None):
+    """Record one handled request; size is None when the body length is not known up front"""
+    REQUEST_SECONDS.labels(method, route, str(status)).observe(seconds)
+    if size is not None:
+        RESPONSE_BYTES.labels(route).observe(size)
+
+
+def observe_cache(view, hit):
+    CACHE_REQUESTS.labels(view, 'hit' if hit else 'miss').inc()
+
+
+def observe_summary(name, summary):
+    """Record the server timings of a consumed result; either may be unavailable"""
+    if summary.result_available_after is not None:
+        QUERY_SERVER_SECONDS.labels(name, 'available').observe(summary.result_available_after / 1000)
+    if summary.result_consumed_after is not None:
+        QUERY_SERVER_SECONDS.labels(name, 'consumed').observe(summary.result_consumed_after / 1000)
+
+
+class _RecordingTransaction:
+    """Transaction proxy remembering the queries it runs and their results"""
+
+    def __init__(self, tx):
+        self._tx = tx
+        self.results = []
+
+    def run(self, query, parameters=None, **kwargs):
+        profile = current_profile()
+        if profile is not None and profile.db_hits:
+            query = "PROFILE " + query
+        result = self._tx.run(query, parameters, **kwargs)
+        self.results.append((query, {**(parameters or {}), **kwargs}, result))
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._tx, name)
+
+
+def timed_query(name):
+    """
+    Decorate a transaction function so its queries are recorded under name.
+
+    Summaries are read once the function has returned, while the transaction
+    is still open; records the function did not read are discarded then.
+    """
+    def decorate(work):
+        @functools.wraps(work)
+        def run(tx, *args, **kwargs):
+            recording = _RecordingTransaction(tx)
+            start = time.perf_counter()
+            value = work(recording, *args, **kwargs)
+            profile = current_profile()
+            for query, parameters, result in recording.results:
+                summary = result.consume()
+                observe_summary(name, summary)
+                if profile is not None:
+                    profile.add_query(name, query, parameters, summary)
+            QUERY_SECONDS.labels(name).observe(time.perf_counter() - start)
+            return value
+        return run
+    return decorate
+
+
+def time_query(name, seconds):
+    """Record the wall time of a query timed by the caller, e.g. a streamed one"""
+    QUERY_SECONDS.labels(name).observe(seconds)
+
+
+def time_serialize(view, seconds):
+    SERIALIZE_SECONDS.labels(view).observe(seconds)
+
+
+def _sample_pool(pool, label):
+    in_use = idle = 0
+    try:
+        for connections in list(pool.connections.values()):
+            for connection in list(connections):
+                if connection.in_use:
+                    in_use += 1
+                else:
+                    idle += 1
+    except RuntimeError:
+        # The pool changed while counting; the next acquire or release samples again
+        return
+    POOL_CONNECTIONS.labels(label, 'in_use').set(in_use)
+    POOL_CONNECTIONS.labels(label, 'idle').set(idle)
+
+
+def instrument_pool(driver, label):
+    """
+    Time connection acquisition and sample pool usage for a sync or async driver.
+
+    The driver has no public pool statistics, so this wraps the acquire and
+    release methods of its (private) pool; a driver without one is left alone.
+    """
+    pool = getattr(driver, '_pool', None)
+    if pool is None or not hasattr(pool, 'connections'):
+        return
+    acquire = pool.acquire
+    release = pool.release
+
+    if inspect.iscoroutinefunction(acquire):
+        async def timed_acquire(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await acquire(*args, **kwargs)
+            finally:
+                waited = time.perf_counter() - start
+                POOL_ACQUIRE_SECONDS.labels(label).observe(waited)
+                add_span('session_acquire', waited)
+                _sample_pool(pool, label)
+
+        async def sampled_release(*args, **kwargs):
+            try:
+                return await release(*args, **kwargs)
+            finally:
+                _sample_pool(pool, label)
+    else:
+        def timed_acquire(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return acquire(*args, **kwargs)
+            finally:
+                waited = time.perf_counter() - start
+                POOL_ACQUIRE_SECONDS.labels(label).observe(waited)
+                add_span('session_acquire', waited)
+                _sample_pool(pool, label)
+
+        def sampled_release(*args, **kwargs):
+            try:
+                return release(*args, **kwargs)
+            finally:
+                _sample_pool(pool, label)
+
+    pool.acquire = timed_acquire
+    pool.release = sampled_release
+
+
+def render_metrics():
+    """Return (body, content type) with every worker's metrics"""
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,466 @@
+"""
+Neo4j storage backend.
+
+Each function runs one Cypher statement (or a short sequence of them) in the
+transaction it is given and returns plain Python values, so route handlers
+and embedded_store.py share one calling convention; see graph_store.py.
+Objects are NetworkObject nodes, connections are CONNECTS relationships and
+groups are DeviceGroup nodes with a CONTAINS relationship to each member.
+"""
+
+import os
+
+from neo4j import GraphDatabase
+
+# Neo4j connection - more secure with required environment variables.
+# A neo4j:// URI enables cluster routing: reads then go to followers
+NEO4J_URI = os.environ.get("NEO4J_URI", "bolt://neo4j:7687")
+NEO4J_USER = os.environ.get("NEO4J_USER", "neo4j")
+NEO4J_PASSWORD = os.environ.get("NEO4J_PASSWORD", "password12345678")
+
+# Longest time a transaction function is retried on transient errors
+NEO4J_TX_RETRY_SECONDS = float(os.environ.get("NEO4J_TX_RETRY_SECONDS", 15))
+
+# Node label of each kind of entity that has a position
+POSITION_LABELS = {'object': "NetworkObject", 'group': "DeviceGroup"}
+
+
+def create_driver():
+    """Create Neo4j driver with connection pooling and appropriate timeout settings"""
+    return GraphDatabase.driver(
+        NEO4J_URI,
+        auth=(NEO4J_USER, NEO4J_PASSWORD),
+        max_connection_lifetime=3600,  # 1 hour
+        max_connection_pool_size=50,
+        connection_acquisition_timeout=60,  # Wait up to 60 seconds for a connection
+        # execute_read/execute_write retry transient errors with backoff for this long
+        max_transaction_retry_time=NEO4J_TX_RETRY_SECONDS
+    )
+
+
+def check_health(session):
+    session.run("RETURN 1 as n").single()
+
+
+# Objects
+
+def create_object(tx, properties):
+    """Create an object from its flattened properties and return its id"""
+    record = tx.run("""
+        CREATE (o:NetworkObject $properties)
+        RETURN o.id AS id
+    """, properties=properties).single()
+    return record["id"] if record else None
+
+
+def update_object(tx, object_id, properties):
+    """
+    Merge properties into an object, removing those set to None, and return
+    its id, name, type and properties, or None when it does not exist.
+    """
+    record = tx.run("""
+        MATCH (o:NetworkObject {id: $id})
+        SET o += $properties
+        RETURN o.id AS id, o.name AS name, o.type AS type, properties(o) AS properties
+    """, id=object_id, properties=properties).single()
+    return dict(record) if record else None
+
+
+def delete_object(tx, object_id):
+    """
+    Delete an object with its connections and memberships. Returns the ids of
+    the deleted connections and, for each group the object was in, the ids of
+    the members left; None when the object does not exist.
+    """
+    # Remove the object and every relationship attached to it in one statement,
+    # keeping what the cascade removed so it can be reported as changes
+    record = tx.run(
+        """
+        MATCH (n:NetworkObject {id: $id})
+        OPTIONAL MATCH (n)-[r:CONNECTS]-()
+        WITH n, collect(DISTINCT r.id) AS relationship_ids
+        OPTIONAL MATCH (g:DeviceGroup)-[:CONTAINS]->(n)
+        OPTIONAL MATCH (g)-[:CONTAINS]->(o:NetworkObject)
+        WHERE o <> n
+        WITH n, relationship_ids, g, collect(o.id) AS nodeIds
+        WITH n, relationship_ids,
+             collect(CASE WHEN g IS NULL THEN null ELSE {id: g.id, nodeIds: nodeIds} END) AS groups
+        DETACH DELETE n
+        RETURN relationship_ids, groups
+        """,
+        id=object_id
+    ).single()
+    if not record:
+        return None
+    return record["relationship_ids"], {group["id"]: group["nodeIds"] for group in record["groups"]}
+
+
+def object_exists(tx, object_id):
+    return tx.run("MATCH (o:NetworkObject {id: $id}) RETURN o.id AS id", id=object_id).single() is not None
+
+
+def read_object_summaries(tx, object_ids):
+    """Return the id, name and type of each of the given objects that exists"""
+    return [record["node"] for record in tx.run("""
+        MATCH (o:NetworkObject)
+        WHERE o.id IN $ids
+        RETURN o {.id, .name, .type} AS node
+    """, ids=object_ids)]
+
+
+# Relationships
+
+def create_relationship(tx, source_id, target_id, properties):
+    """Connect two objects; returns the new connection's endpoints, id and type, or None when either is missing"""
+    record = tx.run(
+        """
+        MATCH (source:NetworkObject {id: $source_id})
+        MATCH (target:NetworkObject {id: $target_id})
+        CREATE (source)-[r:CONNECTS $properties]->(target)
+        RETURN source.id as source_id, target.id as target_id, r.id as id, r.type as type
+        """,
+        source_id=source_id, target_id=target_id, properties=properties
+    ).single()
+    return dict(record) if record else None
+
+
+# Listings
+
+# Cypher expression returned for each field that list endpoints can project;
+# metadata is returned as the raw properties and decoded by the caller
+OBJECT_PROJECTIONS = {
+    'id': "o.id",
+    'name': "o.name",
+    'type': "o.type",
+    'metadata': "properties(o)"
+}
+
+RELATIONSHIP_PROJECTIONS = {
+    'id': "r.id",
+    'source_id': "source.id",
+    'target_id': "target.id",
+    'type': "r.type",
+    'metadata': "properties(r)"
+}
+
+
+def build_list_query(match, alias, options, filter_expressions, projections):
+    """Build the Cypher query and parameters for a filtered, paginated and projected listing"""
+    conditions = []
+    params = {}
+
+    if options["after"] is not None:
+        conditions.append(f"{alias}.id > $after")
+        params["after"] = options["after"]
+
+    for i, (name, values) in enumerate(options["filters"].items()):
+        conditions.append(f"{filter_expressions[name]} IN $filter_{i}")
+        params[f"filter_{i}"] = values
+
+    # Keys are restricted to word characters by METADATA_FILTER_PARAM
+    for i, (key, values) in enumerate(options["metadata"].items()):
+        conditions.append(f"{alias}.`metadata_{key}` IN $metadata_{i}")
+        params[f"metadata_{i}"] = values
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    # Order and limit before projecting so metadata is only rebuilt for the page
+    page_clause = ""
+    if options["limit"] is not None:
+        page_clause = f"ORDER BY {alias}.id LIMIT $limit"
+        params["limit"] = options["limit"]
+
+    return_clause = ", ".join(f"{projections[field]} AS {field}" for field in options["fields"])
+
+    query = f"""
+        {match}
+        {where_clause}
+        WITH * {page_clause}
+        RETURN {return_clause}
+    """
+    return query, params
+
+
+def iter_objects(tx, options):
+    """Yield the requested fields of the objects matching parse_list_options() options"""
+    query, params = build_list_query(
+        "MATCH (o:NetworkObject)", "o", options, {'type': "o.type"}, OBJECT_PROJECTIONS
+    )
+    for record in tx.run(query, **params):
+        yield dict(record)
+
+
+def iter_relationships(tx, options):
+    """Yield the requested fields of the relationships matching parse_list_options() options"""
+    query, params = build_list_query(
+        "MATCH (source:NetworkObject)-[r:CONNECTS]->(target:NetworkObject)", "r", options,
+        {'type': "r.type", 'source_id': "source.id", 'target_id': "target.id"},
+        RELATIONSHIP_PROJECTIONS
+    )
+    for record in tx.run(query, **params):
+        yield dict(record)
+
+
+# Objects, relationships and groups in one query, so the whole graph arrives
+# as a single result stream from a single transaction
+NETWORK_QUERY = """
+    MATCH (o:NetworkObject)
+    RETURN 'nodes' AS section, properties(o) AS properties,
+           null AS source, null AS target, null AS nodeIds
+    UNION ALL
+    MATCH (source:NetworkObject)-[r:CONNECTS]->(target:NetworkObject)
+    RETURN 'links' AS section, properties(r) AS properties,
+           source.id AS source, target.id AS target, null AS nodeIds
+    UNION ALL
+    MATCH (g:DeviceGroup)
+    OPTIONAL MATCH (g)-[:CONTAINS]->(o:NetworkObject)
+    WITH g, COLLECT(o.id) AS nodeIds
+    RETURN 'groups' AS section, properties(g) AS properties,
+           null AS source, null AS target, nodeIds
+"""
+
+
+def iter_network(tx):
+    """Yield (section, properties, source, target, nodeIds) for every object, connection and group"""
+    for record in tx.run(NETWORK_QUERY):
+        yield tuple(record)
+
+
+# Groups
+
+def read_groups(tx):
+    """Return (properties, member ids) of every group"""
+    result = tx.run("""
+        MATCH (g:DeviceGroup)
+        OPTIONAL MATCH (g)-[:CONTAINS]->(o:NetworkObject)
+        RETURN g AS group, COLLECT(o.id) AS nodeIds
+    """)
+    return [(dict(record["group"].items()), record["nodeIds"]) for record in result]
+
+
+def create_group(tx, properties):
+    """Create a group without members and return its properties"""
+    group = tx.run("""
+        CREATE (g:DeviceGroup {id: $id, name: $name, x: $x, y: $y, expanded: $expanded})
+        RETURN g
+    """, **properties).single()["g"]
+    return dict(group.items())
+
+
+def delete_group(tx, group_id):
+    """Delete a group together with its CONTAINS relationships; returns the number deleted"""
+    return tx.run("""
+        MATCH (g:DeviceGroup {id: $id})
+        DETACH DELETE g
+        RETURN COUNT(g) AS deleted
+    """, id=group_id).single()["deleted"]
+
+
+def update_group(tx, group_id, updates):
+    """Set properties of a group and return (properties, member ids), or None when it does not exist"""
+    # Keys are restricted by the route to name, x, y and expanded
+    set_clause = "SET " + ", ".join([f"g.{key} = ${key}" for key in updates.keys()]) if updates else ""
+    record = tx.run(f"""
+        MATCH (g:DeviceGroup {{id: $id}})
+        {set_clause}
+        WITH g
+        OPTIONAL MATCH (g)-[:CONTAINS]->(o:NetworkObject)
+        RETURN g AS group, COLLECT(o.id) AS nodeIds
+    """, id=group_id, **updates).single()
+    if not record:
+        return None
+    return dict(record["group"].items()), record["nodeIds"]
+
+
+def remove_group_members(tx, group_id, node_ids):
+    """Delete the CONTAINS edges from a group to the given objects and return how many were removed"""
+    return tx.run("""
+        MATCH (g:DeviceGroup {id: $group_id})
+        UNWIND $node_ids AS node_id
+        MATCH (g)-[r:CONTAINS]->(:NetworkObject {id: node_id})
+        DELETE r
+        RETURN count(r) AS removed
+    """, group_id=group_id, node_ids=node_ids).single()["removed"]
+
+
+def add_group_members(tx, group_id, node_ids):
+    """Add the given objects to a group and return the ids of those that exist"""
+    return tx.run("""
+        MATCH (g:DeviceGroup {id: $group_id})
+        UNWIND $node_ids AS node_id
+        MATCH (o:NetworkObject {id: node_id})
+        CREATE (g)-[:CONTAINS]->(o)
+        RETURN collect(o.id) AS added
+    """, group_id=group_id, node_ids=node_ids).single()["added"]
+
+
+# Traversals
+
+def connection_type_condition(rel, via_types, exclude_types):
+    """Build a Cypher condition on relationship variable rel, with its parameters"""
+    conditions = []
+    params = {}
+    if via_types:
+        conditions.append(f"{rel}.type IN $via_types")
+        params["via_types"] = via_types
+    if exclude_types:
+        conditions.append(f"NOT coalesce({rel}.type, '') IN $exclude_types")
+        params["exclude_types"] = exclude_types
+    return " AND ".join(conditions) or "true", params
+
+
+def shortest_paths(tx, from_id, to_id, max_hops, limit, all_paths=False, via_types=None, exclude_types=None):
+    """
+    Return up to limit shortest paths between two distinct objects as (nodes,
+    links) pairs, following connections in either direction; one path unless
+    all_paths is set.
+    """
+    type_condition, params = connection_type_condition('r', via_types, exclude_types)
+    path_function = "allShortestPaths" if all_paths else "shortestPath"
+    # max_hops is a validated integer; path lengths cannot be parameters
+    result = tx.run(f"""
+        MATCH (source:NetworkObject {{id: $from_id}}), (target:NetworkObject {{id: $to_id}})
+        MATCH p = {path_function}((source)-[:CONNECTS*..{max_hops}]-(target))
+        WHERE all(r IN relationships(p) WHERE {type_condition})
+        RETURN [n IN nodes(p) | n {{.id, .name, .type}}] AS nodes,
+               [r IN relationships(p) | {{id: r.id, source: startNode(r).id, target: endNode(r).id, type: r.type}}] AS links
+        LIMIT $limit
+    """, from_id=from_id, to_id=to_id, limit=limit, **params)
+    return [(record["nodes"], record["links"]) for record in result]
+
+
+def read_neighbors(tx, object_ids, via_types=None, exclude_types=None):
+    """Return the id, name and type of each object connected to one of object_ids, once each"""
+    type_condition, params = connection_type_condition('r', via_types, exclude_types)
+    result = tx.run(f"""
+        UNWIND $frontier AS node_id
+        MATCH (:NetworkObject {{id: node_id}})-[r:CONNECTS]-(n:NetworkObject)
+        WHERE {type_condition}
+        RETURN DISTINCT n.id AS id, n.name AS name, n.type AS type
+    """, frontier=object_ids, **params)
+    return [dict(record) for record in result]
+
+
+# Index and layout loads
+
+def read_adjacency(tx):
+    """Return the (id, type) of every object and the (id, source, target, type) of every connection"""
+    nodes = [(record["id"], record["type"]) for record in tx.run("""
+        MATCH (o:NetworkObject)
+        RETURN o.id AS id, o.type AS type
+    """)]
+    edges = [(record["id"], record["source"], record["target"], record["type"]) for record in tx.run("""
+        MATCH (source:NetworkObject)-[r:CONNECTS]->(target:NetworkObject)
+        RETURN r.id AS id, source.id AS source, target.id AS target, r.type AS type
+    """)]
+    return nodes, edges
+
+
+def read_lookup_objects(tx, metadata_keys):
+    """Return (id, name, type, properties) of every object, with only the given metadata keys' properties"""
+    # Map projection of the stored properties the caller needs
+    projection = ", ".join(f".`metadata_{key}`" for key in metadata_keys)
+    return [
+        (record["id"], record["name"], record["type"], record["properties"])
+        for record in tx.run(f"""
+            MATCH (o:NetworkObject)
+            RETURN o.id AS id, o.name AS name, o.type AS type, o{{{projection}}} AS properties
+        """)
+    ]
+
+
+def read_layout_graph(tx):
+    """Read stored object positions, connection endpoints and group memberships"""
+    nodes = {record["id"]: (record["x"], record["y"]) for record in tx.run("""
+        MATCH (o:NetworkObject)
+        RETURN o.id AS id, o.x AS x, o.y AS y
+    """)}
+    edges = [(record["source"], record["target"]) for record in tx.run("""
+        MATCH (source:NetworkObject)-[:CONNECTS]->(target:NetworkObject)
+        RETURN source.id AS source, target.id AS target
+    """)]
+    groups = {record["id"]: record["nodeIds"] for record in tx.run("""
+        MATCH (g:DeviceGroup)
+        OPTIONAL MATCH (g)-[:CONTAINS]->(o:NetworkObject)
+        RETURN g.id AS id, COLLECT(o.id) AS nodeIds
+    """)}
+    return nodes, edges, groups
+
+
+def write_positions(tx, kind, rows):
+    """Store the x/y of each {id, x, y} row on objects or groups, as kind says"""
+    tx.run(f"""
+        UNWIND $rows AS row
+        MATCH (n:{POSITION_LABELS[kind]} {{id: row.id}})
+        SET n.x = row.x, n.y = row.y
+    """, rows=rows).consume()
+
+
+# Bulk import: per entity kind, a query that returns which ids already exist
+# and an UNWIND query that writes a chunk of rows
+BULK_QUERIES = {
+    'objects': (
+        """
+        UNWIND $ids AS id
+        MATCH (o:NetworkObject {id: id})
+        RETURN o.id AS id
+        """,
+        """
+        UNWIND $rows AS row
+        CREATE (o:NetworkObject)
+        SET o = row.properties
+        RETURN row.index AS index
+        """
+    ),
+    'relationships': (
+        """
+        UNWIND $ids AS id
+        MATCH ()-[r:CONNECTS {id: id}]->()
+        RETURN r.id AS id
+        """,
+        """
+        UNWIND $rows AS row
+        MATCH (source:NetworkObject {id: row.source_id})
+        MATCH (target:NetworkObject {id: row.target_id})
+        CREATE (source)-[r:CONNECTS]->(target)
+        SET r = row.properties
+        RETURN row.index AS index
+        """
+    ),
+    'groups': (
+        """
+        UNWIND $ids AS id
+        MATCH (g:DeviceGroup {id: id})
+        RETURN g.id AS id
+        """,
+        """
+        UNWIND $rows AS row
+        CREATE (g:DeviceGroup {id: row.id, name: row.name, x: row.x, y: row.y, expanded: row.expanded})
+        WITH g, row
+        CALL {
+            WITH g, row
+            UNWIND row.nodeIds AS node_id
+            MATCH (o:NetworkObject {id: node_id})
+            CREATE (g)-[:CONTAINS]->(o)
+            RETURN collect(o.id) AS members
+        }
+        RETURN row.index AS index, members
+        """
+    )
+}
+
+
+def bulk_existing_ids(tx, kind, ids):
+    """Return which of the given ids of a bulk entity kind already exist"""
+    return {record["id"] for record in tx.run(BULK_QUERIES[kind][0], ids=ids)}
+
+
+def bulk_create(tx, kind, rows):
+    """
+    Write a chunk of bulk rows and return the indexes of the rows written;
+    for groups, a dict from each index to the ids of the members linked
+    """
+    result = tx.run(BULK_QUERIES[kind][1], rows=rows)
+    if kind == 'groups':
+        return {record["index"]: record["members"] for record in result}
+    return {record["index"] for record in result}
@@ -0,0 +1,166 @@
+"""
+Opt-in per-request profiling and the slow request log.
+
+A request is profiled when it takes part in the slow request log
+(SLOW_REQUEST_MS is set) or when an authorized client asks for it with
+?profile=1 and the PROFILE_TOKEN in an X-Profile-Token header. Its profile
+collects spans for connection acquisition, each Cypher statement (with its
+server timings and parameter shapes), metadata decoding and JSON
+serialization. Requests over the threshold, and every explicitly profiled
+request, are printed as one JSON line; explicitly profiled requests also run
+their statements with PROFILE to report database hits, and get the spans
+back in a Server-Timing header.
+
+The profile lives in a context variable, so code outside a profiled
+request pays one lookup per instrumented call.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import time
+
+# Requests slower than this are written to the slow request log; 0 disables it
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 0))
+# Secret clients send in X-Profile-Token to use ?profile=1; unset disables it
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN")
+
+# Longest query text kept in the log
+QUERY_TEXT_LIMIT = 2000
+
+_current = contextvars.ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """Spans collected while handling one request"""
+
+    def __init__(self, method, path, db_hits=False):
+        self.method = method
+        self.path = path
+        self.db_hits = db_hits
+        self.start = time.perf_counter()
+        # Span name -> [seconds, calls], for work repeated per record
+        self.totals = {}
+        self.queries = []
+
+    def add(self, name, seconds):
+        total = self.totals.setdefault(name, [0.0, 0])
+        total[0] += seconds
+        total[1] += 1
+
+    def add_query(self, name, query, parameters, summary):
+        entry = {
+            "name": name,
+            "query": " ".join(query.split())[:QUERY_TEXT_LIMIT],
+            "parameters": {key: parameter_shape(value) for key, value in (parameters or {}).items()},
+            "available_ms": summary.result_available_after,
+            "consumed_ms": summary.result_consumed_after
+        }
+        if summary.profile:
+            entry["db_hits"] = plan_db_hits(summary.profile)
+        self.queries.append(entry)
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.start) * 1000
+
+    def to_dict(self, status, duration_ms):
+        return {
+            "event": "slow_request",
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "duration_ms": round(duration_ms, 1),
+            "spans": {name: {"ms": round(seconds * 1000, 2), "calls": calls}
+                      for name, (seconds, calls) in self.totals.items()},
+            "queries": self.queries
+        }
+
+    def server_timing(self, duration_ms):
+        """Format the spans as a Server-Timing header value"""
+        metrics = [f"total;dur={duration_ms:.1f}"]
+        for name, (seconds, calls) in self.totals.items():
+            metrics.append(f'{name};dur={seconds * 1000:.2f};desc="{calls} calls"')
+        for index, query in enumerate(self.queries):
+            server_ms = (query["available_ms"] or 0) + (query["consumed_ms"] or 0)
+            desc = query["name"] if "db_hits" not in query else f'{query["name"]}, {query["db_hits"]} db hits'
+            metrics.append(f'cypher{index};dur={server_ms};desc="{desc}"')
+        return ", ".join(metrics)
+
+
+def parameter_shape(value, depth=0):
+    """Describe a query parameter by type and size rather than by value"""
+    if value is None:
+        return "null"
+    if isinstance(value, dict):
+        if depth >= 1:
+            return f"map[{len(value)}]"
+        return {key: parameter_shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        inner = parameter_shape(value[0], 1) if value else None
+        if isinstance(inner, dict):
+            inner = f"map[{len(value[0])}]"
+        return f"list[{len(value)}]" + (f" of {inner}" if inner else "")
+    return type(value).__name__
+
+
+def plan_db_hits(plan):
+    """Sum the database hits of a PROFILE plan and all of its children"""
+    return plan.get("dbHits", 0) + sum(plan_db_hits(child) for child in plan.get("children", ()))
+
+
+def profile_requested(args, headers):
+    """Return True when a request asks for ?profile=1 with the right token"""
+    return bool(PROFILE_TOKEN) and args.get('profile') == '1' and headers.get('X-Profile-Token') == PROFILE_TOKEN
+
+
+def start_profile(method, path, requested):
+    """Begin profiling a request when asked to or when the slow log is on; returns a token for finish_profile()"""
+    if not requested and not SLOW_REQUEST_MS:
+        return None
+    return _current.set(RequestProfile(method, path, db_hits=requested))
+
+
+def finish_profile(token, status):
+    """
+    Stop profiling, logging the request when it was slow or explicitly
+    profiled, and return the Server-Timing value for explicit profiles.
+    """
+    if token is None:
+        return None
+    profile = _current.get()
+    _current.reset(token)
+    if profile is None:
+        return None
+    duration_ms = profile.elapsed_ms()
+    if profile.db_hits or duration_ms >= SLOW_REQUEST_MS:
+        print(json.dumps(profile.to_dict(status, duration_ms), default=str))
+    return profile.server_timing(duration_ms) if profile.db_hits else None
+
+
+def current_profile():
+    return _current.get()
+
+
+def add_span(name, seconds):
+    """Add time to a span of the current request, if it is being profiled"""
+    profile = _current.get()
+    if profile is not None:
+        profile.add(name, seconds)
+
+
+def profiled(name):
+    """Decorate a function so its calls add up under a span of the profiled request"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
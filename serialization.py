@@ -0,0 +1,153 @@
+"""
+JSON encoding and compression of response bodies.
+
+Responses are serialized with orjson when it is installed, which is several
+times faster than the standard library encoder on large graphs; JSON_ENCODER
+selects the encoder explicitly. Values orjson cannot encode fall back to
+Flask's encoder, so output never depends on which one ran.
+
+Bodies are compressed with the best encoding the client accepts among
+RESPONSE_COMPRESSION, in that order of preference. Brotli and zstd are
+offered only when their packages are installed. Cached graph snapshots keep
+each compressed variant next to the plain body, so a variant is compressed
+once per topology version, at a higher level than per-request bodies.
+Static assets are compressed at the highest levels when they are built.
+"""
+
+import gzip
+import os
+import threading
+
+from flask.json.provider import DefaultJSONProvider
+
+from profiling import profiled
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 'orjson' or 'json' for the standard library encoder
+JSON_ENCODER = os.environ.get("JSON_ENCODER", "orjson" if orjson else "json")
+
+# Content encodings offered, most preferred first; empty disables compression
+RESPONSE_COMPRESSION = os.environ.get("RESPONSE_COMPRESSION", "br,zstd,gzip")
+
+# Smaller bodies are sent as they are, since compressing them gains nothing
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
+
+# Compression levels for bodies compressed on every request, for cached
+# snapshot variants compressed once per version (under a second on a
+# 100k-object graph) and for static assets compressed once at startup
+DYNAMIC_LEVELS = {'br': 4, 'zstd': 3, 'gzip': 5}
+CACHED_LEVELS = {'br': 6, 'zstd': 10, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'zstd': 19, 'gzip': 9}
+
+# Media types worth compressing
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/html')
+
+_COMPRESSORS = {
+    'br': (lambda body, level: brotli.compress(body, quality=level)) if brotli else None,
+    'zstd': (lambda body, level: zstandard.ZstdCompressor(level=level).compress(body)) if zstandard else None,
+    'gzip': lambda body, level: gzip.compress(body, level, mtime=0),
+}
+
+ENCODINGS = [encoding.strip() for encoding in RESPONSE_COMPRESSION.split(',')
+             if _COMPRESSORS.get(encoding.strip()) is not None]
+
+# Serializes compression of snapshot variants, so concurrent misses wait for
+# the first one instead of compressing the same body again
+_variant_lock = threading.Lock()
+
+if JSON_ENCODER not in ('orjson', 'json'):
+    raise ValueError("JSON_ENCODER must be 'orjson' or 'json'")
+if JSON_ENCODER == 'orjson' and orjson is None:
+    raise ImportError("JSON_ENCODER is 'orjson' but orjson is not installed")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, encoding with orjson when JSON_ENCODER selects it"""
+
+    def dumps(self, obj, **kwargs):
+        # orjson output is always compact, which is what Flask asks for outside debug mode
+        if JSON_ENCODER == 'orjson' and set(kwargs) <= {'separators'}:
+            try:
+                # Dates and dataclasses go to default() to come out as Flask writes them
+                option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+                if self.sort_keys:
+                    option |= orjson.OPT_SORT_KEYS
+                return orjson.dumps(obj, default=self.default, option=option).decode('utf-8')
+            except TypeError:
+                # e.g. integers beyond 64 bits or non-string keys
+                pass
+        return super().dumps(obj, **kwargs)
+
+
+def negotiate_encoding(accept_encoding, offered=None):
+    """
+    Return the content encoding to use for an Accept-Encoding header, or None
+    for an uncompressed body. The client's q-values rank the encodings, and
+    RESPONSE_COMPRESSION breaks ties. offered limits the choice to the
+    encodings a body is available in.
+    """
+    encodings = ENCODINGS if offered is None else [encoding for encoding in ENCODINGS if encoding in offered]
+    if not encodings or not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.partition(';')
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in encodings:
+        quality = weights.get(encoding, weights.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(mimetype):
+    return mimetype in COMPRESSIBLE_MIMETYPES or (mimetype or '').endswith('+json')
+
+
+@profiled('compress')
+def compress(body, encoding, levels=DYNAMIC_LEVELS):
+    """Compress a body with one of ENCODINGS at the level levels gives for it"""
+    return _COMPRESSORS[encoding](body, levels[encoding])
+
+
+def snapshot_variant(snapshot, encoding):
+    """Return a cached snapshot's body in the given encoding, compressing it on first use"""
+    if encoding is None:
+        return snapshot.body
+    body = snapshot.variants.get(encoding)
+    if body is None:
+        with _variant_lock:
+            body = snapshot.variants.get(encoding)
+            if body is None:
+                body = compress(snapshot.body, encoding, CACHED_LEVELS)
+                snapshot.variants[encoding] = body
+    return body
+
+
+def variant_etag(etag, encoding):
+    """Each encoding of a body is a different representation, so it gets its own strong ETag"""
+    return etag if encoding is None else f"{etag}-{encoding}"
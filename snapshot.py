@@ -0,0 +1,194 @@
+"""
+Binary snapshots of the whole graph, for backups and for cloning environments.
+
+A snapshot starts with SNAPSHOT_MAGIC, followed by a stream of msgpack maps:
+a header with the format version, chunks of up to SNAPSHOT_CHUNK_SIZE
+objects, relationships or groups, and an end record with the number of
+each. Chunks are columnar: every stored property is one list of values (nil
+where an entity lacks it), and their msgpack body is zlib-compressed, so the
+property names and repeated values of a chunk are only paid for once.
+
+Properties are kept as stored, with metadata still flattened, so a restore
+writes them back without re-encoding and keeps the layout positions.
+
+    python snapshot.py export backup.nvsnap
+    python snapshot.py import backup.nvsnap
+"""
+
+import argparse
+import datetime
+import os
+import sys
+import zlib
+
+import msgpack
+
+SNAPSHOT_MAGIC = b"NVSNAP"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_MIMETYPE = "application/vnd.network-snapshot"
+
+# Entities per chunk; a chunk is decoded in one piece on import
+SNAPSHOT_CHUNK_SIZE = int(os.environ.get("SNAPSHOT_CHUNK_SIZE", 5000))
+
+# Limits on an imported chunk, checked before it is expanded in memory: its
+# number of entities and the size of its decompressed body
+SNAPSHOT_MAX_CHUNK_ENTITIES = int(os.environ.get("SNAPSHOT_MAX_CHUNK_ENTITIES", 100000))
+SNAPSHOT_MAX_CHUNK_BYTES = int(os.environ.get("SNAPSHOT_MAX_CHUNK_BYTES", 256 * 1024 * 1024))
+
+# zlib level of chunk bodies: the fastest level already gets most of the gain
+SNAPSHOT_COMPRESSION_LEVEL = 1
+
+# Sections of store.iter_network(), in the order a restore must write them
+SNAPSHOT_SECTIONS = ("nodes", "links", "groups")
+
+
+class SnapshotError(ValueError):
+    """Raised when a stream is not a complete snapshot this version can read"""
+
+
+def encode_chunk(section, rows):
+    """Encode (section, properties, source, target, nodeIds) rows of one section as a chunk"""
+    names = {}
+    for row in rows:
+        names.update(dict.fromkeys(row[1]))
+    body = {'columns': {name: [row[1].get(name) for row in rows] for name in names}}
+    if section == "links":
+        body['source'] = [row[2] for row in rows]
+        body['target'] = [row[3] for row in rows]
+    elif section == "groups":
+        body['nodeIds'] = [row[4] for row in rows]
+    data = zlib.compress(msgpack.packb(body), SNAPSHOT_COMPRESSION_LEVEL)
+    return msgpack.packb({'section': section, 'count': len(rows), 'data': data})
+
+
+def decode_chunk(chunk):
+    """Return the (section, properties, source, target, nodeIds) rows of a chunk"""
+    section, count = chunk.get('section'), chunk.get('count')
+    if section not in SNAPSHOT_SECTIONS or not isinstance(count, int) or not 0 <= count <= SNAPSHOT_MAX_CHUNK_ENTITIES:
+        raise SnapshotError("Snapshot contains a malformed chunk")
+    try:
+        decompressor = zlib.decompressobj()
+        data = decompressor.decompress(chunk['data'], SNAPSHOT_MAX_CHUNK_BYTES)
+        if decompressor.unconsumed_tail:
+            raise SnapshotError(f"Snapshot chunk is larger than {SNAPSHOT_MAX_CHUNK_BYTES} bytes")
+        body = msgpack.unpackb(data)
+    except (KeyError, TypeError, zlib.error, msgpack.UnpackException) as e:
+        raise SnapshotError(f"Snapshot chunk cannot be decoded: {e}")
+    except ValueError as e:
+        if isinstance(e, SnapshotError):
+            raise
+        raise SnapshotError(f"Snapshot chunk cannot be decoded: {e}")
+
+    # Every column holds one value per entity, so count is checked against
+    # data that is already in memory before rows are allocated for it
+    columns = body.get('columns', {}) if isinstance(body, dict) else None
+    if not isinstance(columns, dict):
+        raise SnapshotError("Snapshot contains a malformed chunk")
+    lists = list(columns.values()) + [body[name] for name in ('source', 'target', 'nodeIds') if name in body]
+    if (count and not lists) or any(not isinstance(values, list) or len(values) != count for values in lists):
+        raise SnapshotError("Snapshot chunk columns do not match its entity count")
+
+    properties = [{} for _ in range(count)]
+    for name, values in columns.items():
+        for row, value in zip(properties, values):
+            if value is not None:
+                row[name] = value
+    sources = body.get('source') or [None] * count
+    targets = body.get('target') or [None] * count
+    node_ids = body.get('nodeIds') or [None] * count
+    return [(section, *row) for row in zip(properties, sources, targets, node_ids)]
+
+
+def iter_snapshot(rows, topology_version=None, chunk_size=SNAPSHOT_CHUNK_SIZE):
+    """
+    Encode the rows of store.iter_network() as a snapshot, yielding it a
+    chunk at a time so the graph is never held in memory all at once.
+    """
+    yield SNAPSHOT_MAGIC + msgpack.packb({
+        'format': SNAPSHOT_FORMAT_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'topology_version': topology_version
+    })
+    counts = dict.fromkeys(SNAPSHOT_SECTIONS, 0)
+    pending = []
+    for row in rows:
+        if pending and (len(pending) >= chunk_size or pending[0][0] != row[0]):
+            yield encode_chunk(pending[0][0], pending)
+            pending = []
+        pending.append(row)
+        counts[row[0]] += 1
+    if pending:
+        yield encode_chunk(pending[0][0], pending)
+    yield msgpack.packb({'section': 'end', 'counts': counts})
+
+
+def read_snapshot(stream):
+    """
+    Yield the (section, properties, source, target, nodeIds) rows of a
+    snapshot read from a binary file object, a chunk at a time.
+
+    Raises SnapshotError when the stream is not a snapshot, was written by a
+    newer format version or ends before its end record.
+    """
+    if stream.read(len(SNAPSHOT_MAGIC)) != SNAPSHOT_MAGIC:
+        raise SnapshotError("Not a network snapshot")
+    unpacker = msgpack.Unpacker(stream)
+    try:
+        header = next(unpacker)
+    except (StopIteration, ValueError, msgpack.UnpackException):
+        raise SnapshotError("Snapshot header is missing")
+    if not isinstance(header, dict) or header.get('format') != SNAPSHOT_FORMAT_VERSION:
+        raise SnapshotError(f"Unsupported snapshot format {header.get('format') if isinstance(header, dict) else None!r}")
+
+    counts = dict.fromkeys(SNAPSHOT_SECTIONS, 0)
+    try:
+        for chunk in unpacker:
+            if not isinstance(chunk, dict):
+                raise SnapshotError("Snapshot contains a malformed chunk")
+            if chunk.get('section') == 'end':
+                if chunk.get('counts') != counts:
+                    raise SnapshotError("Snapshot entity counts do not match its end record")
+                return
+            rows = decode_chunk(chunk)
+            counts[chunk['section']] += len(rows)
+            yield from rows
+    except (ValueError, msgpack.UnpackException) as e:
+        if isinstance(e, SnapshotError):
+            raise
+        raise SnapshotError(f"Snapshot cannot be decoded: {e}")
+    raise SnapshotError("Snapshot is truncated")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the graph to a snapshot file, or import one into it")
+    parser.add_argument('command', choices=['export', 'import'])
+    parser.add_argument('file', help="snapshot file, or - for stdout/stdin")
+    parser.add_argument('--batch-size', type=int, help="entities written per import transaction")
+    args = parser.parse_args()
+
+    # Imported here so the format helpers above stay usable without a database
+    import app
+
+    if args.command == 'export':
+        output = sys.stdout.buffer if args.file == '-' else open(args.file, 'wb')
+        with output, app.get_read_session(fetch_size=app.NEO4J_FETCH_SIZE) as session:
+            for piece in iter_snapshot(app.store.iter_network(session), app.get_topology_version()):
+                output.write(piece)
+        return 0
+
+    source = sys.stdin.buffer if args.file == '-' else open(args.file, 'rb')
+    with source:
+        try:
+            summary = app.restore_snapshot(source, args.batch_size or app.BULK_BATCH_SIZE)
+        # Run as a script this module is __main__, so catch the app's copy of the class
+        except app.SnapshotError as e:
+            print(f"Import failed: {e}", file=sys.stderr)
+            return 1
+    print(f"Imported {summary['created']} entities, {summary['failed']} failed")
+    for error in summary['errors'][:20]:
+        print(f"  {error['kind']} {error['id']}: {error['error']}", file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,58 +1,97 @@
 #!/bin/bash
 
-# Wait for Neo4j to be available before starting the app
-echo "Waiting for Neo4j to start..."
-timeout=120
-counter=0
-while ! nc -z neo4j 7687; do
-    counter=$((counter + 1))
-    if [ $counter -ge $timeout ]; then
-        echo "Error: Failed to connect to Neo4j within $timeout seconds."
-        exit 1
-    fi
-    echo "Waiting for Neo4j connection... ($counter/$timeout)"
-    sleep 1
-done
-
-# Ensure Neo4j is not just accepting connections but also ready to process queries
-echo "Neo4j is accepting connections, waiting for service to be fully ready..."
-sleep 5  # Give Neo4j a bit more time to initialize completely
+# STORAGE_BACKEND=embedded keeps the graph in-process, with no Neo4j to wait for
+STORAGE_BACKEND=${STORAGE_BACKEND:-neo4j}
+if [ "$STORAGE_BACKEND" = "neo4j" ]; then
+    # Wait for Neo4j to be available before starting the app
+    echo "Waiting for Neo4j to start..."
+    timeout=120
+    counter=0
+    while ! nc -z neo4j 7687; do
+        counter=$((counter + 1))
+        if [ $counter -ge $timeout ]; then
+            echo "Error: Failed to connect to Neo4j within $timeout seconds."
+            exit 1
+        fi
+        echo "Waiting for Neo4j connection... ($counter/$timeout)"
+        sleep 1
+    done
 
-# Initialize database schema separately
-echo "Initializing Neo4j schema..."
-python /app/init_schema.py
-INIT_RESULT=$?
+    # Ensure Neo4j is not just accepting connections but also ready to process queries
+    echo "Neo4j is accepting connections, waiting for service to be fully ready..."
+    sleep 5  # Give Neo4j a bit more time to initialize completely
 
-# If initialization fails, retry in recovery mode
-if [ $INIT_RESULT -ne 0 ]; then
-    echo "First schema initialization attempt failed with exit code $INIT_RESULT"
-    echo "Retrying schema initialization in recovery mode..."
-    export NEO4J_SCHEMA_RECOVERY=true
+    # Initialize database schema separately
+    echo "Initializing Neo4j schema..."
     python /app/init_schema.py
-    RECOVERY_RESULT=$?
-    
-    if [ $RECOVERY_RESULT -ne 0 ]; then
-        echo "Warning: Neo4j schema recovery also failed with exit code $RECOVERY_RESULT"
-        echo "The application will still try to start, but database operations may fail."
-    else
-        echo "Schema recovery completed successfully."
+    INIT_RESULT=$?
+
+    # If initialization fails, retry in recovery mode
+    if [ $INIT_RESULT -ne 0 ]; then
+        echo "First schema initialization attempt failed with exit code $INIT_RESULT"
+        echo "Retrying schema initialization in recovery mode..."
+        export NEO4J_SCHEMA_RECOVERY=true
+        python /app/init_schema.py
+        RECOVERY_RESULT=$?
+
+        if [ $RECOVERY_RESULT -ne 0 ]; then
+            echo "Warning: Neo4j schema recovery also failed with exit code $RECOVERY_RESULT"
+            echo "The application will still try to start, but database operations may fail."
+        else
+            echo "Schema recovery completed successfully."
+        fi
     fi
 fi
 
-echo "Neo4j is available, starting application with Gunicorn"
+# Workers share one topology change log so none of them serves a stale graph
+export CHANGELOG_SHARED_PATH=${CHANGELOG_SHARED_PATH:-/dev/shm/infra-viz-changes.log}
+
+# Workers write metrics to files here so /metrics reports all of them; start empty
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/dev/shm/infra-viz-metrics}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# The embedded store is owned by a single process, which serves every request
+if [ "$STORAGE_BACKEND" = "embedded" ]; then
+    ASGI_WORKERS=1
+fi
+
+# SERVER_MODE=asgi serves the app with Uvicorn through asgi.py instead of Gunicorn
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+    echo "Starting application with Uvicorn ($STORAGE_BACKEND storage)"
+    exec uvicorn asgi:app \
+        --host 0.0.0.0 \
+        --port 5000 \
+        --workers ${ASGI_WORKERS:-1} \
+        --timeout-graceful-shutdown 30 \
+        --log-level info
+fi
+
+echo "Starting application with Gunicorn ($STORAGE_BACKEND storage)"
 
 # Get number of workers based on CPU cores (2 * num_cores + 1 is a common formula)
 NUM_WORKERS=$(( $(nproc) * 2 + 1 ))
 NUM_WORKERS=${NUM_WORKERS:-3}  # Default to 3 workers if nproc fails
+NUM_THREADS=2
+MAX_REQUESTS=1000
+
+# One worker with more threads when the graph lives in the worker itself
+if [ "$STORAGE_BACKEND" = "embedded" ]; then
+    NUM_WORKERS=1
+    NUM_THREADS=8
+    # Recycling the only worker would reload the whole graph
+    MAX_REQUESTS=0
+fi
 
 # Use Gunicorn with the right number of workers for production
 exec gunicorn \
+    --config /app/gunicorn.conf.py \
     --bind 0.0.0.0:5000 \
     --workers $NUM_WORKERS \
     --worker-class gthread \
-    --threads 2 \
+    --threads $NUM_THREADS \
     --timeout 90 \
-    --max-requests 1000 \
+    --max-requests $MAX_REQUESTS \
     --max-requests-jitter 50 \
     --graceful-timeout 30 \
     --worker-tmp-dir /dev/shm \
@@ -16,6 +16,92 @@ document.addEventListener('DOMContentLoaded', function() {
     // API URL (adjust based on your environment)
     const API_URL = '/';
 
+    // Bookmark returned by the latest write. It is sent with the next read so a
+    // clustered Neo4j answers from a member that has already applied that write.
+    let lastBookmark = null;
+
+    function apiFetch(url, options = {}) {
+        const method = (options.method || 'GET').toUpperCase();
+        const headers = new Headers(options.headers || {});
+        const sentBookmark = method === 'GET' ? lastBookmark : null;
+        if (sentBookmark) {
+            headers.set('X-Neo4j-Bookmark', sentBookmark);
+        }
+        return fetch(url, { ...options, headers }).then(response => {
+            const bookmark = response.headers.get('X-Neo4j-Bookmark');
+            if (bookmark) {
+                lastBookmark = bookmark;
+            } else if (sentBookmark && response.ok && lastBookmark === sentBookmark) {
+                // The read has seen the write; later reads can use any member again
+                lastBookmark = null;
+            }
+            return response;
+        });
+    }
+
+    // Topology version of the graph on screen, from the X-Topology-Version header
+    let loadedVersion = null;
+    let reloadTimer = null;
+
+    // Versions are '<epoch>-<number>' tokens; numbers only compare within one
+    // epoch, and a new epoch (e.g. after a server restart) is always newer
+    function isNewerVersion(version, than) {
+        if (than === null) {
+            return true;
+        }
+        const [epoch, number] = version.split(/-(?=\d+$)/);
+        const [thanEpoch, thanNumber] = than.split(/-(?=\d+$)/);
+        return epoch !== thanEpoch || Number(number) > Number(thanNumber);
+    }
+
+    // How often /network/changes is polled where the /events stream is not served
+    const CHANGES_POLL_MS = 5000;
+
+    // Reload the graph when another tab or user changes the topology. Changes
+    // this page has already loaded (e.g. its own writes) are skipped.
+    function scheduleReload(version) {
+        if (!isNewerVersion(version, loadedVersion)) {
+            return;
+        }
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(loadNetworkData, 250);
+    }
+
+    // Changes are pushed over /events when the server runs in ASGI mode; it
+    // answers 501 otherwise, since every open stream would hold a worker thread
+    function subscribeToChanges() {
+        if (!window.EventSource) {
+            pollChanges();
+            return;
+        }
+        const events = new EventSource(`${API_URL}events`);
+        events.addEventListener('change', event => scheduleReload(event.lastEventId));
+        events.addEventListener('resync', event => scheduleReload(event.lastEventId));
+        events.addEventListener('error', () => {
+            // A closed stream was refused rather than dropped, so it is not retried
+            if (events.readyState === EventSource.CLOSED) {
+                pollChanges();
+            }
+        });
+    }
+
+    function pollChanges() {
+        setInterval(() => {
+            if (loadedVersion === null || document.hidden) {
+                return;
+            }
+            // Plain fetch: the bookmark of this page's last write is kept for the reload
+            fetch(`${API_URL}network/changes?since=${encodeURIComponent(loadedVersion)}`)
+                .then(response => response.ok ? response.json() : null)
+                .then(body => {
+                    if (body && (body.resync || body.changes.length > 0)) {
+                        scheduleReload(body.version);
+                    }
+                })
+                .catch(error => console.error('Error polling network changes:', error));
+        }, CHANGES_POLL_MS);
+    }
+
     // Global variables
     let networkObjects = [];
     let networkRelationships = [];
@@ -47,6 +133,9 @@ document.addEventListener('DOMContentLoaded', function() {
         // Load initial data
         loadNetworkData();
         
+        // Keep the graph live while the page is open
+        subscribeToChanges();
+        
         // Set up event listeners
         setupEventListeners();
         
@@ -57,10 +146,11 @@ document.addEventListener('DOMContentLoaded', function() {
         preloadIcons(['router', 'switch', 'ap', 'server', 'client', 'nas', 'internet']);
     }
     
-    // Preload SVG icons for better performance
+    // Preload SVG icons for better performance. They are fetched from the
+    // URLs nodes are drawn with, which the browser caches for good
     function preloadIcons(iconTypes) {
         const iconPromises = iconTypes.map(type => {
-            return fetch(`/static/img/${type === 'ap' ? 'access-point' : type}.svg`)
+            return fetch(getNodeIcon(type))
                 .then(response => response.text())
                 .then(svgText => {
                     // Store SVG data in memory for quick access
@@ -155,11 +245,15 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Load network data from server
     function loadNetworkData() {
-        fetch(`${API_URL}network`)
+        apiFetch(`${API_URL}network`)
             .then(response => {
                 if (!response.ok) {
                     throw new Error(`Failed to load network data: ${response.status} ${response.statusText}`);
                 }
+                const version = response.headers.get('X-Topology-Version');
+                if (version !== null) {
+                    loadedVersion = version;
+                }
                 return response.json();
             })
             .then(data => {
@@ -187,6 +281,16 @@ document.addEventListener('DOMContentLoaded', function() {
                     };
                 });
                 
+                // Positions computed by the server layout are centred on the origin
+                const serverPositioned = networkObjects.length > 0 &&
+                    networkObjects.every(node => typeof node.x === 'number' && typeof node.y === 'number');
+                networkObjects.forEach(node => {
+                    if (typeof node.x === 'number' && typeof node.y === 'number') {
+                        node.x += width / 2;
+                        node.y += height / 2;
+                    }
+                });
+                
                 // Set initial positions if not already set
                 networkObjects.forEach(node => {
                     if (node.x === undefined) {
@@ -195,26 +299,32 @@ document.addEventListener('DOMContentLoaded', function() {
                     }
                 });
                 
-                // Set initial positions for device groups if not already set
+                // A group sits at the centre of its members, so its position is
+                // taken from theirs in canvas coordinates. Stored group positions
+                // may come from the server layout (centred on the origin) or from
+                // this page (canvas coordinates), so only an empty group, which
+                // the layout never positions, keeps its stored one.
                 deviceGroups.forEach(group => {
-                    if (group.x === undefined) {
-                        // Calculate position based on member nodes
-                        const memberNodes = networkObjects.filter(node => 
-                            group.nodeIds.includes(node.id)
-                        );
-                        
-                        if (memberNodes.length > 0) {
-                            group.x = memberNodes.reduce((sum, n) => sum + n.x, 0) / memberNodes.length;
-                            group.y = memberNodes.reduce((sum, n) => sum + n.y, 0) / memberNodes.length;
-                        } else {
-                            group.x = width / 2 + (Math.random() - 0.5) * width / 3;
-                            group.y = height / 2 + (Math.random() - 0.5) * height / 3;
-                        }
+                    const memberNodes = networkObjects.filter(node => 
+                        group.nodeIds.includes(node.id)
+                    );
+                    
+                    if (memberNodes.length > 0) {
+                        group.x = memberNodes.reduce((sum, n) => sum + n.x, 0) / memberNodes.length;
+                        group.y = memberNodes.reduce((sum, n) => sum + n.y, 0) / memberNodes.length;
+                    } else if (typeof group.x !== 'number' || typeof group.y !== 'number') {
+                        group.x = width / 2 + (Math.random() - 0.5) * width / 3;
+                        group.y = height / 2 + (Math.random() - 0.5) * height / 3;
                     }
                 });
                 
                 // Update the visualization
                 updateVisualization();
+                
+                // A pre-positioned graph only needs a gentle settle instead of a full simulation
+                if (serverPositioned) {
+                    simulation.alpha(0.05);
+                }
             })
             .catch(error => {
                 console.error('Error loading network data:', error);
@@ -632,7 +742,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     if (confirm(`Delete ${count} selected ${count > 1 ? 'devices' : 'device'}?`)) {
                         // Delete each selected node
                         const deletePromises = selectedNodes.map(node => 
-                            fetch(`${API_URL}objects/${node.id}`, {
+                            apiFetch(`${API_URL}objects/${node.id}`, {
                                 method: 'DELETE'
                             })
                         );
@@ -678,7 +788,7 @@ document.addEventListener('DOMContentLoaded', function() {
         };
         
         // Send to API
-        fetch(`${API_URL}objects`, {
+        apiFetch(`${API_URL}objects`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -731,7 +841,7 @@ document.addEventListener('DOMContentLoaded', function() {
         };
         
         // Send to API
-        fetch(`${API_URL}objects`, {
+        apiFetch(`${API_URL}objects`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -773,7 +883,7 @@ document.addEventListener('DOMContentLoaded', function() {
         console.log('Sending relationship data:', relationshipData);
         
         // Send to API
-        fetch(`${API_URL}relationships`, {
+        apiFetch(`${API_URL}relationships`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json',
@@ -836,7 +946,7 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         
         // Send delete request to API
-        fetch(`${API_URL}objects/${objectId}`, {
+        apiFetch(`${API_URL}objects/${objectId}`, {
             method: 'DELETE'
         })
         .then(response => {
@@ -885,7 +995,7 @@ document.addEventListener('DOMContentLoaded', function() {
         };
         
         // Send to API
-        fetch(`${API_URL}objects/${objectId}`, {
+        apiFetch(`${API_URL}objects/${objectId}`, {
             method: 'PATCH',
             headers: {
                 'Content-Type': 'application/json',
@@ -1124,7 +1234,7 @@ document.addEventListener('DOMContentLoaded', function() {
         console.log(`Group created successfully:`, group);
         
         // Save groups to the database via API
-        fetch(`${API_URL}groups`, {
+        apiFetch(`${API_URL}groups`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -0,0 +1,171 @@
+"""
+Fingerprinted, pre-compressed static assets.
+
+Every file under the static folder is served under a name that includes a
+hash of its content (css/style.css becomes css/style.<hash>.css), so browsers
+can cache it forever: a changed file gets a new name. References between
+assets - stylesheets and scripts in index.html, icons in the stylesheet and
+scripts - are rewritten to the fingerprinted names, and each text asset is
+compressed once with every encoding the server offers. Entry points such as
+index.html keep their name and are revalidated with their ETag instead.
+
+The app builds the assets in memory when it starts. The same build can be
+written out for a reverse proxy or CDN to serve:
+
+    python static_assets.py build/static
+"""
+
+import argparse
+import json
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+from collections import namedtuple
+
+from serialization import ENCODINGS, STATIC_LEVELS, compress
+from topology import compute_etag
+
+# Fingerprint and pre-compress static files at startup; turn off while
+# editing them, to have changes served without a restart
+STATIC_FINGERPRINT = os.environ.get("STATIC_FINGERPRINT", "true").lower() == "true"
+
+# Files served under their own name, since users and bookmarks request them
+ENTRY_POINTS = {'index.html'}
+
+# Assets whose content may reference other assets
+REFERENCING_EXTENSIONS = ('.html', '.css', '.js')
+
+# Assets worth compressing; images other than SVG are compressed already
+COMPRESSIBLE_EXTENSIONS = ('.html', '.css', '.js', '.svg', '.json', '.txt')
+
+# Suffix of the pre-compressed copy of a file for each encoding
+ENCODING_SUFFIXES = {'br': '.br', 'zstd': '.zst', 'gzip': '.gz'}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# A quoted or url() reference; only ones naming an asset are rewritten
+REFERENCE = re.compile(r"""(?<=["'(])([^"'()\s?#]+)(?=[?#"')])""")
+
+# An asset ready to serve: its body, compressed variants by encoding, strong ETag and media type
+Asset = namedtuple('Asset', ['body', 'variants', 'etag', 'mimetype'])
+
+
+def fingerprinted_name(path, digest):
+    """Insert the content digest before the extension: css/style.css -> css/style.<digest>.css"""
+    root, extension = posixpath.splitext(path)
+    return f"{root}.{digest[:12]}{extension}"
+
+
+def resolve_reference(source_path, reference):
+    """Return the static path a reference in source_path points at, or None for external URLs"""
+    if '://' in reference or reference.startswith(('data:', '//')):
+        return None
+    if reference.startswith('/'):
+        return posixpath.normpath(reference.lstrip('/'))
+    return posixpath.normpath(posixpath.join(posixpath.dirname(source_path), reference))
+
+
+class StaticAssets:
+    """The fingerprinted assets of a static folder, by the path they are served under"""
+
+    def __init__(self, source_dir):
+        self.source_dir = source_dir
+        self.sources = {}
+        for directory, _, files in os.walk(source_dir):
+            for name in files:
+                full_path = os.path.join(directory, name)
+                path = os.path.relpath(full_path, source_dir).replace(os.sep, '/')
+                with open(full_path, 'rb') as f:
+                    self.sources[path] = f.read()
+
+        # Static path -> fingerprinted path, for every asset but the entry points
+        self.manifest = {}
+        self.files = {}
+        self.immutable = set()
+        for path in sorted(self.sources):
+            self._build(path, ())
+
+    def _build(self, path, referrers):
+        """Build an asset after the assets it references, whose names it needs"""
+        if path in self.files:
+            return
+        if path in referrers:
+            raise ValueError(f"Static assets reference each other in a cycle: {' -> '.join(referrers + (path,))}")
+        body = self.sources[path]
+        if path.endswith(REFERENCING_EXTENSIONS):
+            body = self._rewrite(path, body, referrers + (path,))
+
+        etag = compute_etag(body)
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        variants = {}
+        if path.endswith(COMPRESSIBLE_EXTENSIONS):
+            for encoding in ENCODINGS:
+                compressed = compress(body, encoding, STATIC_LEVELS)
+                if len(compressed) < len(body):
+                    variants[encoding] = compressed
+        asset = Asset(body, variants, etag, mimetype)
+
+        # The static name stays available, revalidated by ETag, for anything
+        # that requests it directly
+        self.files[path] = asset
+        if path not in ENTRY_POINTS:
+            served_path = fingerprinted_name(path, etag)
+            self.manifest[path] = served_path
+            self.files[served_path] = asset
+            self.immutable.add(served_path)
+
+    def _rewrite(self, path, body, referrers):
+        text = body.decode('utf-8')
+
+        def replace(match):
+            reference = match.group(1)
+            target = resolve_reference(path, reference)
+            if target not in self.sources or target == path:
+                return reference
+            self._build(target, referrers)
+            if target not in self.manifest:
+                return reference
+            # Only the file name changes, so the reference keeps its form
+            return reference[:len(reference) - len(posixpath.basename(target))] + posixpath.basename(self.manifest[target])
+
+        return REFERENCE.sub(replace, text).encode('utf-8')
+
+    def get(self, path):
+        return self.files.get(path)
+
+    def cache_control(self, path):
+        return IMMUTABLE_CACHE_CONTROL if path in self.immutable else "no-cache"
+
+    def write(self, target_dir):
+        """Write every served file, its pre-compressed copies and manifest.json to target_dir"""
+        for path, asset in self.files.items():
+            if path in self.manifest:
+                # Written under its fingerprinted name only
+                continue
+            full_path = os.path.join(target_dir, *path.split('/'))
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'wb') as f:
+                f.write(asset.body)
+            for encoding, body in asset.variants.items():
+                with open(full_path + ENCODING_SUFFIXES[encoding], 'wb') as f:
+                    f.write(body)
+        with open(os.path.join(target_dir, 'manifest.json'), 'w') as f:
+            json.dump(self.manifest, f, indent=2, sort_keys=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write fingerprinted, pre-compressed static assets")
+    parser.add_argument('output', help="directory to write the assets to")
+    parser.add_argument('--source', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
+    args = parser.parse_args()
+
+    assets = StaticAssets(args.source)
+    assets.write(args.output)
+    print(f"Wrote {len(assets.manifest)} fingerprinted assets, entry points and manifest.json to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
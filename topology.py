@@ -0,0 +1,338 @@
+"""
+Topology versioning, change log and graph snapshot caching.
+
+Every route that mutates the graph records a change once its write has
+committed. Each change advances the topology version and is kept in a bounded
+in-memory log, so clients can fetch only the changes after a version they
+already have. Read routes that return the whole graph keep a pre-serialized
+snapshot tagged with the version it was built at, so an unchanged graph is
+served from memory instead of being re-read from Neo4j.
+
+With several worker processes, CHANGELOG_SHARED_PATH names an append-only
+file (on /dev/shm in the container) that every worker writes its changes to
+under a file lock. Workers pick up each other's changes with a stat() of the
+file whenever they read the version, so versions are global, caches keyed by
+version are never stale and in-memory indexes apply every worker's writes.
+
+Clients see a version as a token prefixed with the epoch of the log it counts
+in: a random id for a process's own log, or one kept next to the shared file,
+which a restart clears along with the log. A token from another epoch does
+not name a point in this log, even when its number is in range, so clients
+holding one are told to reload the full graph.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import uuid
+from collections import deque, namedtuple
+from itertools import islice
+
+# A serialized response body together with the version it was built from, and
+# its compressed variants by content encoding, added as clients ask for them
+Snapshot = namedtuple('Snapshot', ['version', 'body', 'etag', 'variants'])
+
+# Number of change records kept before the oldest ones are compacted away
+CHANGELOG_MAX_ENTRIES = int(os.environ.get("CHANGELOG_MAX_ENTRIES", 10000))
+
+# Change log file shared by the worker processes of one host; when unset each
+# process keeps its own log and version
+CHANGELOG_SHARED_PATH = os.environ.get("CHANGELOG_SHARED_PATH")
+
+# How often the ASGI app checks the shared file for other workers' changes to
+# push to /events streams
+CHANGELOG_POLL_SECONDS = float(os.environ.get("CHANGELOG_POLL_SECONDS", 0.5))
+
+_version_lock = threading.Lock()
+_topology_version = 0
+_change_log = deque(maxlen=CHANGELOG_MAX_ENTRIES)
+_change_listeners = []
+_resync_listeners = []
+
+# Position of this process in the shared file: its inode, the byte offset read
+# up to, and the sequence number of its first record
+_shared = {"inode": None, "offset": 0, "first_seq": None, "synced": False}
+
+# Epoch of the versions counted in this process's log; the shared one is read on first use
+_epoch = None
+
+
+def _start_epoch():
+    global _epoch
+    _epoch = None if CHANGELOG_SHARED_PATH else uuid.uuid4().hex[:12]
+
+
+_start_epoch()
+# A worker forked from a preloading server keeps its own log, so it needs its own epoch
+os.register_at_fork(after_in_child=_start_epoch)
+
+
+def get_topology_epoch():
+    """Return the id of the change log versions are counted in"""
+    global _epoch
+    if _epoch is None:
+        with _version_lock:
+            if _epoch is None:
+                _epoch = _read_shared_epoch()
+    return _epoch
+
+
+def _read_shared_epoch():
+    """Read the epoch kept next to the shared file, creating it if this is the first worker"""
+    path = f"{CHANGELOG_SHARED_PATH}.epoch"
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    # Written aside and linked into place, so other workers never read a partial file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        f.write(uuid.uuid4().hex[:12])
+    try:
+        os.link(temporary, path)
+    except FileExistsError:
+        # Another worker created it first
+        pass
+    finally:
+        os.unlink(temporary)
+    with open(path) as f:
+        return f.read().strip()
+
+
+def format_version(version):
+    """Return the token clients are given for a version: '<epoch>-<version>'"""
+    return f"{get_topology_epoch()}-{version}"
+
+
+def parse_version(token):
+    """
+    Return the version a client's token names, or None when the token is from
+    another epoch, such as one issued before a restart. Raises ValueError when
+    the token is not a version at all.
+    """
+    epoch, separator, version = str(token).strip().rpartition('-')
+    if not version.isdigit() or (separator and not epoch):
+        raise ValueError(f"Invalid topology version {token!r}")
+    # Bare numbers were issued before versions carried an epoch
+    return int(version) if epoch == get_topology_epoch() else None
+
+
+def get_topology_version():
+    """Return the current topology version, including other workers' changes"""
+    if CHANGELOG_SHARED_PATH:
+        with _version_lock:
+            _sync_shared()
+    return _topology_version
+
+
+def add_change_listener(listener, local_only=False):
+    """
+    Call listener(changes) with each list of newly recorded change records.
+
+    Listeners run while the log is locked so they observe changes in sequence
+    order; they must be quick and must not record changes themselves. With
+    local_only, only changes recorded by this process are passed on.
+    """
+    _change_listeners.append((listener, local_only))
+
+
+def add_resync_listener(listener):
+    """Call listener() when changes from other workers were missed and derived state must be rebuilt"""
+    _resync_listeners.append(listener)
+
+
+def _notify(records, local):
+    for listener, local_only in _change_listeners:
+        if local_only and not local:
+            continue
+        try:
+            listener(records)
+        except Exception as e:
+            # A failing listener must not undo a write that already committed
+            print(f"Change listener {listener!r} failed: {e}")
+
+
+def _ingest(records, notify, local=False):
+    """Append records newer than the current version to the log; call with _version_lock held"""
+    global _topology_version
+    records = [record for record in records if record["seq"] > _topology_version]
+    if not records:
+        return
+    if records[0]["seq"] != _topology_version + 1 and notify:
+        # The shared file was compacted past changes this process never saw
+        print(f"Missed changes {_topology_version + 1}..{records[0]['seq'] - 1}, resynchronizing")
+        _change_log.clear()
+        for listener in _resync_listeners:
+            listener()
+    _change_log.extend(records)
+    _topology_version = records[-1]["seq"]
+    if notify:
+        _notify(records, local)
+
+
+def _sync_shared():
+    """Read changes other workers appended to the shared file; call with _version_lock held"""
+    try:
+        stat = os.stat(CHANGELOG_SHARED_PATH)
+        if stat.st_ino == _shared["inode"] and stat.st_size == _shared["offset"]:
+            return
+        f = open(CHANGELOG_SHARED_PATH, 'rb')
+    except FileNotFoundError:
+        return
+
+    with f:
+        # The file may have been replaced since stat(); trust what was opened
+        stat = os.fstat(f.fileno())
+        offset = _shared["offset"]
+        if stat.st_ino != _shared["inode"] or stat.st_size < offset:
+            # First read, or the file was replaced by a compaction
+            offset = 0
+        f.seek(offset)
+        data = f.read()
+    # A writer may be mid-line; leave any partial line for the next read
+    end = data.rfind(b'\n') + 1
+    records = [json.loads(line) for line in data[:end].splitlines() if line]
+    if offset == 0:
+        _shared["first_seq"] = records[0]["seq"] if records else None
+    _shared["inode"] = stat.st_ino
+    _shared["offset"] = offset + end
+
+    # Changes from before this process started are history, not news
+    _ingest(records, notify=_shared["synced"])
+    _shared["synced"] = True
+
+
+def _compact_shared():
+    """Rewrite the shared file with only the records still kept in memory; call with the file lock held"""
+    temporary = f"{CHANGELOG_SHARED_PATH}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(b"".join(json.dumps(record).encode('utf-8') + b"\n" for record in _change_log))
+    os.replace(temporary, CHANGELOG_SHARED_PATH)
+    stat = os.stat(CHANGELOG_SHARED_PATH)
+    _shared["inode"] = stat.st_ino
+    _shared["offset"] = stat.st_size
+    _shared["first_seq"] = _change_log[0]["seq"] if _change_log else None
+
+
+def _record_shared(recorded_changes):
+    """Append changes to the shared file under its lock, numbering them after every worker's changes"""
+    with open(f"{CHANGELOG_SHARED_PATH}.lock", 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            _sync_shared()
+            records = []
+            for seq, (op, kind, entity_id, properties) in enumerate(recorded_changes, _topology_version + 1):
+                change = {"seq": seq, "op": op, "kind": kind, "id": entity_id}
+                if properties is not None:
+                    change["properties"] = properties
+                records.append(change)
+
+            data = b"".join(json.dumps(record).encode('utf-8') + b"\n" for record in records)
+            with open(CHANGELOG_SHARED_PATH, 'ab') as f:
+                f.write(data)
+            # Everything up to here has been read, so the file now ends with these records
+            stat = os.stat(CHANGELOG_SHARED_PATH)
+            _shared["inode"] = stat.st_ino
+            _shared["offset"] = stat.st_size
+            if _shared["first_seq"] is None:
+                _shared["first_seq"] = records[0]["seq"]
+            _shared["synced"] = True
+            _ingest(records, notify=True, local=True)
+
+            if _topology_version - _shared["first_seq"] >= 2 * CHANGELOG_MAX_ENTRIES:
+                _compact_shared()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def record_changes(changes):
+    """
+    Append committed changes to the log and return the new topology version.
+
+    Each change is an (op, kind, id, properties) tuple where op is one of
+    'create', 'update' or 'delete' and kind is 'object', 'relationship' or
+    'group'. Every change gets its own sequence number, which doubles as the
+    topology version after that change.
+    """
+    changes = list(changes)
+    if not changes:
+        return get_topology_version()
+    with _version_lock:
+        if CHANGELOG_SHARED_PATH:
+            _record_shared(changes)
+            return _topology_version
+
+        recorded = []
+        for seq, (op, kind, entity_id, properties) in enumerate(changes, _topology_version + 1):
+            change = {"seq": seq, "op": op, "kind": kind, "id": entity_id}
+            if properties is not None:
+                change["properties"] = properties
+            recorded.append(change)
+        _ingest(recorded, notify=True, local=True)
+        return _topology_version
+
+
+def record_change(op, kind, entity_id, properties=None):
+    """Append a single committed change to the log and return the new version"""
+    return record_changes([(op, kind, entity_id, properties)])
+
+
+def get_changes_since(since):
+    """
+    Return (version, changes) with every change after the given version.
+
+    The change list is None when the log no longer covers that version, either
+    because older records were compacted or because the version is from a
+    previous process - since is then None, as parse_version() returns for a
+    token from another epoch; the client must then reload the full graph.
+    """
+    with _version_lock:
+        if CHANGELOG_SHARED_PATH:
+            _sync_shared()
+        version = _topology_version
+        if since == version:
+            return version, []
+        if since is None or since > version or not _change_log or _change_log[0]["seq"] > since + 1:
+            return version, None
+        # Sequence numbers in the log are contiguous, so skip straight to since
+        start = since + 1 - _change_log[0]["seq"]
+        return version, list(islice(_change_log, start, None))
+
+
+def compute_etag(body):
+    """Build a strong ETag value from a serialized response body"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+class SnapshotCache:
+    """Thread-safe store of serialized snapshots keyed by view name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots = {}
+
+    def get(self, key, version):
+        """Return the snapshot for key if it was built at the given version"""
+        snapshot = self._snapshots.get(key)
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        return None
+
+    def put(self, key, version, body):
+        """Store a serialized body for key, never replacing a newer snapshot"""
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        snapshot = Snapshot(version, body, compute_etag(body), {})
+        with self._lock:
+            current = self._snapshots.get(key)
+            if current is None or current.version <= version:
+                self._snapshots[key] = snapshot
+        return snapshot
+
+    def clear(self):
+        """Drop every cached snapshot"""
+        with self._lock:
+            self._snapshots.clear()